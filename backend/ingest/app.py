@@ -1,30 +1,168 @@
-﻿import os, json, boto3, base64, requests
-from ..lambda_pkg.preprocess import split_text_jp, extract_meta
-from ..lambda_pkg.bedrock_client import embed_texts
+﻿import os, json, boto3, base64, codecs
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from ..lambda_pkg.preprocess import MetaExtractor, iter_chunks_jp, iter_lines
+from ..lambda_pkg.bedrock_client import EMBED_MODEL, embed_texts
+from ..lambda_pkg.bulk_indexer import BulkIndexer
+from ..lambda_pkg.chunker import iter_section_chunks
+from ..lambda_pkg.embedding_cache import build_chunk_store_from_env, embed_with_store
+from ..lambda_pkg.ingest_manifest import ChunkIdAssigner, S3ManifestStore, bulk_actions, chunk_hash, diff_chunks, update_actions
 
 OS = os.environ["OPENSEARCH_ENDPOINT"].rstrip("/")
 INDEX = os.environ.get("OPENSEARCH_INDEX_ALIAS", "docs_v_current")
 AUTH = (os.environ.get("OS_USER",""), os.environ.get("OS_PASS",""))
 s3 = boto3.client("s3")
+# チャンク埋め込みストア（CHUNK_EMBED_STORE_URI 未指定なら毎回すべて埋め込む）
+CHUNK_STORE = build_chunk_store_from_env()
+EMBED_DIMENSIONS = 1024
+BULK_INDEXER = BulkIndexer(f"{OS}/_bulk", auth=AUTH)
+# S3 から一度に読むバイト数と、埋め込み・bulk に流すチャンク数の単位
+READ_CHUNK_BYTES = int(os.environ.get("INGEST_READ_CHUNK_BYTES", str(64 * 1024)))
+EMBED_BATCH_CHUNKS = int(os.environ.get("INGEST_EMBED_BATCH_CHUNKS", "64"))
+# チャンク分割方式（sentence: 文・見出し単位でトークン上限まで / fixed: 900文字固定長）
+INGEST_CHUNKER = os.environ.get("INGEST_CHUNKER", "sentence")
+# 同時に取り込むドキュメント数（埋め込み・bulk の並列数はドキュメント間で共有）
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+
+
+def _iter_text(bkt, key):
+    """S3 オブジェクトを少しずつ読み、UTF-8 を逐次デコードして返す"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for raw in s3.get_object(Bucket=bkt, Key=key)["Body"].iter_chunks(READ_CHUNK_BYTES):
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_actions(key, chunks, extractor, previous, previous_meta, current, totals):
+    """
+    チャンク（本文, 見出しの階層）を EMBED_BATCH_CHUNKS 件ずつ差分判定・埋め込みし、bulk アクションを順に返す
+    - 差分判定のハッシュは本文と見出しだけ。文書単位のメタデータはその時点までに読んだ行から付ける
+    - 読み終えて確定したメタデータと違う内容で登録済みのチャンクだけ、最後に update で揃える
+      （後半にある #タグ も全チャンクに反映される。前回と同じなら update は送らない）
+    current（_id → ハッシュ）と totals（件数）は処理しながら更新する
+    """
+    chunk_ids = ChunkIdAssigner(key)
+    sent_meta = {}
+    for batch in _batched(chunks, EMBED_BATCH_CHUNKS):
+        meta = extractor.meta
+        docs = {}
+        for t, section in batch:
+            docs[chunk_ids(t)] = {"text": t, "section": section or None}
+        hashes = {cid: chunk_hash(doc, EMBED_MODEL) for cid, doc in docs.items()}
+        current.update(hashes)
+        diff = diff_chunks({cid: previous[cid] for cid in hashes if cid in previous}, hashes)
+
+        # 本文から決まる _id で前回のマニフェストと比較し、追加・変更分だけ埋め込む
+        targets = diff["added"] + diff["changed"]
+        embed_stats = {}
+        vecs = embed_with_store([docs[cid]["text"] for cid in targets], embed_texts, EMBED_MODEL, EMBED_DIMENSIONS, CHUNK_STORE, embed_stats)
+        for cid, v in zip(targets, vecs):
+            docs[cid].update(meta, vector=v)
+            sent_meta[cid] = meta
+
+        totals["chunks"] += len(batch)
+        totals["embedded"] += embed_stats["embedded"]
+        totals["reused"] += embed_stats["reused"]
+        for name in ("added", "changed", "unchanged"):
+            totals[name] += len(diff[name])
+        yield from bulk_actions(INDEX, docs, diff)
+
+    meta = extractor.meta
+    stale = [cid for cid in current if sent_meta.get(cid, previous_meta) != meta]
+    totals["meta_updated"] = len(stale)
+    yield from update_actions(INDEX, stale, meta)
+
+    removed = [cid for cid in previous if cid not in current]
+    totals["removed"] = len(removed)
+    yield from bulk_actions(INDEX, {}, {"added": [], "changed": [], "removed": removed})
+
+
+def _s3_objects(record):
+    """レコードから (バケット, キー) を取り出す（S3 通知と、S3 通知を本文に持つ SQS メッセージに対応）"""
+    if "s3" in record:
+        records = [record]
+    else:
+        records = json.loads(record.get("body") or "{}").get("Records", [])
+    # イベントのキーは URL エンコードされている
+    return [(r["s3"]["bucket"]["name"], unquote_plus(r["s3"]["object"]["key"])) for r in records if "s3" in r]
+
+
+def _ingest_record(record):
+    return [ingest_object(bkt, key) for bkt, key in _s3_objects(record)]
 
 
 def handler(event, context):
-    # S3 Put 繧､繝吶Φ繝医°繧峨ヰ繧ｱ繝・ヨ/繧ｭ繝ｼ蜿門ｾ・    rec = event["Records"][0]
-    bkt = rec["s3"]["bucket"]["name"]
-    key = rec["s3"]["object"]["key"]
-    body = s3.get_object(Bucket=bkt, Key=key)["Body"].read().decode("utf-8")
-
-    meta = extract_meta(body)
-    chunks = split_text_jp(body)
-    vecs = embed_texts(chunks)
-
-    docs = []
-    for i, (t, v) in enumerate(zip(chunks, vecs)):
-        docs.append({"index": {"_index": INDEX}})
-        docs.append({"text": t, "vector": v, **meta})
-
-    # bulk
-    lines = "\n".join([json.dumps(d, ensure_ascii=False) for d in docs]) + "\n"
-    r = requests.post(f"{OS}/_bulk", data=lines.encode("utf-8"), headers={"Content-Type":"application/x-ndjson"}, auth=AUTH, timeout=30)
-    r.raise_for_status()
-    return {"statusCode": 200, "body": json.dumps({"chunks": len(chunks)})}
+    """
+    イベント内の全レコードを INGEST_CONCURRENCY 件ずつ並列に取り込む
+    SQS 経由の場合は失敗したメッセージだけを batchItemFailures で返し、再配信させる
+    """
+    records = event.get("Records", [])
+    with ThreadPoolExecutor(max_workers=max(1, min(INGEST_CONCURRENCY, len(records)))) as executor:
+        futures = [(record, executor.submit(_ingest_record, record)) for record in records]
+
+    results, failures = [], []
+    for record, future in futures:
+        record_id = record.get("messageId") or record.get("s3", {}).get("object", {}).get("key")
+        try:
+            results.append({"id": record_id, "status": "ok", "documents": future.result()})
+        except Exception as e:
+            print(f"Ingest failed for {record_id}: {str(e)}")
+            results.append({"id": record_id, "status": "error", "error": str(e)})
+            failures.append(record)
+
+    response = {"statusCode": 200, "body": json.dumps({"records": results}, ensure_ascii=False)}
+    if any("messageId" in r for r in records):
+        response["batchItemFailures"] = [{"itemIdentifier": r["messageId"]} for r in failures]
+    elif failures:
+        # S3 からの直接呼び出しはイベントごと再試行される（取り込みは冪等）
+        raise RuntimeError(f"{len(failures)} of {len(records)} records failed: {json.dumps(results, ensure_ascii=False)}")
+    return response
+
+
+def ingest_object(bkt, key):
+    """S3 オブジェクト1件を取り込み、件数の集計を返す"""
+    manifests = S3ManifestStore(s3, bkt)
+    if manifests.is_manifest(key):
+        return {"key": key, "skipped": True}
+    # 1回の読み込みで、メタデータを抽出しながら本文を逐次チャンク化 → 埋め込み → bulk に流す
+    extractor = MetaExtractor()
+    body = extractor.iter_body(iter_lines(_iter_text(bkt, key)))
+    if INGEST_CHUNKER == "fixed":
+        chunks = ((t, "") for t in iter_chunks_jp(body))
+    else:
+        chunks = iter_section_chunks(body)
+
+    manifest = manifests.load_manifest(key)
+    previous = manifest["chunks"]
+    current = {}
+    totals = {"chunks": 0, "added": 0, "changed": 0, "removed": 0, "unchanged": 0, "embedded": 0, "reused": 0}
+
+    # bulk（差分のみ）。失敗が残った場合はマニフェストを更新せず、再実行で再送させる
+    bulk = BULK_INDEXER.index(_iter_actions(key, chunks, extractor, previous, manifest.get("meta"), current, totals))
+    print(f"bulk: {json.dumps(bulk, ensure_ascii=False)}")
+    if bulk["failed"]:
+        raise RuntimeError(f"{bulk['failed']} bulk items failed for {key}: {bulk['errors']}")
+    manifests.save(key, current, {"meta": extractor.meta})
+
+    return {
+        "key": key,
+        **totals,
+        "indexed": bulk["indexed"],
+        "retried": bulk["retried"],
+        "reuse_ratio": totals["reused"] / (totals["added"] + totals["changed"]) if totals["added"] + totals["changed"] else 0.0,
+    }
@@ -0,0 +1,206 @@
+"""
+近似最近傍（ANN）インデックス（HNSW）
+- OpenSearch の knn_vector（scripts/create_index.py）と同じ m=16 / ef_construction=512 を既定値とする
+- ef_search の既定値は 40（scripts/bench_ann.py の実測で recall@10 は 1万件 0.996・2万件 0.993、
+  80 にしても recall の改善は 0.005 程度で検索時間は約2倍）
+- 類似度は内積（Titan のベクトルは正規化済みのため内積 = コサイン類似度）
+- ノード番号はベクトル行列の行番号と一致（ローカルインデックスの行と対応）
+- 構築・追加登録・1ファイル（.npz）への保存 / 読み込みに対応
+"""
+import heapq
+import math
+import os
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "512"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+
+
+class HNSWIndex:
+    """Hierarchical Navigable Small World グラフ"""
+
+    def __init__(
+        self,
+        dimensions: int,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+        seed: int = 0
+    ):
+        self.dimensions = dimensions
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        # links[ノード][階層] = 隣接ノードのリスト（階層0は最大 2m、それ以外は最大 m）
+        self.links: List[List[List[int]]] = []
+        self.entry: Optional[int] = None
+        self.max_level = -1
+        self._level_mult = 1 / math.log(max(2, m))
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, **params) -> "HNSWIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        index = cls(vectors.shape[1], **params)
+        index.add(vectors)
+        return index
+
+    def add(self, vectors: np.ndarray) -> None:
+        """ベクトルを追加登録（ノード番号は登録順に続く）"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        start = len(self.links)
+        self.vectors = np.concatenate([self.vectors, vectors]) if start else np.array(vectors)
+        for node in range(start, len(self.vectors)):
+            self._insert(node)
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+
+    def _max_links(self, level: int) -> int:
+        return self.m * 2 if level == 0 else self.m
+
+    def _search_layer(self, query: np.ndarray, entry: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """1階層内の貪欲探索。類似度の高い順に最大 ef 件の (類似度, ノード) を返す"""
+        vectors = self.vectors
+        visited = set(entry)
+        sims = (vectors[entry] @ query).tolist()
+        candidates = [(-s, n) for s, n in zip(sims, entry)]
+        heapq.heapify(candidates)
+        results = [(s, n) for s, n in zip(sims, entry)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg < results[0][0]:
+                break
+            neighbors = [n for n in self.links[node][level] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            sims = vectors[neighbors] @ query
+            if len(results) >= ef:
+                # 現在の候補の最下位より遠いノードは Python のループに入れない
+                keep = np.flatnonzero(sims > results[0][0])
+                sims, neighbors = sims[keep], [neighbors[i] for i in keep.tolist()]
+            for s, n in zip(sims.tolist(), neighbors):
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates: List[Tuple[float, int]], limit: int) -> List[int]:
+        """
+        近傍の選択（HNSW 論文のヒューリスティック）
+        既に選んだ近傍よりもクエリ側に近い候補だけを残し、グラフが一方向に偏らないようにする
+        """
+        selected: List[int] = []
+        for s, node in candidates:
+            if len(selected) >= limit:
+                break
+            if selected and float((self.vectors[selected] @ self.vectors[node]).max()) > s:
+                continue
+            selected.append(node)
+        return selected
+
+    def _connect(self, node: int, neighbor: int, level: int) -> None:
+        links = self.links[neighbor][level]
+        links.append(node)
+        if len(links) > self._max_links(level):
+            sims = (self.vectors[links] @ self.vectors[neighbor]).tolist()
+            ranked = sorted(zip(sims, links), reverse=True)
+            self.links[neighbor][level] = self._select_neighbors(ranked, self._max_links(level))
+
+    def _insert(self, node: int) -> None:
+        query = self.vectors[node]
+        level = self._random_level()
+        self.links.append([[] for _ in range(level + 1)])
+        if self.entry is None:
+            self.entry, self.max_level = node, level
+            return
+
+        entry = [self.entry]
+        for lc in range(self.max_level, level, -1):
+            entry = [self._search_layer(query, entry, 1, lc)[0][1]]
+        for lc in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(query, entry, self.ef_construction, lc)
+            neighbors = self._select_neighbors(found, self.m)
+            self.links[node][lc] = neighbors
+            for neighbor in neighbors:
+                self._connect(node, neighbor, lc)
+            entry = [n for _, n in found]
+        if level > self.max_level:
+            self.entry, self.max_level = node, level
+
+    def search(self, query_vector, k: int = 10, ef: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        近似 top-k
+
+        Returns:
+            (ノード番号の配列, 類似度の配列)（類似度の高い順）
+        """
+        if self.entry is None or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        entry = [self.entry]
+        for lc in range(self.max_level, 0, -1):
+            entry = [self._search_layer(query, entry, 1, lc)[0][1]]
+        found = self._search_layer(query, entry, max(ef or self.ef_search, k), 0)[:k]
+        return (
+            np.array([n for _, n in found], dtype=np.int64),
+            np.array([s for s, _ in found], dtype=np.float32),
+        )
+
+    def save(self, path: str, include_vectors: bool = True) -> None:
+        """1ファイル（.npz）に保存（グラフは CSR 形式に平坦化）"""
+        levels = np.array([len(node_links) - 1 for node_links in self.links], dtype=np.int32)
+        flat = [links for node_links in self.links for links in node_links]
+        offsets = np.zeros(len(flat) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(links) for links in flat])
+        neighbors = np.fromiter((n for links in flat for n in links), dtype=np.int32, count=int(offsets[-1]))
+        params = np.array([
+            self.dimensions, self.m, self.ef_construction, self.ef_search,
+            -1 if self.entry is None else self.entry, self.max_level,
+        ], dtype=np.int64)
+        arrays = {"params": params, "levels": levels, "offsets": offsets, "neighbors": neighbors}
+        if include_vectors:
+            arrays["vectors"] = self.vectors
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str, vectors: Optional[np.ndarray] = None) -> "HNSWIndex":
+        """
+        保存したインデックスを読み込む
+        vectors を渡した場合はファイル内のベクトルを読まずにそれを使う（メモリマップの共有用）
+        """
+        with np.load(path) as data:
+            dimensions, m, ef_construction, ef_search, entry, max_level = data["params"].tolist()
+            index = cls(dimensions, m=m, ef_construction=ef_construction, ef_search=ef_search)
+            index.vectors = data["vectors"] if vectors is None else vectors
+            levels = data["levels"].tolist()
+            offsets = data["offsets"].tolist()
+            neighbors = data["neighbors"].tolist()
+        position = 0
+        for level in levels:
+            node_links = []
+            for _ in range(level + 1):
+                node_links.append(neighbors[offsets[position]:offsets[position + 1]])
+                position += 1
+            index.links.append(node_links)
+        index.entry = None if entry < 0 else entry
+        index.max_level = max_level
+        if len(index.vectors) != len(index.links):
+            raise ValueError("vectors do not match the graph")
+        return index
@@ -7,6 +7,23 @@ import os
 from opensearch_client import OpenSearchClient
 from bedrock_client import generate_answer
 
+# 検索エンジン（opensearch: OpenSearch Serverless / local: LOCAL_INDEX_URI のスナップショット）
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "opensearch")
+
+# warm Lambda 間で共有する検索クライアント（接続プール・署名・ローカルインデックスを再利用）
+_CLIENT = None
+
+
+def _get_client():
+    global _CLIENT
+    if _CLIENT is None:
+        if SEARCH_BACKEND == "local":
+            from local_index import LocalSearchClient
+            _CLIENT = LocalSearchClient.from_uri()
+        else:
+            _CLIENT = OpenSearchClient()
+    return _CLIENT
+
 
 def _response(status, body):
     return {
@@ -36,12 +53,12 @@ def handler(event, context):
         if not query:
             return _response(400, {"error": "Missing query parameter 'q'"})
         
-        # OpenSearch クライアント初期化
-        client = OpenSearchClient()
+        # 検索クライアント取得（初回のみ初期化）
+        client = _get_client()
         
         # ハイブリッド検索実行
         size = int(params.get("size", "5"))
-        results = client.hybrid_search(query, size=size)
+        results, search_stats = client.hybrid_search_with_stats(query, size=size)
         
         # 結果を整形
         docs = []
@@ -60,13 +77,15 @@ def handler(event, context):
                 "query": query,
                 "answer": answer,
                 "citations": citations,
-                "results": docs
+                "results": docs,
+                "search": search_stats
             })
         
         # 検索結果のみ返す
         return _response(200, {
             "query": query,
-            "results": docs
+            "results": docs,
+            "search": search_stats
         })
         
     except Exception as e:
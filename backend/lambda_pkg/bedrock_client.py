@@ -1,16 +1,83 @@
 ﻿"""
 Bedrock クライアント
-- Titan Embedding v2 でベクトル化
+- Titan Embedding v2 でベクトル化（複数テキストは並列・レート制御付き）
 - Claude 3 Haiku で RAG 回答生成
 """
 import os
 import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# 埋め込みの並列数・毎秒の呼び出し上限・スロットリング時の再試行回数
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "8"))
+EMBED_RATE_LIMIT = float(os.getenv("EMBED_RATE_LIMIT", "20"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_BASE = 0.5
+EMBED_BACKOFF_MAX = 20.0
 
-BEDROCK = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "ap-northeast-1"))
+BEDROCK = boto3.client(
+    "bedrock-runtime",
+    region_name=os.getenv("AWS_REGION", "ap-northeast-1"),
+    config=Config(max_pool_connections=max(10, EMBED_MAX_CONCURRENCY))
+)
 EMBED_MODEL = os.getenv("BEDROCK_EMBEDDINGS_MODEL_ID", "amazon.titan-embed-text-v2:0")
 LLM_MODEL = os.getenv("LLM_MODEL_ID", "anthropic.claude-3-haiku-20240307-v1:0")
 
+THROTTLING_ERRORS = ("ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException")
+
+
+class TokenBucket:
+    """
+    呼び出しレートを制御するトークンバケット
+    スロットリングを受けるとレートを半減し、成功が続くと上限まで少しずつ戻す
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.throttles = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを1つ取得（足りなければ補充まで待つ）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self) -> None:
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+# warm Lambda 内の全呼び出しで共有するレート制御と同時実行数の上限
+# （複数ドキュメントを並列に取り込んでも、埋め込み呼び出しの合計はこの範囲に収まる）
+EMBED_BUCKET = TokenBucket(EMBED_RATE_LIMIT)
+EMBED_SLOTS = threading.BoundedSemaphore(max(1, EMBED_MAX_CONCURRENCY))
+
 
 def embed_text(text: str) -> list[float]:
     """
@@ -37,17 +104,68 @@ def embed_text(text: str) -> list[float]:
     return result["embedding"]
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def _is_throttled(error: Exception) -> bool:
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+
+
+def _embed_with_retry(text: str, bucket: TokenBucket) -> list[float]:
+    """レート制御下で embed_text を呼び、スロットリング時は指数バックオフで再試行"""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            with EMBED_SLOTS:
+                vector = embed_text(text)
+        except ClientError as e:
+            if not _is_throttled(e) or attempt == EMBED_MAX_RETRIES:
+                raise
+            bucket.throttled()
+            time.sleep(min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0))
+            continue
+        bucket.succeeded()
+        return vector
+
+
+def embed_texts(
+    texts: list[str],
+    max_concurrency: int = EMBED_MAX_CONCURRENCY,
+    stats: Optional[dict] = None
+) -> list[list[float]]:
     """
-    複数テキストをベクトル化
+    複数テキストを並列にベクトル化
+    同一テキストは1回だけ埋め込み、結果は入力と同じ順序で返す
     
     Args:
         texts: 埋め込み対象のテキストリスト
+        max_concurrency: 同時に実行する埋め込み呼び出しの上限
+        stats: 指定すると件数・所要時間・chunks/sec などを書き込む
     
     Returns:
         ベクトルのリスト
     """
-    return [embed_text(t) for t in texts]
+    start = time.perf_counter()
+    throttles_before = EMBED_BUCKET.throttles
+    unique = list(dict.fromkeys(texts))
+    
+    if max_concurrency <= 1 or len(unique) <= 1:
+        vectors = [_embed_with_retry(t, EMBED_BUCKET) for t in unique]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(unique))) as executor:
+            vectors = list(executor.map(lambda t: _embed_with_retry(t, EMBED_BUCKET), unique))
+    by_text = dict(zip(unique, vectors))
+    
+    elapsed = time.perf_counter() - start
+    report = {
+        "chunks": len(texts),
+        "unique": len(unique),
+        "throttled": EMBED_BUCKET.throttles - throttles_before,
+        "elapsed_ms": int(elapsed * 1000),
+        "chunks_per_sec": round(len(texts) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    if texts:
+        print(f"embed_texts: {json.dumps(report)}")
+    if stats is not None:
+        stats.update(report)
+    return [by_text[t] for t in texts]
 
 
 def generate_answer(query: str, docs: list[dict]) -> tuple[str, list[dict]]:
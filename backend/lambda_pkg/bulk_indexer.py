@@ -0,0 +1,177 @@
+"""
+OpenSearch bulk インデクサ
+- アクションを逐次受け取り、バイト数・件数の上限でバッチに分割
+- 複数の bulk リクエストを並列に送信（任意で gzip 圧縮）
+- レスポンスの items を確認し、拒否されたアイテム（429 / 5xx）だけを指数バックオフで再送
+- 成功・失敗・再送件数とスループットを集計
+"""
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+BULK_MAX_DOCS = int(os.getenv("BULK_MAX_DOCS", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "2"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "3"))
+BULK_GZIP = os.getenv("BULK_GZIP", "false").lower() == "true"
+BULK_TIMEOUT = float(os.getenv("BULK_TIMEOUT", "60"))
+BULK_BACKOFF_BASE = 1.0
+
+# エラー例として集計に残す件数
+MAX_ERROR_SAMPLES = 5
+
+# (アクション行, ドキュメント)。delete のドキュメントは None
+BulkAction = Tuple[Dict[str, Any], Optional[Dict[str, Any]]]
+
+
+def encode_action(action: Dict[str, Any], source: Optional[Dict[str, Any]]) -> bytes:
+    """1アクション分の NDJSON"""
+    lines = [json.dumps(action, ensure_ascii=False)]
+    if source is not None:
+        lines.append(json.dumps(source, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _is_retryable(status: int) -> bool:
+    """再送対象とするステータス（429 と 5xx、アイテム単位・リクエスト単位共通）"""
+    return status == 429 or status >= 500
+
+
+def _item_ok(op: str, status: int) -> bool:
+    # 既に存在しない delete は成功扱い
+    return 200 <= status < 300 or (op == "delete" and status == 404)
+
+
+class BulkIndexer:
+    """ストリーミング bulk インデクサ"""
+
+    def __init__(
+        self,
+        url: str,
+        auth: Any = None,
+        session: Optional[requests.Session] = None,
+        max_bytes: int = BULK_MAX_BYTES,
+        max_docs: int = BULK_MAX_DOCS,
+        concurrency: int = BULK_CONCURRENCY,
+        compress: bool = BULK_GZIP,
+        max_retries: int = BULK_MAX_RETRIES,
+        timeout: float = BULK_TIMEOUT
+    ):
+        self.url = url
+        self.auth = auth
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=max(1, concurrency)))
+        self.session = session
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.concurrency = max(1, concurrency)
+        self.compress = compress
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # index() を複数スレッドから同時に呼んでも、送信中のリクエスト数は concurrency 以内
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def index(self, actions: Iterable[BulkAction]) -> Dict[str, Any]:
+        """
+        アクションをすべて送信
+
+        Returns:
+            {"batches", "indexed", "failed", "retried", "bytes", "elapsed_ms", "docs_per_sec", "errors"}
+        """
+        start = time.perf_counter()
+        summary: Dict[str, Any] = {"batches": 0, "indexed": 0, "failed": 0, "retried": 0, "bytes": 0, "errors": []}
+        pending: Set[Future] = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for batch in self._batches(actions):
+                # 送信中のリクエスト数を concurrency 以内に保つ
+                if len(pending) >= self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(self._send_batch, batch, summary))
+            for future in pending:
+                future.result()
+
+        elapsed = time.perf_counter() - start
+        summary["elapsed_ms"] = int(elapsed * 1000)
+        summary["docs_per_sec"] = round(summary["indexed"] / elapsed, 1) if elapsed > 0 else 0.0
+        return summary
+
+    def _batches(self, actions: Iterable[BulkAction]) -> Iterable[List[Tuple[Dict[str, Any], bytes]]]:
+        """バイト数・件数の上限でアクションを分割"""
+        batch: List[Tuple[Dict[str, Any], bytes]] = []
+        size = 0
+        for action, source in actions:
+            encoded = encode_action(action, source)
+            if batch and (size + len(encoded) > self.max_bytes or len(batch) >= self.max_docs):
+                yield batch
+                batch, size = [], 0
+            batch.append((action, encoded))
+            size += len(encoded)
+        if batch:
+            yield batch
+
+    def _post(self, payload: bytes, summary: Dict[str, Any]) -> requests.Response:
+        headers = {"Content-Type": "application/x-ndjson"}
+        if self.compress:
+            payload = gzip.compress(payload)
+            headers["Content-Encoding"] = "gzip"
+        with self._lock:
+            summary["bytes"] += len(payload)
+        with self._slots:
+            return self.session.post(self.url, data=payload, headers=headers, auth=self.auth, timeout=self.timeout)
+
+    def _send_batch(self, batch: List[Tuple[Dict[str, Any], bytes]], summary: Dict[str, Any]) -> None:
+        """1バッチを送信し、拒否されたアイテムだけを再送"""
+        with self._lock:
+            summary["batches"] += 1
+
+        for attempt in range(self.max_retries + 1):
+            retry: List[Tuple[Dict[str, Any], bytes]] = []
+            indexed, failed, errors, items = 0, 0, [], []
+            try:
+                response = self._post(b"".join(encoded for _, encoded in batch), summary)
+            except requests.RequestException as e:
+                # 接続エラー・タイムアウトはバッチ全体を再送
+                retry, errors = batch, [{"error": str(e)}]
+            else:
+                if _is_retryable(response.status_code):
+                    retry, errors = batch, [{"status": response.status_code, "error": "bulk request rejected"}]
+                elif response.status_code >= 300:
+                    failed, errors = len(batch), [{"status": response.status_code, "error": response.text[:500]}]
+                else:
+                    items = response.json().get("items", [])
+
+            for (action, encoded), item in zip(batch, items):
+                op, result = next(iter(item.items()))
+                status = result.get("status", 500)
+                if _item_ok(op, status):
+                    indexed += 1
+                elif _is_retryable(status):
+                    retry.append((action, encoded))
+                else:
+                    failed += 1
+                    errors.append({"_id": result.get("_id"), "status": status, "error": result.get("error")})
+
+            final = not retry or attempt == self.max_retries
+            with self._lock:
+                summary["indexed"] += indexed
+                summary["failed"] += failed + (len(retry) if final else 0)
+                summary["retried"] += 0 if final else len(retry)
+                samples = summary["errors"]
+                samples.extend(errors[:MAX_ERROR_SAMPLES - len(samples)])
+            if final:
+                return
+            time.sleep(BULK_BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.0))
+            batch = retry
@@ -0,0 +1,150 @@
+"""
+文・見出し単位の日本語チャンカー
+- 句点（。！？）・改行で文に分割し、Markdown の見出しでセクションを区切る
+- トークン数の上限（Titan Embedding v2 向けの推定値）まで文を詰めてチャンクにする
+- オーバーラップは文字数ではなく、直前のチャンク末尾の文を丸ごと引き継ぐ
+- テキスト片を逐次受け取り、チャンクを順に生成（文書全体を保持しない）
+"""
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# 1チャンクの推定トークン数の上限と、引き継ぐ末尾の文の推定トークン数の上限
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+# 文末（句点・感嘆符・疑問符 + 閉じ括弧）または改行
+SENTENCE_END = re.compile(r"[。！？!?]+[」』）)\]]*[ \t　]*|\n+")
+HEADING = re.compile(r"(#{1,6})[ \t]+(.+?)[ \t#]*$")
+# 和文（かな・漢字・全角記号）は1文字1トークン、それ以外は4文字1トークンで推定
+CJK = re.compile(r"[\u3001-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+SPACE = re.compile(r"\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Titan Embedding v2 のトークン数の推定値"""
+    cjk = len(CJK.findall(text))
+    other = len(text) - cjk - len(SPACE.findall(text))
+    return cjk + (other + 3) // 4
+
+
+def iter_sentences(pieces: Iterable[str], max_chars: int = 4096) -> Iterator[str]:
+    """
+    テキスト片を文に分割（文末の空白・改行は文に含める）
+    文末が現れないまま max_chars を超えた場合はそこで区切る
+    """
+    buf = ""
+    for piece in pieces:
+        buf += piece
+        start = 0
+        for m in SENTENCE_END.finditer(buf):
+            # 片の末尾の区切りは次の片に続く可能性があるため確定しない
+            if m.end() == len(buf):
+                break
+            yield buf[start:m.end()]
+            start = m.end()
+        buf = buf[start:]
+        while len(buf) > max_chars:
+            yield buf[:max_chars]
+            buf = buf[max_chars:]
+    if buf:
+        yield buf
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """上限を超える1文を文字数で分割（和文は1文字1トークンのため max_tokens 文字ずつ）"""
+    return [sentence[i:i + max_tokens] for i in range(0, len(sentence), max_tokens)]
+
+
+def iter_section_chunks(
+    pieces: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Tuple[str, str]]:
+    """
+    テキスト片から、文・見出し単位でトークン上限まで詰めたチャンクを順に生成
+
+    Yields:
+        (チャンク, 見出しの階層（"概要 > 課題"、見出しの前は ""）)
+    """
+    window: List[Tuple[str, int]] = []
+    total = 0
+    fresh = False  # 前のチャンクから引き継いだ文以外を含むか
+    headings: List[Tuple[int, str]] = []
+
+    def section() -> str:
+        return " > ".join(title for _, title in headings)
+
+    def overlap_tail() -> List[Tuple[str, int]]:
+        tail: List[Tuple[str, int]] = []
+        size = 0
+        for sentence, tokens in reversed(window):
+            if size + tokens > overlap_tokens:
+                break
+            tail.insert(0, (sentence, tokens))
+            size += tokens
+        # 先頭の空白・改行だけの要素は引き継がない
+        while tail and tail[0][1] == 0:
+            tail.pop(0)
+        return tail
+
+    for sentence in iter_sentences(pieces):
+        tokens = estimate_tokens(sentence)
+        if tokens == 0:
+            if window:
+                window.append((sentence, 0))
+            continue
+
+        heading = HEADING.match(sentence.strip())
+        if heading:
+            # 見出しでセクションを区切る（セクションをまたぐオーバーラップはしない）
+            if fresh:
+                yield "".join(s for s, _ in window), section()
+                window, total = [], 0
+            elif window and not HEADING.match(window[0][0].strip()):
+                window, total = [], 0
+            level = len(heading.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, heading.group(2)))
+            window.append((sentence, tokens))
+            total += tokens
+            fresh = False
+            continue
+
+        if tokens > max_tokens:
+            if fresh:
+                yield "".join(s for s, _ in window), section()
+            for part in _split_long(sentence, max_tokens):
+                yield part, section()
+            window, total, fresh = [], 0, False
+            continue
+
+        if total + tokens > max_tokens and fresh:
+            yield "".join(s for s, _ in window), section()
+            window = overlap_tail()
+            total = sum(t for _, t in window)
+            fresh = False
+        # 引き継いだ文・見出しだけで上限を超える場合は古い文から落とす
+        while window and total + tokens > max_tokens:
+            total -= window.pop(0)[1]
+        window.append((sentence, tokens))
+        total += tokens
+        fresh = True
+
+    if fresh:
+        yield "".join(s for s, _ in window), section()
+
+
+def iter_token_chunks(
+    pieces: Iterable[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[str]:
+    """iter_section_chunks のチャンク本文のみ"""
+    return (text for text, _ in iter_section_chunks(pieces, max_tokens, overlap_tokens))
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """テキスト全体をチャンクのリストに分割"""
+    return list(iter_token_chunks([text], max_tokens, overlap_tokens))
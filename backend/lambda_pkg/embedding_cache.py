@@ -0,0 +1,246 @@
+"""
+埋め込みベクトルのキャッシュ
+- キー: 正規化テキスト + モデルID + 次元数 の SHA-256
+- プロセス内 LRU（1段目）+ 任意の SQLite ファイル（2段目、warm Lambda で再利用）
+- ベクトルは JSON ではなく float32 のバイト列で保持
+- 取り込み用のチャンク埋め込みストア（SQLite / S3）: 未登録のチャンクだけを埋め込む
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# クエリ埋め込みキャッシュの件数（0 で無効）と SQLite ファイルのパス（未指定ならメモリのみ）
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH", "")
+# チャンク埋め込みストアの場所（ローカルパスなら SQLite、s3://bucket/prefix なら S3、未指定なら無効）
+CHUNK_EMBED_STORE_URI = os.getenv("CHUNK_EMBED_STORE_URI", "")
+
+
+def normalize_query(text: str) -> str:
+    """クエリ文字列を正規化（NFKC、連続空白の圧縮、前後空白の除去）"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def vector_key(text: str, model_id: str, dimensions: int) -> str:
+    """テキスト・モデル・次元数からキーを生成"""
+    return hashlib.sha256(f"{model_id}\0{dimensions}\0{text}".encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: Iterable[float]) -> bytes:
+    """ベクトルを float32 のバイト列に変換"""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vector(blob: bytes) -> List[float]:
+    """float32 のバイト列をベクトルに戻す"""
+    return np.frombuffer(blob, dtype=np.float32).tolist()
+
+
+class SQLiteVectorStore:
+    """キー → float32 ベクトルの永続ストア（SQLite ファイル）"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM vectors WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            # SQLite のパラメータ数上限を避けるため分割して検索
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put(self, key: str, blob: bytes) -> None:
+        self.put_many([(key, blob)])
+
+    def put_many(self, items: List[Tuple[str, bytes]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?)", items)
+
+
+class S3VectorStore:
+    """キー → float32 ベクトルの永続ストア（S3 の1キー1オブジェクト）"""
+
+    def __init__(self, bucket: str, prefix: str = "", client: Any = None, max_workers: int = 16):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", region_name=os.getenv("AWS_REGION", "ap-northeast-1"))
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.max_workers = max_workers
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}.f32" if self.prefix else f"{key}.f32"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"].read()
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as executor:
+            blobs = list(executor.map(self.get, keys))
+        return {key: blob for key, blob in zip(keys, blobs) if blob is not None}
+
+    def put(self, key: str, blob: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=blob)
+
+    def put_many(self, items: List[Tuple[str, bytes]]) -> None:
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            list(executor.map(lambda item: self.put(*item), items))
+
+
+class EmbeddingCache:
+    """2段構成（LRU + 永続ストア）の埋め込みキャッシュ"""
+
+    def __init__(self, max_entries: int = QUERY_EMBED_CACHE_SIZE, store: Optional[SQLiteVectorStore] = None):
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return decode_vector(blob)
+
+        blob = self.store.get(key) if self.store else None
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.persistent_hits += 1
+        self._remember(key, blob)
+        return decode_vector(blob)
+
+    def put(self, key: str, vector: Iterable[float]) -> None:
+        blob = encode_vector(vector)
+        self._remember(key, blob)
+        if self.store:
+            self.store.put(key, blob)
+
+    def _remember(self, key: str, blob: bytes) -> None:
+        with self._lock:
+            self._entries[key] = blob
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """ヒット率などの統計"""
+        hits = self.memory_hits + self.persistent_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+def build_query_cache_from_env() -> Optional[EmbeddingCache]:
+    """環境変数からクエリ埋め込みキャッシュを生成（QUERY_EMBED_CACHE_SIZE=0 で無効）"""
+    if QUERY_EMBED_CACHE_SIZE <= 0:
+        return None
+    store = SQLiteVectorStore(QUERY_EMBED_CACHE_PATH) if QUERY_EMBED_CACHE_PATH else None
+    return EmbeddingCache(QUERY_EMBED_CACHE_SIZE, store)
+
+
+def build_chunk_store_from_env(uri: Optional[str] = None) -> Optional[Any]:
+    """CHUNK_EMBED_STORE_URI（ローカルパス / s3://bucket/prefix）からチャンク埋め込みストアを生成"""
+    uri = CHUNK_EMBED_STORE_URI if uri is None else uri
+    if not uri:
+        return None
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri[len("s3://"):].partition("/")
+        return S3VectorStore(bucket, prefix)
+    return SQLiteVectorStore(uri)
+
+
+def embed_with_store(
+    texts: List[str],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    model_id: str,
+    dimensions: int,
+    store: Optional[Any] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> List[List[float]]:
+    """
+    チャンクをベクトル化（ストアに登録済みのチャンクは再利用し、未登録分だけ embed_fn を呼ぶ）
+
+    Args:
+        texts: チャンクのリスト
+        embed_fn: テキストのリストをベクトルのリストに変換する関数（bedrock_client.embed_texts 等）
+        model_id: 埋め込みモデルID（キーの一部）
+        dimensions: 次元数（キーの一部）
+        store: get_many / put_many を持つストア（None なら全件 embed_fn）
+        stats: 指定すると chunks / reused / embedded / reuse_ratio を書き込む
+
+    Returns:
+        入力と同じ順序のベクトルのリスト
+    """
+    if store is None:
+        vectors = embed_fn(texts)
+        found: Dict[str, bytes] = {}
+        keys: List[str] = []
+        missing: List[str] = list(dict.fromkeys(texts))
+    else:
+        keys = [vector_key(text, model_id, dimensions) for text in texts]
+        key_texts = dict(zip(keys, texts))
+        found = store.get_many(list(key_texts))
+        missing = [key for key in key_texts if key not in found]
+        embedded = embed_fn([key_texts[key] for key in missing]) if missing else []
+        new_blobs = [(key, encode_vector(vector)) for key, vector in zip(missing, embedded)]
+        store.put_many(new_blobs)
+
+        blobs = dict(found)
+        blobs.update(new_blobs)
+        vectors = [decode_vector(blobs[key]) for key in keys]
+
+    if stats is not None:
+        reused = sum(1 for key in keys if key in found)
+        stats.update({
+            "chunks": len(texts),
+            "reused": reused,
+            "embedded": len(missing),
+            "reuse_ratio": reused / len(texts) if texts else 0.0,
+        })
+    return vectors
@@ -0,0 +1,264 @@
+"""
+ベンダー評価キャッシュ
+- キー: 正規化したベンダー行 + 正規化したユーザー要件 + モデルID の SHA-256
+- TTL 付き、メモリ / SQLite は LRU で件数上限を管理
+- バックエンド: プロセス内 dict / ローカル SQLite / DynamoDB 互換テーブル
+- ベンダー行が変わった場合はそのベンダーのエントリのみ無効化（メモリ / SQLite）
+  DynamoDB はキーに行全体のハッシュが入るため古い行のエントリが使われることはなく、削除は TTL に任せる
+- バックエンドのエラーはキャッシュミスとして扱い、評価処理は止めない
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Set
+
+EVAL_CACHE_BACKEND = os.getenv("EVAL_CACHE_BACKEND", "none")
+EVAL_CACHE_TTL = int(os.getenv("EVAL_CACHE_TTL", "86400"))
+EVAL_CACHE_MAX_ENTRIES = int(os.getenv("EVAL_CACHE_MAX_ENTRIES", "10000"))
+EVAL_CACHE_SQLITE_PATH = os.getenv("EVAL_CACHE_SQLITE_PATH", "/tmp/evaluation_cache.db")
+EVAL_CACHE_TABLE = os.getenv("EVAL_CACHE_TABLE", "vendor-evaluation-cache")
+
+
+def _sha256(value: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def vendor_id(vendor: Dict[str, Any]) -> str:
+    """ベンダーの識別子（vendors.csv の company_name）"""
+    return str(vendor.get("company_name", "")).strip()
+
+
+def vendor_row_hash(vendor: Dict[str, Any]) -> str:
+    """ベンダー行のハッシュ（値は文字列化・前後空白除去して正規化）"""
+    return _sha256({str(k).strip(): str(v).strip() for k, v in vendor.items() if k is not None})
+
+
+def requirements_hash(user_requirements: Dict[str, Any]) -> str:
+    """ユーザー要件のハッシュ（複数選択は順序に依存しない）"""
+    normalized = {}
+    for key, value in user_requirements.items():
+        if isinstance(value, (list, tuple)):
+            normalized[key] = sorted(str(v).strip() for v in value if str(v).strip())
+        else:
+            normalized[key] = str(value or "").strip()
+    return _sha256(normalized)
+
+
+def make_cache_key(vendor: Dict[str, Any], user_requirements: Dict[str, Any], model_id: str) -> str:
+    """評価キャッシュのキーを生成"""
+    return _sha256([vendor_row_hash(vendor), requirements_hash(user_requirements), model_id])
+
+
+class MemoryBackend:
+    """プロセス内 dict バックエンド（LRU）"""
+
+    def __init__(self, max_entries: int = EVAL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._vendor_keys: Dict[str, Set[str]] = {}
+        self._vendor_hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, vendor: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = {"vendor_id": vendor, "value": value, "expires_at": expires_at}
+            self._entries.move_to_end(key)
+            self._vendor_keys.setdefault(vendor, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, old_entry = self._entries.popitem(last=False)
+                self._vendor_keys.get(old_entry["vendor_id"], set()).discard(old_key)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._vendor_keys.get(entry["vendor_id"], set()).discard(key)
+
+    def delete_vendor(self, vendor: str) -> None:
+        with self._lock:
+            for key in self._vendor_keys.pop(vendor, set()):
+                self._entries.pop(key, None)
+
+    def get_vendor_hash(self, vendor: str) -> Optional[str]:
+        return self._vendor_hashes.get(vendor)
+
+    def set_vendor_hash(self, vendor: str, row_hash: str) -> None:
+        self._vendor_hashes[vendor] = row_hash
+
+
+class SQLiteBackend:
+    """ローカル SQLite ファイルバックエンド（warm Lambda では /tmp に置いて再利用）"""
+
+    def __init__(self, path: str = EVAL_CACHE_SQLITE_PATH, max_entries: int = EVAL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations ("
+                "key TEXT PRIMARY KEY, vendor_id TEXT, value TEXT, expires_at REAL, last_access REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_vendor ON evaluations (vendor_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_access ON evaluations (last_access)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS vendor_rows (vendor_id TEXT PRIMARY KEY, row_hash TEXT)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT vendor_id, value, expires_at FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE evaluations SET last_access = ? WHERE key = ?", (time.time(), key))
+        return {"vendor_id": row[0], "value": json.loads(row[1]), "expires_at": row[2]}
+
+    def put(self, key: str, vendor: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)",
+                (key, vendor, json.dumps(value, ensure_ascii=False), expires_at, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM evaluations WHERE key IN ("
+                "SELECT key FROM evaluations ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM evaluations WHERE key = ?", (key,))
+
+    def delete_vendor(self, vendor: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM evaluations WHERE vendor_id = ?", (vendor,))
+
+    def get_vendor_hash(self, vendor: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_hash FROM vendor_rows WHERE vendor_id = ?", (vendor,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_vendor_hash(self, vendor: str, row_hash: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO vendor_rows VALUES (?, ?)", (vendor, row_hash))
+
+
+class DynamoDBBackend:
+    """
+    DynamoDB 互換バックエンド
+    table は get_item / put_item / delete_item を持つオブジェクト（boto3 の Table リソース等）
+    パーティションキーは "pk"。件数上限は設けず、expires_at を DynamoDB の TTL 属性として使う
+    ベンダー単位のキー一覧は持たない（1回の put は1リクエスト。コンテナ間で共有する項目の更新競合もない）
+    """
+
+    def __init__(self, table: Any):
+        self.table = table
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        item = self.table.get_item(Key={"pk": key}).get("Item")
+        if item is None:
+            return None
+        return {"vendor_id": item["vendor_id"], "value": json.loads(item["value"]), "expires_at": float(item["expires_at"])}
+
+    def put(self, key: str, vendor: str, value: Dict[str, Any], expires_at: float) -> None:
+        self.table.put_item(Item={
+            "pk": key,
+            "vendor_id": vendor,
+            "value": json.dumps(value, ensure_ascii=False),
+            "expires_at": int(expires_at)
+        })
+
+    def delete(self, key: str) -> None:
+        self.table.delete_item(Key={"pk": key})
+
+
+class EvaluationCache:
+    """ベンダー評価結果のキャッシュ"""
+
+    def __init__(self, backend: Any, ttl_seconds: int = EVAL_CACHE_TTL):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _failed(self, operation: str, e: Exception) -> None:
+        self.errors += 1
+        print(f"Evaluation cache {operation} failed: {str(e)}")
+
+    def get(self, vendor: Dict[str, Any], user_requirements: Dict[str, Any], model_id: str) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みの評価結果（未登録・期限切れ・バックエンドのエラーは None）"""
+        key = make_cache_key(vendor, user_requirements, model_id)
+        try:
+            entry = self.backend.get(key)
+            if entry is not None and entry["expires_at"] < time.time():
+                self.backend.delete(key)
+                entry = None
+        except Exception as e:
+            self._failed("get", e)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["value"]
+
+    def put(self, vendor: Dict[str, Any], user_requirements: Dict[str, Any], model_id: str, value: Dict[str, Any]) -> None:
+        key = make_cache_key(vendor, user_requirements, model_id)
+        try:
+            self.backend.put(key, vendor_id(vendor), value, time.time() + self.ttl_seconds)
+        except Exception as e:
+            self._failed("put", e)
+
+    def sync_vendors(self, vendors: List[Dict[str, Any]]) -> int:
+        """
+        ベンダー行の変更を検知し、変更されたベンダーのエントリのみ削除
+        ベンダー単位の削除を持たないバックエンド（DynamoDB）では何もしない
+
+        Returns:
+            無効化したベンダー数
+        """
+        if not hasattr(self.backend, "delete_vendor"):
+            return 0
+        invalidated = 0
+        try:
+            for vendor in vendors:
+                name = vendor_id(vendor)
+                row_hash = vendor_row_hash(vendor)
+                previous = self.backend.get_vendor_hash(name)
+                if previous == row_hash:
+                    continue
+                if previous is not None:
+                    self.backend.delete_vendor(name)
+                    invalidated += 1
+                self.backend.set_vendor_hash(name, row_hash)
+        except Exception as e:
+            self._failed("sync", e)
+        return invalidated
+
+
+def build_cache_from_env() -> Optional[EvaluationCache]:
+    """環境変数 EVAL_CACHE_BACKEND（none / memory / sqlite / dynamodb）からキャッシュを生成"""
+    if EVAL_CACHE_BACKEND == "memory":
+        return EvaluationCache(MemoryBackend())
+    if EVAL_CACHE_BACKEND == "sqlite":
+        return EvaluationCache(SQLiteBackend())
+    if EVAL_CACHE_BACKEND == "dynamodb":
+        import boto3
+        table = boto3.resource("dynamodb", region_name=os.getenv("AWS_REGION", "ap-northeast-1")).Table(EVAL_CACHE_TABLE)
+        return EvaluationCache(DynamoDBBackend(table))
+    return None
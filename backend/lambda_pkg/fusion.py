@@ -0,0 +1,157 @@
+"""
+検索結果のランク融合
+- 任意個の結果リスト（OpenSearch の hits 形式）をリストごとの重み付きで1つにまとめる
+- 方式: rrf（Reciprocal Rank Fusion）/ minmax・zscore（スコアを正規化して加重和）/ combsum（生スコアの加重和）
+- スコアはドキュメントごとの配列に集計し、上位 size 件だけをヒープで取り出す（全件はソートしない）
+- hit のコピーは返す上位 size 件だけ
+- リストごとの順位・寄与（デバッグ用）も返せる
+"""
+import heapq
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore", "combsum")
+# RRF の定数 k（OpenSearch の score-ranker-processor と同じ 60）
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def _normalized(scores: np.ndarray, method: str) -> np.ndarray:
+    """1リスト分のスコアを正規化"""
+    if method == "minmax":
+        low, high = scores.min(), scores.max()
+        return np.ones_like(scores) if high == low else (scores - low) / (high - low)
+    if method == "zscore":
+        std = scores.std()
+        return np.zeros_like(scores) if std == 0 else (scores - scores.mean()) / std
+    return scores
+
+
+def fuse_with_contributions(
+    result_lists: Sequence[List[Dict]],
+    weights: Optional[Sequence[float]] = None,
+    method: str = "rrf",
+    size: Optional[int] = None,
+    names: Optional[Sequence[str]] = None,
+    k: int = RRF_K
+) -> Tuple[List[Dict], Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    結果リストを融合
+
+    Args:
+        result_lists: 結果リスト（それぞれ順位順）
+        weights: リストごとの重み（省略時はすべて 1）
+        method: FUSION_METHODS のいずれか
+        size: 返す件数（省略時は全件）
+        names: 寄与の表示に使うリスト名（省略時は "0", "1", ...）
+        k: RRF の定数
+
+    Returns:
+        (融合後の hits（_score は融合スコア）,
+         {_id: {リスト名: {"rank": 順位, "score": 寄与}}}（返した hits の分だけ）)
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"unknown fusion method: {method}")
+    weights = [1.0] * len(result_lists) if weights is None else list(weights)
+    names = [str(i) for i in range(len(result_lists))] if names is None else list(names)
+    if len(weights) != len(result_lists) or len(names) != len(result_lists):
+        raise ValueError("weights and names must match the number of result lists")
+
+    # ドキュメントを通し番号に割り当て（最初に現れた hit を代表として保持）
+    positions: Dict[str, int] = {}
+    hits: List[Dict] = []
+    rows, contributions = [], []
+    for hits_in_list, weight in zip(result_lists, weights):
+        if not hits_in_list:
+            rows.append(np.zeros(0, dtype=np.int64))
+            contributions.append(np.zeros(0))
+            continue
+        row = np.empty(len(hits_in_list), dtype=np.int64)
+        for i, hit in enumerate(hits_in_list):
+            position = positions.get(hit["_id"])
+            if position is None:
+                position = positions[hit["_id"]] = len(hits)
+                hits.append(hit)
+            row[i] = position
+        if method == "rrf":
+            contribution = 1.0 / (k + np.arange(1, len(hits_in_list) + 1))
+        else:
+            raw = np.array([hit.get("_score") or 0.0 for hit in hits_in_list], dtype=np.float64)
+            contribution = _normalized(raw, method)
+        rows.append(row)
+        contributions.append(weight * contribution)
+
+    scores = np.zeros(len(hits))
+    for row, contribution in zip(rows, contributions):
+        np.add.at(scores, row, contribution)
+
+    # 上位 size 件だけをヒープで取り出す（同点は最初に現れた順）
+    ranked = scores.tolist()
+    top = heapq.nlargest(len(hits) if size is None else size, range(len(hits)), key=ranked.__getitem__)
+
+    fused = [{**hits[i], "_score": ranked[i]} for i in top]
+    wanted = set(top)
+    explain: Dict[str, Dict[str, Dict[str, float]]] = {hits[i]["_id"]: {} for i in top}
+    for name, row, contribution in zip(names, rows, contributions):
+        for rank, (position, score) in enumerate(zip(row.tolist(), contribution.tolist()), start=1):
+            if position in wanted and name not in explain[hits[position]["_id"]]:
+                explain[hits[position]["_id"]][name] = {"rank": rank, "score": score}
+    return fused, explain
+
+
+def fuse(
+    result_lists: Sequence[List[Dict]],
+    weights: Optional[Sequence[float]] = None,
+    method: str = "rrf",
+    size: Optional[int] = None,
+    k: int = RRF_K
+) -> List[Dict]:
+    """結果リストを融合（寄与を返さない版）"""
+    fused, _ = fuse_with_contributions(result_lists, weights=weights, method=method, size=size, k=k)
+    return fused
+
+
+def rrf_top_is_stable(
+    result_lists: Sequence[List[Dict]],
+    complete: Sequence[bool],
+    size: int,
+    weights: Optional[Sequence[float]] = None,
+    k: int = RRF_K
+) -> bool:
+    """
+    RRF の上位 size 件（顔ぶれと順序）が、各リストをさらに深く取得しても変わらないか（スコア差による上限判定）
+
+    取得済みの件数が n 件のリストで、まだ続きがある（complete でない）場合、
+    このリストに現れていないドキュメントが今後得られる寄与は最大 w / (k + n + 1)。
+    - 顔ぶれ: 上位 size 件の最下位スコア ≥ 圏外のドキュメント（未取得を含む）のスコア上限
+      （上位のドキュメントのスコアは増えるだけなので、圏外に落ちることはない）
+    - 順序: 上位の各ドキュメントのスコア ≥ 1つ下のドキュメントのスコア上限
+      （下のドキュメントが、まだ現れていないリストから寄与を得ても追い越せない）
+    """
+    if size <= 0:
+        return True
+    weights = [1.0] * len(result_lists) if weights is None else list(weights)
+    bounds = [0.0 if done else w / (k + len(hits) + 1) for hits, done, w in zip(result_lists, complete, weights)]
+
+    scores: Dict[str, float] = {}
+    seen: Dict[str, List[bool]] = {}
+    for i, (hits, w) in enumerate(zip(result_lists, weights)):
+        for rank, hit in enumerate(hits, start=1):
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + w / (k + rank)
+            seen.setdefault(hit["_id"], [False] * len(result_lists))[i] = True
+
+    def upper(doc_id: str) -> float:
+        return scores[doc_id] + sum(b for b, s in zip(bounds, seen[doc_id]) if not s)
+
+    top = heapq.nlargest(size, scores, key=scores.__getitem__)
+    if any(scores[above] < upper(below) for above, below in zip(top, top[1:])):
+        return False
+    threshold = scores[top[-1]] if len(top) == size else 0.0
+    # どのリストにも現れていないドキュメントの上限
+    challenger = sum(bounds)
+    wanted = set(top)
+    for doc_id in scores:
+        if doc_id not in wanted:
+            challenger = max(challenger, upper(doc_id))
+    return threshold >= challenger
@@ -0,0 +1,133 @@
+"""
+取り込みの差分更新
+- チャンクの _id を S3 キー + チャンク本文のハッシュから決定的に生成（再取り込みで重複しない）
+  位置に依存しないため、途中に文を挿入しても変わるのは境界が動いたチャンクだけ
+- ドキュメントごとのマニフェスト（_id → チャンク内容のハッシュ）を S3 に保存
+- 前回のマニフェストと比較し、追加・変更分の index と削除分の delete だけを bulk に送る
+- 文書単位のメタデータ（タグ等）はマニフェストに保存し、変わったときだけ update で各チャンクに反映する
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# マニフェストの保存先プレフィックス（取り込み元バケット内）
+INGEST_MANIFEST_PREFIX = os.getenv("INGEST_MANIFEST_PREFIX", "_manifests/")
+
+
+def document_id(source_key: str) -> str:
+    """S3 キーからドキュメントIDを生成"""
+    return hashlib.sha256(source_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id(source_key: str, text: str, occurrence: int = 0) -> str:
+    """チャンクの _id（ドキュメントID + チャンク本文のハッシュ + 同じ本文の中での出現順）"""
+    return f"{document_id(source_key)}-{_text_digest(text)}-{occurrence}"
+
+
+class ChunkIdAssigner:
+    """
+    1ドキュメントのチャンクに先頭から順に _id を割り当てる
+    同じ本文のチャンクは出現順で区別する（保持するのは本文のハッシュごとの出現回数だけ）
+    """
+
+    def __init__(self, source_key: str):
+        self.prefix = document_id(source_key)
+        self._seen: Dict[str, int] = {}
+
+    def __call__(self, text: str) -> str:
+        digest = _text_digest(text)
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+        return f"{self.prefix}-{digest}-{occurrence}"
+
+
+def chunk_hash(doc: Dict[str, Any], salt: str = "") -> str:
+    """
+    チャンク内容のハッシュ（本文・メタデータ）
+    salt に埋め込みモデルIDなどを渡すと、モデル変更時に全チャンクが変更扱いになる
+    """
+    payload = json.dumps(doc, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{salt}\0{payload}".encode("utf-8")).hexdigest()
+
+
+def diff_chunks(previous: Dict[str, str], current: Dict[str, str]) -> Dict[str, List[str]]:
+    """
+    前回と今回のマニフェスト（_id → ハッシュ）を比較
+
+    Returns:
+        {"added": [...], "changed": [...], "removed": [...], "unchanged": [...]}
+    """
+    diff: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for cid, digest in current.items():
+        if cid not in previous:
+            diff["added"].append(cid)
+        elif previous[cid] != digest:
+            diff["changed"].append(cid)
+        else:
+            diff["unchanged"].append(cid)
+    diff["removed"] = [cid for cid in previous if cid not in current]
+    return diff
+
+
+def bulk_actions(
+    index: str, docs: Dict[str, Dict[str, Any]], diff: Dict[str, List[str]]
+) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """差分に対応する bulk アクション（(アクション行, ドキュメント)、delete のドキュメントは None）"""
+    actions: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = []
+    for cid in diff["added"] + diff["changed"]:
+        actions.append(({"index": {"_index": index, "_id": cid}}, docs[cid]))
+    for cid in diff["removed"]:
+        actions.append(({"delete": {"_index": index, "_id": cid}}, None))
+    return actions
+
+
+def update_actions(
+    index: str, ids: List[str], doc: Dict[str, Any]
+) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """ids のチャンクに doc のフィールドを部分更新する bulk アクション"""
+    return [({"update": {"_index": index, "_id": cid}}, {"doc": doc}) for cid in ids]
+
+
+class S3ManifestStore:
+    """ドキュメントごとのマニフェストを S3 に JSON で保存"""
+
+    def __init__(self, client: Any, bucket: str, prefix: str = INGEST_MANIFEST_PREFIX):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, source_key: str) -> str:
+        return f"{self.prefix}{document_id(source_key)}.json"
+
+    def is_manifest(self, key: str) -> bool:
+        """マニフェスト自体の作成イベントを取り込み対象から除外するための判定"""
+        return key.startswith(self.prefix)
+
+    def load_manifest(self, source_key: str) -> Dict[str, Any]:
+        """前回のマニフェスト全体（なければ chunks が空のもの）"""
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self._key(source_key))["Body"].read()
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in ("NoSuchKey", "404"):
+                return {"source_key": source_key, "chunks": {}}
+            raise
+        return json.loads(body.decode("utf-8"))
+
+    def load(self, source_key: str) -> Dict[str, str]:
+        """前回のマニフェストの _id → ハッシュ（なければ空）"""
+        return self.load_manifest(source_key)["chunks"]
+
+    def save(self, source_key: str, chunks: Dict[str, str], extra: Optional[Dict[str, Any]] = None) -> None:
+        manifest = {"source_key": source_key, "chunks": chunks, **(extra or {})}
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(source_key),
+            Body=json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+            ContentType="application/json"
+        )
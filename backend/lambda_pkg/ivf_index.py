@@ -0,0 +1,220 @@
+"""
+近似最近傍（ANN）インデックス（IVF-PQ）
+- 粗い量子化: k-means の nlist 個のセントロイドで転置リストに分け、検索時はクエリに近い nprobe 個のリストだけを走査
+- 直積量子化（PQ）: セントロイドからの残差を m 個の部分空間に分け、部分空間ごとに 256 個の代表ベクトルの番号（uint8）で保持
+  （1024 次元・m=64 なら1件 64 バイト。float32 のベクトル 4096 バイトの 1/64）
+- 検索: 部分空間ごとの内積表（ADC）でコードから近似スコアを出し、上位 ef_search 件だけを元のベクトルで厳密に並べ直す
+- 学習（k-means）は NumPy の行列演算だけで行い、学習データは最大 IVF_TRAIN_SIZE 件のサンプル
+- 類似度は内積（Titan のベクトルは正規化済みのため内積 = コサイン類似度）
+- 既定値は nlist=√n / nprobe=128 / m=64 / ef_search=300（scripts/bench_ann.py の実測、1024 次元・1 vCPU）
+    10万件: 構築 41秒、recall@10 0.983・7.7ms（厳密 32ms）
+    20万件: 構築 51秒、recall@10 0.965・10.3ms（厳密 63ms）
+  nprobe=64 なら 10万件で recall@10 0.941・3.8ms（環境変数 IVF_NPROBE で調整）
+- ノード番号はベクトル行列の行番号と一致（HNSWIndex と同じインターフェース）
+- 構築・追加登録（学習済みのセントロイドとコードブックで符号化）・1ファイル（.npz）への保存 / 読み込みに対応
+"""
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+# nlist=0 は件数から自動（√n）
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "128"))
+IVF_PQ_M = int(os.getenv("IVF_PQ_M", "64"))
+IVF_EF_SEARCH = int(os.getenv("IVF_EF_SEARCH", "300"))
+IVF_TRAIN_SIZE = int(os.getenv("IVF_TRAIN_SIZE", "50000"))
+IVF_KMEANS_ITERATIONS = 10
+PQ_CODEBOOK_SIZE = 256
+# 最近傍セントロイドの割り当てを計算する行数の単位（一時配列のメモリを抑える）
+ASSIGN_BATCH_ROWS = 4096
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """各行に最も近い（二乗距離が最小の）セントロイドの番号"""
+    half_norms = (centroids * centroids).sum(axis=1) / 2
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_BATCH_ROWS):
+        block = np.asarray(data[start:start + ASSIGN_BATCH_ROWS], dtype=np.float32)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Lloyd 法の k-means（空になったクラスタはランダムな点で置き直す）"""
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = _nearest(data, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+        centroids[present] = np.add.reduceat(data[order], starts, axis=0) / counts[present, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    """転置リスト + 直積量子化のインデックス"""
+
+    def __init__(
+        self,
+        dimensions: int,
+        nlist: int = IVF_NLIST,
+        nprobe: int = IVF_NPROBE,
+        m: int = IVF_PQ_M,
+        ef_search: int = IVF_EF_SEARCH,
+        seed: int = 0
+    ):
+        if dimensions % m:
+            raise ValueError(f"dimensions ({dimensions}) must be divisible by m ({m})")
+        self.dimensions = dimensions
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.m = m
+        self.ef_search = ef_search
+        self.seed = seed
+        self.vectors: Optional[np.ndarray] = np.zeros((0, dimensions), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        # codebooks[部分空間] = (代表ベクトル数, dimensions / m)
+        self.codebooks: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.codes = np.zeros((0, m), dtype=np.uint8)
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, **params) -> "IVFPQIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        index = cls(vectors.shape[1], **params)
+        index.add(vectors)
+        return index
+
+    def train(self, vectors: np.ndarray) -> None:
+        """セントロイドとコードブックを学習（最大 IVF_TRAIN_SIZE 件のサンプル）"""
+        rng = np.random.default_rng(self.seed)
+        sample = vectors
+        if len(vectors) > IVF_TRAIN_SIZE:
+            sample = vectors[np.sort(rng.choice(len(vectors), IVF_TRAIN_SIZE, replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        nlist = self.nlist or int(round(math.sqrt(len(vectors))))
+        self.nlist = max(1, min(nlist, len(sample)))
+        self.centroids = _kmeans(sample, self.nlist, IVF_KMEANS_ITERATIONS, rng)
+
+        residuals = sample - self.centroids[_nearest(sample, self.centroids)]
+        ksub = min(PQ_CODEBOOK_SIZE, len(sample))
+        width = self.dimensions // self.m
+        self.codebooks = np.stack([
+            _kmeans(np.ascontiguousarray(residuals[:, j * width:(j + 1) * width]), ksub, IVF_KMEANS_ITERATIONS, rng)
+            for j in range(self.m)
+        ])
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(リスト番号, PQ コード) に符号化"""
+        assignments = _nearest(vectors, self.centroids)
+        residuals = vectors - self.centroids[assignments]
+        width = self.dimensions // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(residuals[:, j * width:(j + 1) * width], self.codebooks[j])
+        return assignments, codes
+
+    def add(self, vectors: np.ndarray) -> None:
+        """ベクトルを追加登録（ノード番号は登録順に続く。未学習なら最初に追加したベクトルで学習）"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        if not len(vectors):
+            return
+        if not self.trained:
+            self.train(vectors)
+        assignments, codes = self._encode(vectors)
+        self.assignments = np.concatenate([self.assignments, assignments])
+        self.codes = np.concatenate([self.codes, codes])
+        self.vectors = np.concatenate([self.vectors, vectors]) if len(self.vectors) else np.array(vectors)
+        self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        転置リスト（CSR 形式: リスト i の行番号は order[offsets[i]:offsets[i + 1]]）と、
+        同じ並びで部分空間ごとに連続させた PQ コード（(m, 件数)。表引きを部分空間単位の take にするため）
+        """
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(self.assignments, minlength=self.nlist))
+            self._lists = (order, offsets, np.ascontiguousarray(self.codes[order].T))
+        return self._lists
+
+    def search(self, query_vector, k: int = 10, ef: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        近似 top-k（近い nprobe 個のリストを ADC で走査し、上位 ef 件を元のベクトルで並べ直す）
+
+        Returns:
+            (ノード番号の配列, 類似度の配列)（類似度の高い順）
+        """
+        if not len(self) or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        coarse = self.centroids @ query
+        nprobe = min(self.nprobe, self.nlist)
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        order, offsets, list_codes = self._inverted_lists()
+        spans = [(offsets[i], offsets[i + 1]) for i in probe]
+        rows = np.concatenate([order[start:end] for start, end in spans])
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # 内積 ≈ クエリ・セントロイド + Σ 部分空間ごとのクエリ・代表ベクトル（表引き）
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.m, -1))
+        codes = np.concatenate([list_codes[:, start:end] for start, end in spans], axis=1)
+        approx = np.repeat(coarse[probe], [end - start for start, end in spans])
+        for j in range(self.m):
+            approx += table[j].take(codes[j])
+
+        depth = min(len(rows), max(ef or self.ef_search, k))
+        candidates = np.sort(rows[np.argpartition(-approx, depth - 1)[:depth]])
+        scores = np.asarray(self.vectors[candidates] @ query, dtype=np.float32)
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top].astype(np.int64), scores[top]
+
+    def save(self, path: str, include_vectors: bool = True) -> None:
+        """1ファイル（.npz）に保存"""
+        if not self.trained:
+            raise ValueError("cannot save an untrained index")
+        params = np.array([self.dimensions, self.nlist, self.nprobe, self.m, self.ef_search, self.seed], dtype=np.int64)
+        arrays = {
+            "params": params, "centroids": self.centroids, "codebooks": self.codebooks,
+            "assignments": self.assignments, "codes": self.codes,
+        }
+        if include_vectors:
+            arrays["vectors"] = self.vectors
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str, vectors: Optional[np.ndarray] = None) -> "IVFPQIndex":
+        """
+        保存したインデックスを読み込む
+        vectors を渡した場合はファイル内のベクトルを読まずにそれを使う（メモリマップの共有用）
+        """
+        with np.load(path) as data:
+            dimensions, nlist, nprobe, m, ef_search, seed = data["params"].tolist()
+            index = cls(dimensions, nlist=nlist, nprobe=nprobe, m=m, ef_search=ef_search, seed=seed)
+            index.centroids = data["centroids"]
+            index.codebooks = data["codebooks"]
+            index.assignments = data["assignments"]
+            index.codes = data["codes"]
+            index.vectors = data["vectors"] if vectors is None else vectors
+        if len(index.vectors) != len(index.assignments):
+            raise ValueError("vectors do not match the index")
+        return index
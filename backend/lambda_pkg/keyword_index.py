@@ -0,0 +1,158 @@
+"""
+ローカル BM25 インデックス（OpenSearch を使わないキーワード検索）
+- 和文（かな・漢字）は文字 bigram、英数字は単語単位でトークン化（NFKC・小文字化）
+- ポスティングは語ごとに「文書番号の差分（uint32）+ 出現回数（uint16）」の配列で保持
+- スコアは OpenSearch（Lucene）の BM25 と同じ式（k1=1.2, b=0.75）
+- filters は bm25_search と同じ OpenSearch のクエリ句（local_index.matches_filter で評価）
+- 1ファイル（.npz）への保存 / 読み込みに対応（_source はスナップショットの docs.jsonl を共有）
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from local_index import matches_filter
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 和文（かな・漢字・々）の連続と、英数字の単語
+TOKEN = re.compile(r"[ぁ-ヿ㐀-䶿一-鿿豈-﫿々]+|[a-z0-9]+")
+CJK_RUN = re.compile(r"[ぁ-ヿ㐀-䶿一-鿿豈-﫿々]")
+
+
+def tokenize(text: str) -> List[str]:
+    """テキストをトークン列に変換（和文は文字 bigram、1文字だけの和文はそのまま）"""
+    tokens: List[str] = []
+    for run in TOKEN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if CJK_RUN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class BM25Index:
+    """チャンク本文の転置インデックス"""
+
+    def __init__(
+        self,
+        ids: List[str],
+        sources: List[Dict[str, Any]],
+        doc_lengths: np.ndarray,
+        terms: List[str],
+        offsets: np.ndarray,
+        gaps: np.ndarray,
+        freqs: np.ndarray
+    ):
+        if len(ids) != len(sources) or len(ids) != len(doc_lengths):
+            raise ValueError("ids, sources and doc_lengths must have the same length")
+        self.ids = ids
+        self.sources = sources
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.terms = {term: i for i, term in enumerate(terms)}
+        # 語 i のポスティングは gaps[offsets[i]:offsets[i + 1]]（先頭は文書番号そのもの）
+        self.offsets = offsets
+        self.gaps = gaps
+        self.freqs = freqs
+
+    @classmethod
+    def build(cls, ids: List[str], sources: List[Dict[str, Any]], text_field: str = "text") -> "BM25Index":
+        """ids と _source のリストから構築"""
+        postings: Dict[str, List[int]] = {}
+        counts: Dict[str, List[int]] = {}
+        doc_lengths = np.zeros(len(sources), dtype=np.uint32)
+        for doc, source in enumerate(sources):
+            tokens = tokenize(str(source.get(text_field) or ""))
+            doc_lengths[doc] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append(doc)
+                counts.setdefault(term, []).append(tf)
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        gaps = np.empty(int(offsets[-1]), dtype=np.uint32)
+        freqs = np.empty(int(offsets[-1]), dtype=np.uint16)
+        for i, term in enumerate(terms):
+            docs = np.asarray(postings[term], dtype=np.int64)
+            gaps[offsets[i]:offsets[i + 1]] = np.diff(docs, prepend=0)
+            freqs[offsets[i]:offsets[i + 1]] = np.minimum(counts[term], np.iinfo(np.uint16).max)
+        return cls(list(ids), list(sources), doc_lengths, terms, offsets, gaps, freqs)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def postings(self, term: str):
+        """語の (文書番号の配列, 出現回数の配列)。未登録の語は None"""
+        i = self.terms.get(term)
+        if i is None:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return np.cumsum(self.gaps[start:end], dtype=np.int64), self.freqs[start:end]
+
+    def scores(self, query: str) -> np.ndarray:
+        """全チャンクの BM25 スコア（クエリの語を1つも含まないチャンクは 0）"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        if not len(self):
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize(query)):
+            found = self.postings(term)
+            if found is None:
+                continue
+            docs, tf = found
+            idf = np.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            tf = tf.astype(np.float32)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query: str, size: int = 10, filters: Optional[Any] = None) -> List[Dict]:
+        """BM25 スコアの上位 size 件（OpenSearch の hits 形式）"""
+        if size <= 0:
+            return []
+        scores = self.scores(query)
+        matched = scores > 0
+        if filters:
+            matched &= np.fromiter((matches_filter(s, filters) for s in self.sources), dtype=bool, count=len(self))
+        rows = np.flatnonzero(matched)
+        if len(rows) == 0:
+            return []
+        size = min(size, len(rows))
+        top = rows[np.argpartition(-scores[rows], size - 1)[:size]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {"_id": self.ids[row], "_score": float(scores[row]), "_source": dict(self.sources[row])}
+            for row in top
+        ]
+
+    def save(self, path: str) -> None:
+        """1ファイル（.npz）に保存（_source は含めない）"""
+        terms = sorted(self.terms, key=self.terms.get)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                ids=np.array(self.ids, dtype=str),
+                terms=np.array(terms, dtype=str),
+                doc_lengths=self.doc_lengths,
+                offsets=self.offsets,
+                gaps=self.gaps,
+                freqs=self.freqs,
+            )
+
+    @classmethod
+    def load(cls, path: str, sources: Iterable[Dict[str, Any]]) -> "BM25Index":
+        """保存したインデックスを読み込む（sources はスナップショットの _source、保存時と同じ順）"""
+        with np.load(path) as data:
+            return cls(
+                data["ids"].tolist(),
+                list(sources),
+                data["doc_lengths"],
+                data["terms"].tolist(),
+                data["offsets"],
+                data["gaps"],
+                data["freqs"],
+            )
@@ -0,0 +1,364 @@
+"""
+ローカル検索エンジン（OpenSearch を使わない検索）
+- チャンクのベクトル（float32 行列）とメタデータをスナップショット（ローカル / S3）から読み込み
+- ベクトルはメモリマップで保持し、NumPy の内積で厳密な top-k を計算
+  （Titan のベクトルは正規化済みのため内積 = コサイン類似度）
+- ANN インデックス（ann_index の HNSW グラフ、または ivf_index の IVF-PQ）があり、
+  チャンク数が ANN_MIN_DOCS 以上の場合は近似検索に切り替え
+- BM25 インデックス（keyword_index）がある場合はキーワード検索も可能（BM25 / kNN とも検索自体はローカルで実行）
+- クエリの埋め込みは既定では Bedrock を呼ぶ。LOCAL_INDEX_OFFLINE=true の場合は Bedrock を呼ばず、
+  クエリ埋め込みキャッシュ（QUERY_EMBED_CACHE_PATH の SQLite を含む）にあるクエリだけ kNN を使い、ないクエリは BM25 のみ
+- OpenSearchClient と同じ bm25_search / knn_search / hybrid_search のインターフェース
+- filters は OpenSearch のクエリ句（term / terms / match / range / exists / bool）をローカルで評価
+
+スナップショットの構成:
+    vectors.npy  … (チャンク数, 次元数) の float32 行列
+    docs.jsonl   … 1行1チャンクの {"_id": ..., "_source": {...}}（vector を除く）
+    hnsw.npz     … HNSW グラフ（任意。ベクトルは vectors.npy を共有）
+    ivfpq.npz    … IVF-PQ インデックス（任意。hnsw.npz の代わり。ベクトルは vectors.npy を共有）
+    keywords.npz … BM25 の転置インデックス（任意。_source は docs.jsonl を共有）
+"""
+import json
+import math
+import operator
+import os
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from ann_index import HNSWIndex
+from ivf_index import IVFPQIndex
+from embedding_cache import EmbeddingCache, normalize_query, vector_key
+from opensearch_client import EMBED_DIMENSIONS, EMBED_MODEL, QUERY_EMBEDDING_CACHE, OpenSearchClient
+
+# スナップショットの場所（ローカルディレクトリまたは s3://bucket/prefix）
+LOCAL_INDEX_URI = os.getenv("LOCAL_INDEX_URI", "")
+# S3 のスナップショットをダウンロードする場所
+LOCAL_INDEX_CACHE_DIR = os.getenv("LOCAL_INDEX_CACHE_DIR", "/tmp/local_index")
+# true の場合はクエリ埋め込みに Bedrock を呼ばない（クエリ埋め込みキャッシュにないクエリは kNN を省き BM25 のみ）
+LOCAL_INDEX_OFFLINE = os.getenv("LOCAL_INDEX_OFFLINE", "false").lower() == "true"
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+ANN_FILE = "hnsw.npz"
+IVF_FILE = "ivfpq.npz"
+KEYWORDS_FILE = "keywords.npz"
+OPTIONAL_FILES = (ANN_FILE, IVF_FILE, KEYWORDS_FILE)
+# 近似検索の方式ごとの (ファイル名, クラス)
+ANN_KINDS = {"hnsw": (ANN_FILE, HNSWIndex), "ivfpq": (IVF_FILE, IVFPQIndex)}
+
+# 近似検索を使う最小チャンク数（これ未満は厳密検索の方が速い）
+# 1024 次元・ef_search=40 の実測（scripts/bench_ann.py）: 3千件は厳密 0.69ms / HNSW 1.59ms、
+# 1万件は厳密 2.52ms / HNSW 1.28ms、2万件は厳密 6.83ms / HNSW 1.68ms
+ANN_MIN_DOCS = int(os.getenv("ANN_MIN_DOCS", "10000"))
+# フィルタに一致するチャンクの割合がこれ未満なら、近似検索ではなく一致したチャンクだけを厳密検索
+ANN_FILTER_MIN_RATIO = float(os.getenv("ANN_FILTER_MIN_RATIO", "0.05"))
+
+
+def _field_values(source: Dict[str, Any], field: str) -> List[Any]:
+    """フィールドの値をリストで取得（"xxx.keyword" は xxx として扱う）"""
+    if field.endswith(".keyword"):
+        field = field[:-len(".keyword")]
+    value = source.get(field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _clause_value(spec: Any, key: str = "value") -> Any:
+    """{"field": "x"} と {"field": {"value": "x"}} の両方の書式に対応"""
+    return spec.get(key) if isinstance(spec, dict) else spec
+
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+RANGE_OPERATORS = {"gte": operator.ge, "gt": operator.gt, "lte": operator.le, "lt": operator.lt}
+
+
+def _in_range(value: Any, spec: Dict[str, Any]) -> bool:
+    """range 句の判定（閾値が数値なら数値、それ以外は文字列で比較。ISO 形式の日付は文字列比較で正しく並ぶ）"""
+    for op, threshold in spec.items():
+        if op not in RANGE_OPERATORS:
+            continue
+        if isinstance(threshold, (int, float)):
+            left, right = float(value), float(threshold)
+        else:
+            left, right = str(value), str(threshold)
+        if not RANGE_OPERATORS[op](left, right):
+            return False
+    return True
+
+
+def matches_filter(source: Dict[str, Any], clause: Any) -> bool:
+    """OpenSearch のフィルタ句を1件のドキュメントに適用"""
+    if not clause:
+        return True
+    if isinstance(clause, list):
+        return all(matches_filter(source, c) for c in clause)
+
+    (kind, body), = clause.items()
+    if kind == "bool":
+        must = _as_list(body.get("must", [])) + _as_list(body.get("filter", []))
+        should = _as_list(body.get("should", []))
+        must_not = _as_list(body.get("must_not", []))
+        if not all(matches_filter(source, c) for c in must):
+            return False
+        if any(matches_filter(source, c) for c in must_not):
+            return False
+        minimum = body.get("minimum_should_match", 0 if (must or must_not) else 1)
+        return not should or sum(matches_filter(source, c) for c in should) >= int(minimum)
+    if kind == "match_all":
+        return True
+    if kind == "exists":
+        return bool(_field_values(source, body["field"]))
+
+    (field, spec), = body.items()
+    values = _field_values(source, field)
+    if kind == "term":
+        return _clause_value(spec) in values
+    if kind == "terms":
+        return any(v in values for v in spec)
+    if kind in ("match", "match_phrase"):
+        needle = str(_clause_value(spec, "query")).lower()
+        return any(needle in str(v).lower() for v in values)
+    if kind == "range":
+        return any(_in_range(v, spec) for v in values)
+    raise ValueError(f"unsupported filter clause: {kind}")
+
+
+class VectorIndex:
+    """チャンクベクトルの検索インデックス（ANN インデックスがあれば近似検索、なければ厳密検索）"""
+
+    def __init__(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        sources: List[Dict[str, Any]],
+        ann: Optional[Union[HNSWIndex, IVFPQIndex]] = None
+    ):
+        if len(ids) != len(vectors) or len(ids) != len(sources):
+            raise ValueError("ids, vectors and sources must have the same length")
+        if ann is not None and len(ann) != len(ids):
+            raise ValueError("ann index does not match the vectors")
+        self.ids = ids
+        self.vectors = vectors
+        self.sources = sources
+        self.ann = ann
+
+    @staticmethod
+    def _split_docs(docs: Iterable[Dict[str, Any]], vector_field: str):
+        ids, rows, sources = [], [], []
+        for doc in docs:
+            source = dict(doc["_source"])
+            rows.append(source.pop(vector_field))
+            ids.append(doc["_id"])
+            sources.append(source)
+        return ids, np.asarray(rows, dtype=np.float32).reshape(len(rows), -1), sources
+
+    @classmethod
+    def build(cls, docs: Iterable[Dict[str, Any]], vector_field: str = "vector") -> "VectorIndex":
+        """{"_id", "_source": {..., "vector": [...]}} のリストから構築"""
+        return cls(*cls._split_docs(docs, vector_field))
+
+    def build_ann(self, kind: str = "hnsw", **params) -> Union[HNSWIndex, IVFPQIndex]:
+        """
+        ANN インデックスを構築
+        kind="hnsw": params は HNSWIndex の m / ef_construction / ef_search（構築は Python のループで数万件まで）
+        kind="ivfpq": params は IVFPQIndex の nlist / nprobe / m / ef_search（構築は行列演算で 10 万件以上向け）
+        """
+        if kind not in ANN_KINDS:
+            raise ValueError(f"unknown ann kind: {kind}")
+        self.ann = ANN_KINDS[kind][1].build(self.vectors, **params)
+        return self.ann
+
+    def add(self, docs: Iterable[Dict[str, Any]], vector_field: str = "vector") -> None:
+        """チャンクを追加登録（ANN インデックスにも追加）"""
+        ids, vectors, sources = self._split_docs(docs, vector_field)
+        if not ids:
+            return
+        self.ids = self.ids + ids
+        self.sources = self.sources + sources
+        self.vectors = np.concatenate([self.vectors, vectors]) if len(self.vectors) else vectors
+        if self.ann is not None:
+            self.ann.add(vectors)
+            # インデックス側のコピーを共有し、ベクトルを二重に持たない
+            self.vectors = self.ann.vectors
+
+    def save(self, path: str) -> None:
+        """スナップショットとして保存"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, VECTORS_FILE), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(path, DOCS_FILE), "w", encoding="utf-8") as f:
+            for doc_id, source in zip(self.ids, self.sources):
+                f.write(json.dumps({"_id": doc_id, "_source": source}, ensure_ascii=False) + "\n")
+        if self.ann is not None:
+            name = IVF_FILE if isinstance(self.ann, IVFPQIndex) else ANN_FILE
+            self.ann.save(os.path.join(path, name), include_vectors=False)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """スナップショットを読み込む（ベクトルはメモリマップ）"""
+        vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        ids, sources = [], []
+        with open(os.path.join(path, DOCS_FILE), encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                ids.append(doc["_id"])
+                sources.append(doc["_source"])
+        ann = None
+        for name, ann_cls in ANN_KINDS.values():
+            ann_path = os.path.join(path, name)
+            if os.path.exists(ann_path):
+                ann = ann_cls.load(ann_path, vectors=vectors)
+                break
+        return cls(ids, vectors, sources, ann)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def filter_mask(self, filters: Optional[Any]) -> Optional[np.ndarray]:
+        """フィルタに一致するチャンクの真偽値配列（フィルタなしは None）"""
+        if not filters:
+            return None
+        return np.fromiter((matches_filter(s, filters) for s in self.sources), dtype=bool, count=len(self.sources))
+
+    def hits(self, rows: Iterable[int], scores: Iterable[float]) -> List[Dict]:
+        """行番号とスコアを OpenSearch の hits 形式に変換"""
+        return [
+            {"_id": self.ids[row], "_score": float(score), "_source": dict(self.sources[row])}
+            for row, score in zip(rows, scores)
+        ]
+
+    def exact_search(self, query_vector: List[float], size: int = 10, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        """内積の上位 size 件（全件との内積による厳密検索）"""
+        if len(self) == 0 or size <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        rows = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if len(rows) == 0:
+            return []
+        scores = (self.vectors if mask is None else self.vectors[rows]) @ query
+        size = min(size, len(scores))
+        # 上位 size 件だけを部分ソート
+        top = np.argpartition(-scores, size - 1)[:size]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.hits(rows[top], scores[top])
+
+    def search(self, query_vector: List[float], size: int = 10, filters: Optional[Any] = None) -> List[Dict]:
+        """
+        内積の上位 size 件
+        ANN インデックスがあり ANN_MIN_DOCS 件以上なら近似検索。フィルタ付きは候補数を一致率に応じて広げ、
+        一致が少ない・件数が足りない場合は一致したチャンクだけを厳密検索する
+        """
+        if len(self) == 0 or size <= 0:
+            return []
+        mask = self.filter_mask(filters)
+        if self.ann is None or len(self) < ANN_MIN_DOCS:
+            return self.exact_search(query_vector, size, mask)
+        if mask is None:
+            rows, scores = self.ann.search(query_vector, k=size)
+            return self.hits(rows, scores)
+
+        ratio = float(mask.mean())
+        if ratio < ANN_FILTER_MIN_RATIO:
+            return self.exact_search(query_vector, size, mask)
+        k = min(len(self), int(math.ceil(max(size, self.ann.ef_search) / ratio)))
+        rows, scores = self.ann.search(query_vector, k=k, ef=k)
+        keep = mask[rows]
+        if int(keep.sum()) < size:
+            return self.exact_search(query_vector, size, mask)
+        return self.hits(rows[keep][:size], scores[keep][:size])
+
+
+def fetch_snapshot(uri: str, cache_dir: str = LOCAL_INDEX_CACHE_DIR) -> str:
+    """スナップショットのローカルパスを返す（S3 の場合は cache_dir にダウンロード）"""
+    if not uri.startswith("s3://"):
+        return uri
+    import boto3
+    from botocore.exceptions import ClientError
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "ap-northeast-1"))
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in (VECTORS_FILE, DOCS_FILE) + OPTIONAL_FILES:
+        key = f"{prefix.strip('/')}/{name}" if prefix.strip("/") else name
+        try:
+            s3.download_file(bucket, key, os.path.join(cache_dir, name))
+        except ClientError:
+            # ANN インデックス・BM25 インデックスは任意
+            if name not in OPTIONAL_FILES:
+                raise
+            if os.path.exists(os.path.join(cache_dir, name)):
+                os.remove(os.path.join(cache_dir, name))
+    return cache_dir
+
+
+class LocalSearchClient(OpenSearchClient):
+    """
+    ローカルインデックスを使う OpenSearchClient 互換クライアント
+    クエリ埋め込みは Bedrock（offline の場合はクエリ埋め込みキャッシュだけを引く）
+    """
+
+    def __init__(
+        self,
+        vector_index: VectorIndex,
+        keyword_index: Optional[Any] = None,
+        offline: bool = LOCAL_INDEX_OFFLINE,
+        query_cache: Optional[EmbeddingCache] = QUERY_EMBEDDING_CACHE
+    ):
+        self.vector_index = vector_index
+        self.keyword_index = keyword_index
+        self.offline = offline
+        self.query_cache = query_cache
+        self.region = os.environ.get('AWS_REGION', 'ap-northeast-1')
+        self.index_name = "local"
+        self.endpoint = None
+        self._bedrock = None
+
+    @classmethod
+    def from_uri(cls, uri: str = LOCAL_INDEX_URI) -> "LocalSearchClient":
+        """スナップショットから生成（cold start 時に1回だけ）"""
+        if not uri:
+            raise ValueError("環境変数 LOCAL_INDEX_URI が設定されていません")
+        path = fetch_snapshot(uri)
+        vector_index = VectorIndex.load(path)
+        keyword_index = None
+        if os.path.exists(os.path.join(path, KEYWORDS_FILE)):
+            # keyword_index は matches_filter を使うため、ここで読み込む
+            from keyword_index import BM25Index
+            keyword_index = BM25Index.load(os.path.join(path, KEYWORDS_FILE), vector_index.sources)
+            if keyword_index.ids != vector_index.ids:
+                raise ValueError("keyword index does not match the snapshot")
+        return cls(vector_index, keyword_index)
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        クエリのベクトル
+        offline の場合はクエリ埋め込みキャッシュだけを引き、ない場合は LookupError
+        （ハイブリッド検索では埋め込みレッグの失敗として kNN を省き、BM25 の結果だけを返す）
+        """
+        if not self.offline:
+            return super().embed_query(query)
+        key = vector_key(normalize_query(query), EMBED_MODEL, EMBED_DIMENSIONS)
+        vector = self.query_cache.get(key) if self.query_cache is not None else None
+        if vector is None:
+            raise LookupError("query embedding is not available offline")
+        return vector
+
+    def bm25_search(self, query: str, size: int = 10, filters: Optional[Dict] = None) -> List[Dict]:
+        """キーワード検索（キーワードインデックスがない場合は空）"""
+        if self.keyword_index is None:
+            return []
+        return self.keyword_index.search(query, size=size, filters=filters)
+
+    def knn_search(self, query_vector: List[float], size: int = 10, filters: Optional[Dict] = None, vector_field: str = "vector") -> List[Dict]:
+        """kNN（ベクトル）検索"""
+        return self.vector_index.search(query_vector, size=size, filters=filters)
+
+    def health_check(self) -> Dict:
+        return {
+            "status": "ok", "index": self.index_name, "exists": True, "docs": len(self.vector_index),
+            "ann": self.vector_index.ann is not None, "keywords": self.keyword_index is not None,
+            "offline": self.offline,
+        }
@@ -4,14 +4,102 @@ BM25 / kNN / RRF / Hybrid Search 対応
 """
 import os
 import json
+import threading
+import time
 import boto3
-from typing import List, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from requests_aws4auth import AWS4Auth
 import requests
-from tenacity import retry, stop_after_attempt, wait_fixed
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from tenacity import retry, stop_after_attempt, stop_after_delay, wait_fixed
 
-# リトライ設定：最大3回、2秒間隔
-retry_config = retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+from embedding_cache import build_query_cache_from_env, normalize_query, vector_key
+from fusion import RRF_K, fuse, fuse_with_contributions, rrf_top_is_stable
+
+# ハイブリッド検索の各レッグ（埋め込み / BM25 / kNN）のタイムアウト（秒）
+HYBRID_LEG_TIMEOUT = float(os.environ.get('HYBRID_LEG_TIMEOUT', '10'))
+# OpenSearch への1回のリクエストのタイムアウト（秒）
+OPENSEARCH_REQUEST_TIMEOUT = float(os.environ.get('OPENSEARCH_REQUEST_TIMEOUT', str(HYBRID_LEG_TIMEOUT)))
+
+# リトライ設定：最大3回、2秒間隔。レッグのタイムアウトを過ぎたら打ち切る
+# （待つのをやめたレッグがリトライを続けてスレッドを占有しないように）
+retry_config = retry(stop=stop_after_attempt(3) | stop_after_delay(HYBRID_LEG_TIMEOUT), wait=wait_fixed(2))
+
+# keep-alive 接続プールの大きさ
+OPENSEARCH_POOL_SIZE = int(os.environ.get('OPENSEARCH_POOL_SIZE', '10'))
+
+# warm Lambda 間で共有する HTTP セッションと SigV4 署名
+_SESSION: Optional[requests.Session] = None
+_AUTH: Dict[str, AuthBase] = {}
+_SHARED_LOCK = threading.Lock()
+
+# レッグを並列実行するスレッドプール（warm Lambda 間で共有）
+# 打ち切ったレッグが残っていても後続リクエストのレッグが待たされないよう、1リクエストの最大レッグ数より多めに確保
+HYBRID_WORKERS = int(os.environ.get('HYBRID_WORKERS', '16'))
+_EXECUTOR = ThreadPoolExecutor(max_workers=HYBRID_WORKERS)
+
+# ハイブリッド検索の融合方式（fusion.FUSION_METHODS）とレッグごとの重み
+HYBRID_FUSION_METHOD = os.environ.get('HYBRID_FUSION_METHOD', 'rrf')
+HYBRID_BM25_WEIGHT = float(os.environ.get('HYBRID_BM25_WEIGHT', '1.0'))
+HYBRID_KNN_WEIGHT = float(os.environ.get('HYBRID_KNN_WEIGHT', '1.0'))
+# 候補数の適応制御（RRF のみ）: size 件から始め、上位が安定するまで各レッグの取得件数を倍にする（上限 HYBRID_MAX_DEPTH）
+HYBRID_ADAPTIVE = os.environ.get('HYBRID_ADAPTIVE', 'false').lower() == 'true'
+HYBRID_MAX_DEPTH = int(os.environ.get('HYBRID_MAX_DEPTH', '100'))
+
+# クエリ埋め込みのモデルと次元数（インデックスの knn_vector と一致させる）
+EMBED_MODEL = os.environ.get('BEDROCK_EMBEDDINGS_MODEL_ID', 'amazon.titan-embed-text-v2:0')
+EMBED_DIMENSIONS = 1024
+# クエリ埋め込みキャッシュ（QUERY_EMBED_CACHE_SIZE=0 で無効）
+QUERY_EMBEDDING_CACHE = build_query_cache_from_env()
+
+
+def _rrf(*result_lists: List[Dict], k: int = RRF_K) -> List[Dict]:
+    """複数の結果リストを等しい重みの RRF でマージ"""
+    return fuse(result_lists, method="rrf", k=k)
+
+
+class _LockedAuth(AuthBase):
+    """AWS4Auth は署名鍵をリクエストごとに更新するため、スレッド間で直列化する"""
+    
+    def __init__(self, auth: AWS4Auth):
+        self.auth = auth
+        self._lock = threading.Lock()
+    
+    def __call__(self, request):
+        with self._lock:
+            return self.auth(request)
+
+
+def get_session() -> requests.Session:
+    """keep-alive の接続プールを持つ共有セッションを取得（TLS ハンドシェイクを再利用）"""
+    global _SESSION
+    with _SHARED_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=OPENSEARCH_POOL_SIZE, pool_maxsize=OPENSEARCH_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSION = session
+        return _SESSION
+
+
+def get_auth(region: str) -> AuthBase:
+    """
+    共有の SigV4 署名を取得
+    botocore の認証情報を refreshable_credentials として渡すため、
+    一時認証情報は期限切れ前に自動で更新される
+    """
+    with _SHARED_LOCK:
+        if region not in _AUTH:
+            credentials = boto3.Session().get_credentials()
+            _AUTH[region] = _LockedAuth(AWS4Auth(
+                region=region,
+                service='aoss',
+                refreshable_credentials=credentials
+            ))
+        return _AUTH[region]
 
 
 class OpenSearchClient:
@@ -26,14 +114,9 @@ class OpenSearchClient:
         self.region = os.environ.get('AWS_REGION', 'ap-northeast-1')
         self.index_name = os.environ.get('OPENSEARCH_INDEX', 'knowledge-base')
         
-        credentials = boto3.Session().get_credentials()
-        self.auth = AWS4Auth(
-            credentials.access_key,
-            credentials.secret_key,
-            self.region,
-            'aoss',
-            session_token=credentials.token
-        )
+        self.auth = get_auth(self.region)
+        self.session = get_session()
+        self._bedrock = None
         
         self.base_url = f"https://{self.endpoint}"
     
@@ -47,7 +130,7 @@ class OpenSearchClient:
         body = {"query": {"bool": {"must": must_clause}}, "size": size}
         url = f"{self.base_url}/{self.index_name}/_search"
         
-        response = requests.post(url, auth=self.auth, headers={"Content-Type": "application/json"}, json=body, timeout=30)
+        response = self.session.post(url, auth=self.auth, headers={"Content-Type": "application/json"}, json=body, timeout=OPENSEARCH_REQUEST_TIMEOUT)
         response.raise_for_status()
         
         return response.json().get('hits', {}).get('hits', [])
@@ -76,61 +159,186 @@ class OpenSearchClient:
             }
         
         url = f"{self.base_url}/{self.index_name}/_search"
-        response = requests.post(url, auth=self.auth, headers={"Content-Type": "application/json"}, json=body, timeout=30)
+        response = self.session.post(url, auth=self.auth, headers={"Content-Type": "application/json"}, json=body, timeout=OPENSEARCH_REQUEST_TIMEOUT)
         response.raise_for_status()
         
         return response.json().get('hits', {}).get('hits', [])
     
     @staticmethod
-    def rrf_merge(bm25_results: List[Dict], knn_results: List[Dict], k: int = 60) -> List[Dict]:
+    def rrf_merge(bm25_results: List[Dict], knn_results: List[Dict], k: int = RRF_K) -> List[Dict]:
         """BM25 と kNN の結果を RRF でマージ"""
-        scores = {}
-        
-        for rank, hit in enumerate(bm25_results, start=1):
-            doc_id = hit['_id']
-            scores[doc_id] = scores.get(doc_id, 0) + (1.0 / (k + rank))
+        return _rrf(bm25_results, knn_results, k=k)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """クエリを Titan Embedding v2 でベクトル化（正規化したクエリ単位でキャッシュ）"""
+        text = normalize_query(query)
+        key = vector_key(text, EMBED_MODEL, EMBED_DIMENSIONS)
+        if QUERY_EMBEDDING_CACHE is not None:
+            cached = QUERY_EMBEDDING_CACHE.get(key)
+            if cached is not None:
+                return cached
         
-        for rank, hit in enumerate(knn_results, start=1):
-            doc_id = hit['_id']
-            scores[doc_id] = scores.get(doc_id, 0) + (1.0 / (k + rank))
+        if self._bedrock is None:
+            self._bedrock = boto3.client('bedrock-runtime', region_name=self.region)
         
-        doc_map = {}
-        for hit in bm25_results + knn_results:
-            doc_map[hit['_id']] = hit
+        embed_response = self._bedrock.invoke_model(
+            modelId=EMBED_MODEL,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps({"inputText": text, "dimensions": EMBED_DIMENSIONS, "normalize": True})
+        )
         
-        merged = []
-        for doc_id, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
-            doc = doc_map[doc_id].copy()
-            doc['_score'] = score
-            merged.append(doc)
+        embedding = json.loads(embed_response['body'].read())['embedding']
+        if QUERY_EMBEDDING_CACHE is not None:
+            QUERY_EMBEDDING_CACHE.put(key, embedding)
+        return embedding
+    
+    @staticmethod
+    def _timed(fn: Callable, *args, **kwargs) -> Tuple[Any, int]:
+        """関数を実行し、(結果, 所要ミリ秒) を返す"""
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        return result, int((time.perf_counter() - start) * 1000)
+    
+    @staticmethod
+    def _collect(future: Future, leg: str, deadline: float, stats: Dict) -> Optional[Any]:
+        """レッグの結果を期限まで待つ（タイムアウト・失敗時は None）"""
+        try:
+            result, elapsed_ms = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            future.cancel()
+            stats["legs"][leg] = "timeout"
+            return None
+        except Exception as e:
+            print(f"Hybrid search leg '{leg}' failed: {str(e)}")
+            stats["legs"][leg] = "error"
+            return None
+        stats["legs"][leg] = "ok"
+        stats["timings"][f"{leg}_ms"] = elapsed_ms
+        return result
+    
+    def _widen(self, query: str, query_vector: Optional[List[float]], filters: Optional[Dict], depths: Dict[str, int], stats: Dict) -> Dict[str, Optional[List[Dict]]]:
+        """
+        指定したレッグを depths の件数で取り直す（失敗・タイムアウトしたレッグは None）
+        失敗・タイムアウトは stats["legs"] に "widen_error" / "widen_timeout" として残す
+        """
+        futures = {}
+        if "bm25" in depths:
+            futures["bm25"] = _EXECUTOR.submit(self._timed, self.bm25_search, query, size=depths["bm25"], filters=filters)
+        if "knn" in depths:
+            futures["knn"] = _EXECUTOR.submit(self._timed, self.knn_search, query_vector, size=depths["knn"], filters=filters)
         
-        return merged
+        deadline = time.perf_counter() + HYBRID_LEG_TIMEOUT
+        results: Dict[str, Optional[List[Dict]]] = {}
+        for leg, future in futures.items():
+            try:
+                hits, elapsed_ms = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"Hybrid search leg '{leg}' timed out while widening to {depths[leg]}")
+                stats["legs"][leg] = "widen_timeout"
+                results[leg] = None
+                continue
+            except Exception as e:
+                print(f"Hybrid search leg '{leg}' failed while widening: {str(e)}")
+                stats["legs"][leg] = "widen_error"
+                results[leg] = None
+                continue
+            stats["timings"][f"{leg}_ms"] = stats["timings"].get(f"{leg}_ms", 0) + elapsed_ms
+            results[leg] = hits
+        return results
     
-    def hybrid_search(self, query: str, size: int = 10, filters: Optional[Dict] = None) -> List[Dict]:
-        """ハイブリッド検索を実行（BM25 + kNN → RRF マージ）"""
-        bedrock = boto3.client('bedrock-runtime', region_name=self.region)
+    def hybrid_search_with_stats(self, query: str, size: int = 10, filters: Optional[Dict] = None, adaptive: Optional[bool] = None) -> Tuple[List[Dict], Dict]:
+        """
+        ハイブリッド検索を実行（BM25 + kNN → HYBRID_FUSION_METHOD で融合）
+        BM25 とクエリ埋め込みを同時に開始し、ベクトルが得られ次第 kNN を実行する
+        いずれかのレッグが失敗・タイムアウトした場合は残りのレッグの結果だけを返す
         
-        embed_response = bedrock.invoke_model(
-            modelId='amazon.titan-embed-text-v2:0',
-            contentType='application/json',
-            accept='application/json',
-            body=json.dumps({"inputText": query, "dimensions": 1024, "normalize": True})
-        )
+        adaptive（省略時は HYBRID_ADAPTIVE）の場合は各レッグ size 件から始め、RRF の上位 size 件の顔ぶれと順序が
+        安定する（fusion.rrf_top_is_stable）まで、続きのあるレッグの取得件数を倍にして取り直す
+        取り直しに失敗したレッグは取得済みの結果で確定し、legs に "widen_timeout" / "widen_error" を記録する
+        （RRF 以外の融合方式では常に size*2 件）
+        
+        Returns:
+            (検索結果, {"legs": レッグごとの状態, "timings": レッグごとの所要ミリ秒,
+                        "depth": レッグごとの最終的な取得件数, "rounds": 取得の回数,
+                        "fusion": 融合方式・重みと、結果ごとの各レッグの順位・寄与,
+                        "embed_cache": クエリ埋め込みキャッシュのヒット率など})
+        """
+        start = time.perf_counter()
+        stats: Dict[str, Dict] = {"legs": {}, "timings": {}}
+        adaptive = (HYBRID_ADAPTIVE if adaptive is None else adaptive) and HYBRID_FUSION_METHOD == "rrf"
+        depth = size if adaptive else size*2
+        
+        bm25_future = _EXECUTOR.submit(self._timed, self.bm25_search, query, size=depth, filters=filters)
+        embed_future = _EXECUTOR.submit(self._timed, self.embed_query, query)
+        
+        knn_results = None
+        query_vector = self._collect(embed_future, "embed", start + HYBRID_LEG_TIMEOUT, stats)
+        if query_vector is not None:
+            knn_start = time.perf_counter()
+            knn_future = _EXECUTOR.submit(self._timed, self.knn_search, query_vector, size=depth, filters=filters)
+        else:
+            stats["legs"]["knn"] = "skipped"
         
-        embed_result = json.loads(embed_response['body'].read())
-        query_vector = embed_result['embedding']
+        bm25_results = self._collect(bm25_future, "bm25", start + HYBRID_LEG_TIMEOUT, stats)
+        if query_vector is not None:
+            knn_results = self._collect(knn_future, "knn", knn_start + HYBRID_LEG_TIMEOUT, stats)
         
-        bm25_results = self.bm25_search(query, size=size*2, filters=filters)
-        knn_results = self.knn_search(query_vector, size=size*2, filters=filters)
+        if bm25_results is None and knn_results is None:
+            raise RuntimeError(f"ハイブリッド検索の全レッグが失敗しました: {stats['legs']}")
         
-        merged = self.rrf_merge(bm25_results, knn_results)
-        return merged[:size]
+        weights = {"bm25": HYBRID_BM25_WEIGHT, "knn": HYBRID_KNN_WEIGHT}
+        results = {"bm25": bm25_results, "knn": knn_results}
+        depths = {leg: depth for leg in results}
+        # 失敗したレッグ（取り直しの失敗を含む）は取得済みの結果で確定
+        closed = {leg for leg, hits in results.items() if hits is None}
+        rounds = 1
+        while adaptive:
+            # 取得件数に満たなかったレッグ・確定したレッグには続きがない
+            complete = [leg in closed or len(hits) < depths[leg] for leg, hits in results.items()]
+            lists = [hits or [] for hits in results.values()]
+            if rrf_top_is_stable(lists, complete, size, weights=list(weights.values())):
+                break
+            wider = {
+                leg: min(depths[leg] * 2, HYBRID_MAX_DEPTH)
+                for leg, done in zip(results, complete)
+                if not done and depths[leg] < HYBRID_MAX_DEPTH
+            }
+            if not wider or time.perf_counter() - start > HYBRID_LEG_TIMEOUT:
+                break
+            for leg, hits in self._widen(query, query_vector, filters, wider, stats).items():
+                if hits is None:
+                    closed.add(leg)
+                else:
+                    results[leg], depths[leg] = hits, wider[leg]
+            rounds += 1
+        stats["depth"] = {leg: depths[leg] if hits is not None else 0 for leg, hits in results.items()}
+        stats["rounds"] = rounds
+        
+        merged, contributions = fuse_with_contributions(
+            [results["bm25"] or [], results["knn"] or []],
+            weights=list(weights.values()),
+            method=HYBRID_FUSION_METHOD,
+            size=size,
+            names=list(weights)
+        )
+        stats["fusion"] = {"method": HYBRID_FUSION_METHOD, "weights": weights, "contributions": contributions}
+        if QUERY_EMBEDDING_CACHE is not None:
+            stats["embed_cache"] = QUERY_EMBEDDING_CACHE.stats()
+        stats["timings"]["total_ms"] = int((time.perf_counter() - start) * 1000)
+        return merged, stats
+    
+    def hybrid_search(self, query: str, size: int = 10, filters: Optional[Dict] = None) -> List[Dict]:
+        """ハイブリッド検索を実行（BM25 + kNN → 融合）"""
+        results, _ = self.hybrid_search_with_stats(query, size=size, filters=filters)
+        return results
     
     def health_check(self) -> Dict:
         """OpenSearch Serverless の接続確認"""
         url = f"{self.base_url}/{self.index_name}"
         try:
-            response = requests.head(url, auth=self.auth, timeout=10)
+            response = self.session.head(url, auth=self.auth, timeout=10)
             exists = response.status_code == 200
             return {"status": "ok" if exists else "index_not_found", "index": self.index_name, "exists": exists, "endpoint": self.endpoint}
         except Exception as e:
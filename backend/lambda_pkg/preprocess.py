@@ -1,15 +1,184 @@
 ﻿import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def iter_chunks_jp(pieces: Iterable[str], chunk=900, overlap=150) -> Iterator[str]:
+    """
+    逐次届くテキスト片から split_text_jp と同じチャンクを順に生成
+    保持するのは未確定の1チャンク分だけなので、文書全体を読み込む必要はない
+    """
+    buf = ""
+    for piece in pieces:
+        buf += piece
+        # 後続のテキストがあることが確定したチャンクだけを出す
+        # （開始位置だけを進め、出し終えた部分の切り詰めは片ごとに1回）
+        start = 0
+        while len(buf) - start > chunk:
+            yield buf[start:start + chunk]
+            start += chunk - overlap
+        if start:
+            buf = buf[start:]
+    if buf:
+        yield buf
+
 
 def split_text_jp(text: str, chunk=900, overlap=150):
-    out, i, n = [], 0, len(text)
-    while i < n:
-        j = min(n, i + chunk)
-        out.append(text[i:j])
-        i = j - overlap if j < n else j
-    return out
+    return list(iter_chunks_jp([text], chunk, overlap))
+
+
+def iter_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """テキスト片を行単位（改行付き）にまとめ直す"""
+    rest = ""
+    for piece in pieces:
+        lines = (rest + piece).splitlines(True)
+        rest = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    if rest:
+        yield rest
+
+
+# フロントマターのキー → インデックスのフィールド
+META_FIELDS = {
+    "title": "title", "タイトル": "title",
+    "vendor": "vendor_name", "vendor_name": "vendor_name", "company": "vendor_name",
+    "会社": "vendor_name", "会社名": "vendor_name", "ベンダー": "vendor_name",
+    "participants": "participants", "attendees": "participants", "参加者": "participants", "出席者": "participants",
+    "type": "doc_type", "doc_type": "doc_type", "種別": "doc_type",
+    "date": "meeting_date", "meeting_date": "meeting_date", "日付": "meeting_date", "開催日": "meeting_date",
+    "tags": "tags", "タグ": "tags",
+}
+LIST_FIELDS = ("participants", "tags")
+
+# フロントマターとみなす最大行数（閉じの --- を探す先読みの上限）
+FRONT_MATTER_MAX_LINES = 50
+FRONT_MATTER_FENCE = re.compile(r"^(---|\.\.\.)\s*$")
+FRONT_MATTER_ITEM = re.compile(r"^([^:：#\s][^:：]*?)\s*[:：]\s*(.*?)\s*$")
+LIST_ITEM = re.compile(r"^\s*-\s+(.*?)\s*$")
+HEADING_LINE = re.compile(r"^(#{1,6})[ \t]+(.+?)\s*#*\s*$")
+HASHTAG = re.compile(r"#(\w+)")
+DATE_LINE = re.compile(r"date:[ \t]*([0-9\-/]+)")
+DATE = re.compile(r"(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})")
+
+
+def _normalize_date(value: str) -> Optional[str]:
+    """日付を YYYY-MM-DD に揃える（解釈できなければ None）"""
+    m = DATE.search(value)
+    return f"{m.group(1)}-{int(m.group(2)):02d}-{int(m.group(3)):02d}" if m else None
+
+
+def _split_list(value: str) -> List[str]:
+    value = value.strip().strip("[]")
+    return [v.strip().strip("'\"") for v in re.split(r"[,、，]", value) if v.strip().strip("'\"")]
+
+
+def _is_front_matter_line(line: str) -> bool:
+    return not line.strip() or bool(FRONT_MATTER_ITEM.match(line) or LIST_ITEM.match(line))
+
+
+def _iter_parts(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    各行を ("front", 行)（先頭の --- で囲まれたフロントマター）か ("body", 行) に分類
+    先頭の --- から FRONT_MATTER_MAX_LINES 行以内に key: value 形式の行だけで閉じの --- が来た場合のみ
+    フロントマターとみなし、それ以外（水平線で始まる本文など）は先読みした行を本文として返す
+    """
+    lines = iter(lines)
+    for line in lines:
+        if not line.strip():
+            continue
+        if not FRONT_MATTER_FENCE.match(line):
+            yield "body", line
+            break
+        buffered = []
+        for candidate in lines:
+            if FRONT_MATTER_FENCE.match(candidate):
+                yield from (("front", b) for b in buffered)
+                break
+            buffered.append(candidate)
+            if len(buffered) > FRONT_MATTER_MAX_LINES or not _is_front_matter_line(candidate):
+                yield "body", line
+                yield from (("body", b) for b in buffered)
+                break
+        else:
+            # 閉じの --- がないまま終わった
+            yield "body", line
+            yield from (("body", b) for b in buffered)
+        break
+    for line in lines:
+        yield "body", line
+
+
+def iter_body_lines(lines: Iterable[str]) -> Iterator[str]:
+    """フロントマターを除いた本文の行"""
+    return (line for part, line in _iter_parts(lines) if part == "body")
+
+
+class MetaExtractor:
+    """
+    行を受け取りながらメタデータを組み立てる（文書全体を保持しない）
+    - フロントマター: title / vendor_name / participants / doc_type / meeting_date / tags
+    - 本文: 最初の見出し（title 未指定時）、#タグ、date: 行（meeting_date 未指定時）
+    本文の行を iter_body で流しながら抽出すれば、チャンク分割と同じ1回の読み込みで済む
+    """
+
+    def __init__(self):
+        self._meta = {"title": None, "vendor_name": None, "participants": [], "doc_type": None, "meeting_date": None, "tags": []}
+        self._list_field = None
+
+    def feed(self, part: str, line: str) -> None:
+        """_iter_parts の ("front" / "body", 行) を1件取り込む"""
+        meta = self._meta
+        if part == "front":
+            item = LIST_ITEM.match(line)
+            if item and self._list_field:
+                meta[self._list_field].extend(_split_list(item.group(1)))
+                return
+            m = FRONT_MATTER_ITEM.match(line)
+            field = META_FIELDS.get(m.group(1).strip().lower()) if m else None
+            self._list_field = None
+            if field in LIST_FIELDS:
+                if m.group(2):
+                    meta[field].extend(_split_list(m.group(2)))
+                else:
+                    self._list_field = field
+            elif field == "meeting_date":
+                meta[field] = _normalize_date(m.group(2))
+            elif field:
+                meta[field] = m.group(2).strip("'\"") or None
+            return
+
+        heading = HEADING_LINE.match(line)
+        if heading:
+            if meta["title"] is None:
+                meta["title"] = heading.group(2)
+            return
+        if meta["meeting_date"] is None:
+            m = DATE_LINE.search(line)
+            meta["meeting_date"] = _normalize_date(m.group(1)) if m else None
+        meta["tags"].extend(HASHTAG.findall(line))
+
+    def iter_body(self, lines: Iterable[str]) -> Iterator[str]:
+        """フロントマターを除いた本文の行を返しつつ、読んだ行からメタデータを抽出"""
+        for part, line in _iter_parts(lines):
+            self.feed(part, line)
+            if part == "body":
+                yield line
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """ここまでに読んだ行から得たメタデータ（コピー。リストは重複を除く）"""
+        meta = dict(self._meta)
+        meta["tags"] = list(dict.fromkeys(meta["tags"]))
+        meta["participants"] = list(dict.fromkeys(meta["participants"]))
+        return meta
+
+
+def extract_meta_lines(lines: Iterable[str]):
+    """行を1回だけ走査してメタデータを抽出（MetaExtractor を参照）"""
+    extractor = MetaExtractor()
+    for part, line in _iter_parts(lines):
+        extractor.feed(part, line)
+    return extractor.meta
 
 
 def extract_meta(md: str):
-    date = re.search(r"date:\s*([0-9\-]+)", md)
-    tags = re.findall(r"#(\w+)", md)
-    return {"meeting_date": date.group(1) if date else None, "tags": tags}
+    return extract_meta_lines(md.splitlines(True))
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Lambda Web Adapter から起動するストリーミング用 HTTP サーバー（stream_app.py）
+exec python3 stream_app.py
@@ -0,0 +1,183 @@
+"""
+戦略スコアのルールエンジン
+- ルール（field / operator / threshold / points）を JSON 設定ファイルまたは S3 から読み込み
+- ベンダー表の列に対して一括で評価し、ルールごとの加点内訳を返す
+
+設定例:
+{
+  "max_score": 100,
+  "rules": [
+    {"name": "small_team", "field": "employee_count", "operator": "between", "threshold": [5, 15], "points": 30}
+  ]
+}
+"""
+import json
+import os
+import time
+from datetime import date
+from typing import Dict, Any, Mapping, Optional, Tuple
+
+import numpy as np
+
+from vendor_table import VENDOR_SCHEMA, VendorTable
+
+# ルール設定の場所（ローカルパスまたは s3://bucket/key、未指定なら既定ルール）
+STRATEGIC_RULES_URI = os.getenv("STRATEGIC_RULES_URI", "")
+# warm Lambda でルールを読み直す間隔（秒）
+STRATEGIC_RULES_TTL = float(os.getenv("STRATEGIC_RULES_TTL", "300"))
+
+# A領域（M&A候補）条件
+DEFAULT_RULES: Dict[str, Any] = {
+    "max_score": 100,
+    "rules": [
+        {"name": "employee_count_5_15", "field": "employee_count", "operator": "between", "threshold": [5, 15], "points": 30},
+        {"name": "internal_dev_support_4", "field": "internal_dev_support", "operator": ">=", "threshold": 4, "points": 25},
+        {"name": "aws_capability_3", "field": "aws_capability", "operator": ">=", "threshold": 3, "points": 25},
+        {"name": "ip_flexibility_3", "field": "ip_flexibility", "operator": ">=", "threshold": 3, "points": 20},
+    ],
+}
+
+OPERATORS = (">=", ">", "<=", "<", "==", "!=", "between", "in", "contains")
+
+_RULES_CACHE: Dict[str, Any] = {"uri": None, "ruleset": None, "loaded_at": 0.0}
+
+
+def _check_threshold(value: Any, kind: type) -> None:
+    """閾値がカラムの型と比較できるか検証（int は数値、date は ISO 形式の日付、str は文字列）"""
+    if kind is int:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"expected a number, got {value!r}")
+    elif kind is date:
+        if not isinstance(value, str):
+            raise ValueError(f"expected a date string, got {value!r}")
+        np.datetime64(value, "D")
+    elif not isinstance(value, str):
+        raise ValueError(f"expected a string, got {value!r}")
+
+
+def validate_ruleset(config: Dict[str, Any], columns: Mapping[str, type] = VENDOR_SCHEMA) -> Dict[str, Any]:
+    """
+    ルール設定を検証して正規化する
+    field がベンダー表のカラム（columns）にあり、閾値がカラムの型と比較できることも確認する
+    """
+    rules = []
+    for i, rule in enumerate(config.get("rules", [])):
+        for key in ("field", "operator", "threshold", "points"):
+            if key not in rule:
+                raise ValueError(f"rule {i}: '{key}' is required")
+        if rule["operator"] not in OPERATORS:
+            raise ValueError(f"rule {i}: unsupported operator '{rule['operator']}'")
+        if rule["field"] not in columns:
+            raise ValueError(f"rule {i}: unknown vendor field '{rule['field']}'")
+        threshold = rule["threshold"]
+        if rule["operator"] in ("between", "in") and not isinstance(threshold, list):
+            raise ValueError(f"rule {i}: '{rule['operator']}' needs a list threshold")
+        if rule["operator"] == "between" and len(threshold) != 2:
+            raise ValueError(f"rule {i}: 'between' needs [low, high]")
+        # contains は文字列として部分一致を取るため、カラムの型によらず文字列
+        kind = str if rule["operator"] == "contains" else columns[rule["field"]]
+        try:
+            for value in (threshold if isinstance(threshold, list) else [threshold]):
+                _check_threshold(value, kind)
+        except ValueError as e:
+            raise ValueError(f"rule {i}: invalid threshold for '{rule['field']}': {e}")
+        rules.append({
+            "name": rule.get("name") or f"{rule['field']} {rule['operator']} {rule['threshold']}",
+            "field": rule["field"],
+            "operator": rule["operator"],
+            "threshold": rule["threshold"],
+            "points": float(rule["points"]),
+        })
+    return {"max_score": float(config.get("max_score", 100)), "rules": rules}
+
+
+def _read_config(uri: str) -> Dict[str, Any]:
+    if uri.startswith("s3://"):
+        import boto3
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "ap-northeast-1"))
+        body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+        return json.loads(body.decode("utf-8-sig"))
+    with open(uri, encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def load_ruleset(uri: Optional[str] = None) -> Dict[str, Any]:
+    """
+    ルール設定を読み込む（STRATEGIC_RULES_TTL 秒はキャッシュ）
+    読み込みに失敗した場合は直前のルール（なければ既定ルール）を使う
+    """
+    uri = STRATEGIC_RULES_URI if uri is None else uri
+    if not uri:
+        return validate_ruleset(DEFAULT_RULES)
+
+    now = time.monotonic()
+    if _RULES_CACHE["uri"] == uri and now - _RULES_CACHE["loaded_at"] < STRATEGIC_RULES_TTL:
+        return _RULES_CACHE["ruleset"]
+
+    try:
+        ruleset = validate_ruleset(_read_config(uri))
+    except Exception as e:
+        print(f"Error loading strategic rules from {uri}: {str(e)}")
+        if _RULES_CACHE["uri"] == uri and _RULES_CACHE["ruleset"] is not None:
+            return _RULES_CACHE["ruleset"]
+        return validate_ruleset(DEFAULT_RULES)
+
+    _RULES_CACHE.update(uri=uri, ruleset=ruleset, loaded_at=now)
+    return ruleset
+
+
+def _threshold_for(column: np.ndarray, value: Any) -> Any:
+    """日付列の閾値は datetime64 に揃える"""
+    if np.issubdtype(column.dtype, np.datetime64):
+        return np.datetime64(value, "D")
+    return value
+
+
+def _match(column: np.ndarray, operator: str, threshold: Any) -> np.ndarray:
+    """1ルールの条件を列全体に適用"""
+    if operator == "between":
+        low, high = (_threshold_for(column, t) for t in threshold)
+        return (column >= low) & (column <= high)
+    if operator == "in":
+        return np.isin(column, [_threshold_for(column, t) for t in threshold])
+    if operator == "contains":
+        return np.char.find(column.astype(str), str(threshold)) >= 0
+
+    threshold = _threshold_for(column, threshold)
+    if operator == ">=":
+        return column >= threshold
+    if operator == ">":
+        return column > threshold
+    if operator == "<=":
+        return column <= threshold
+    if operator == "<":
+        return column < threshold
+    if operator == "==":
+        return column == threshold
+    return column != threshold
+
+
+def evaluate_rules(table: VendorTable, ruleset: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    全ベンダーについてルールを評価
+
+    Returns:
+        (上限で丸めた合計スコアの配列, ルール名 → 各ベンダーの加点配列)
+    """
+    total = np.zeros(len(table), dtype=np.float64)
+    breakdown: Dict[str, np.ndarray] = {}
+    for rule in ruleset["rules"]:
+        if rule["field"] not in table.columns:
+            raise ValueError(f"unknown vendor field in rule '{rule['name']}': {rule['field']}")
+        # 欠損値（数値の空欄・日付の NaT）はどの条件にも一致させない
+        matched = _match(table.column(rule["field"]), rule["operator"], rule["threshold"]) & table.present(rule["field"])
+        points = np.where(matched, rule["points"], 0.0)
+        breakdown[rule["name"]] = points
+        total += points
+    return np.minimum(total, ruleset["max_score"]), breakdown
+
+
+def breakdown_for(breakdown: Dict[str, np.ndarray], index: int) -> Dict[str, float]:
+    """1社分のルールごとの加点内訳"""
+    return {name: float(points[index]) for name, points in breakdown.items()}
@@ -0,0 +1,56 @@
+"""
+ベンダー推薦のストリーミング HTTP アプリ（WSGI）
+- Lambda Web Adapter のレスポンスストリーミング（Function URL の RESPONSE_STREAM）上で動かし、
+  評価が終わったベンダーから順に SSE のイベントを返す（template.yaml の VendorStreamFunc）
+- POST: ボディは vendor_recommender.handler と同じ要件 JSON。イベントは vendor_recommender.stream_handler と同じ
+- GET: 死活確認（Web Adapter の readiness check 用）
+- 標準ライブラリの wsgiref で動かす（レスポンスのチャンクごとにソケットへ書き出す）
+
+起動:
+    python stream_app.py   # PORT（既定 8080）で待ち受け。Lambda では run.sh から起動
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Iterable
+from wsgiref.simple_server import make_server
+
+import vendor_recommender
+
+PORT = int(os.getenv("PORT", "8080"))
+
+CORS_HEADERS = [
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Headers", "Content-Type"),
+    ("Access-Control-Allow-Methods", "POST,OPTIONS"),
+]
+
+
+def app(environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+    """WSGI アプリ本体"""
+    method = environ.get("REQUEST_METHOD", "GET")
+    if method == "OPTIONS":
+        start_response("204 No Content", CORS_HEADERS)
+        return []
+    if method != "POST":
+        body = json.dumps({"status": "ok"}).encode("utf-8")
+        start_response("200 OK", CORS_HEADERS + [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
+
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    raw = environ["wsgi.input"].read(length).decode("utf-8", errors="replace") if length > 0 else ""
+    start_response("200 OK", CORS_HEADERS + [
+        ("Content-Type", "text/event-stream; charset=utf-8"),
+        ("Cache-Control", "no-cache"),
+    ])
+    # ジェネレータのまま返し、イベントが1件できるたびに書き出す
+    return (chunk.encode("utf-8") for chunk in vendor_recommender.stream_handler({"body": raw}, None))
+
+
+def main() -> None:
+    with make_server("0.0.0.0", PORT, app) as server:
+        print(f"Vendor stream app listening on port {PORT}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+ベンダー候補の事前絞り込み
+- LLM 評価の前にユーザー要件とベンダー属性をローカルで突き合わせてスコアリング
+- 上位 K 社のみを Bedrock 評価に回す
+"""
+import json
+import os
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from vendor_table import VendorTable
+
+# 上位何社を LLM 評価に回すか（0 以下で絞り込みなし）
+PREFILTER_TOP_K = int(os.getenv("PREFILTER_TOP_K", "0"))
+
+# 各観点の重み（環境変数 PREFILTER_WEIGHTS に JSON で指定すると上書き）
+DEFAULT_WEIGHTS = {
+    "tech_stack": 0.35,
+    "industry": 0.2,
+    "development_style": 0.15,
+    "company_size": 0.15,
+    "capability": 0.15,
+}
+
+# 技術要件（フォームのラベル）→ tech_stack に含まれるキーワード
+TECH_KEYWORDS = {
+    "AWS（必須）": ["AWS"],
+    "Azure/GCP": ["Azure", "GCP"],
+    "AI/機械学習": ["AI", "ML", "LLM", "VLM", "SLM", "CV", "EdgeAI"],
+    "モダンWeb技術（React/Vue等）": ["Web", "React", "Vue"],
+    "データ分析基盤": ["BI", "データ"],
+}
+
+# 対象業界 → domain_expertise に含まれるキーワード
+INDUSTRY_KEYWORDS = {
+    "製造業・工場": ["製造"],
+    "物流・サプライチェーン": ["物流"],
+    "商社・貿易": ["商社", "貿易"],
+    "金融・保険": ["金融", "保険"],
+    "汎用的なシステム": ["汎用"],
+}
+
+# 開発体制 → (business_model に含まれるキーワード, 参照する能力値カラム)
+DEVELOPMENT_STYLES = {
+    "完全受託（丸投げOK）": (["受託"], "technical_depth"),
+    "協働開発（一緒に作る）": (["受託", "内製支援"], "internal_dev_support"),
+    "内製支援・伴走型（最終的に自社で運用）": (["内製支援"], "internal_dev_support"),
+    "コンサルティング中心（企画・設計まで）": (["コンサル"], "consulting_capability"),
+}
+
+# 企業規模 → 従業員数の希望レンジ
+COMPANY_SIZES = {
+    "大手・準大手が安心": (100, None),
+    "中堅企業（30-100名程度）": (30, 100),
+    "小規模でも専門性が高ければ良い（5-20名程度）": (5, 20),
+}
+
+# 重視項目 → 参照する能力値カラム
+PRIORITY_CAPABILITIES = {
+    "技術的な先進性・最新技術の活用": "technical_depth",
+    "内製化支援・ナレッジ移管": "internal_dev_support",
+    "AWS環境での開発・運用": "aws_capability",
+}
+
+
+def load_weights() -> Dict[str, float]:
+    """重み設定を読み込む（未指定の観点は既定値）"""
+    weights = dict(DEFAULT_WEIGHTS)
+    raw = os.getenv("PREFILTER_WEIGHTS")
+    if raw:
+        weights.update({k: float(v) for k, v in json.loads(raw).items() if k in weights})
+    return weights
+
+
+def _capability(table: VendorTable, column: str) -> np.ndarray:
+    """能力値（1-5）を 0-1 に正規化"""
+    return np.clip(table.column(column).astype(np.float32), 0, 5) / 5.0
+
+
+def _contains_any(column: np.ndarray, keywords: List[str]) -> np.ndarray:
+    """文字列列の各要素がキーワードのいずれかを含むか（大文字小文字は無視）"""
+    lowered = np.char.lower(column.astype(str))
+    hits = np.zeros(len(column), dtype=bool)
+    for keyword in keywords:
+        hits |= np.char.find(lowered, keyword.lower()) >= 0
+    return hits
+
+
+def _tech_stack_score(table: VendorTable, tech_stack: List[str]) -> np.ndarray:
+    """技術要件のうち、ベンダーの tech_stack が満たす割合"""
+    required = [t for t in tech_stack if t and t != "特になし"]
+    if not required:
+        return np.ones(len(table), dtype=np.float32)
+    column = table.column("tech_stack")
+    hits = sum(_contains_any(column, TECH_KEYWORDS.get(t, [t])).astype(np.float32) for t in required)
+    return hits / len(required)
+
+
+def _industry_score(table: VendorTable, industry: str) -> np.ndarray:
+    """対象業界への専門性（汎用ベンダーは部分点）"""
+    if not industry:
+        return np.ones(len(table), dtype=np.float32)
+    domain = table.column("domain_expertise")
+    match = _contains_any(domain, INDUSTRY_KEYWORDS.get(industry, [industry]))
+    generic = _contains_any(domain, ["汎用"])
+    return np.where(match, 1.0, np.where(generic, 0.5, 0.0)).astype(np.float32)
+
+
+def _development_style_score(table: VendorTable, development_style: str) -> np.ndarray:
+    """開発体制の一致度（事業モデルの一致 + 関連能力値）"""
+    if development_style not in DEVELOPMENT_STYLES:
+        return np.ones(len(table), dtype=np.float32)
+    keywords, column = DEVELOPMENT_STYLES[development_style]
+    model_match = _contains_any(table.column("business_model"), keywords).astype(np.float32)
+    return 0.5 * model_match + 0.5 * _capability(table, column)
+
+
+def _company_size_score(table: VendorTable, company_size: str) -> np.ndarray:
+    """希望レンジからの乖離に応じて減点（レンジ内で満点、2倍離れると0点）"""
+    if company_size not in COMPANY_SIZES:
+        return np.ones(len(table), dtype=np.float32)
+    low, high = COMPANY_SIZES[company_size]
+    count = table.column("employee_count").astype(np.float32)
+    score = np.ones(len(table), dtype=np.float32)
+    score = np.where(count < low, np.maximum(0.0, count / low * 2 - 1), score)
+    if high is not None:
+        score = np.where(count > high, np.maximum(0.0, 2 - count / high), score)
+    return score.astype(np.float32)
+
+
+def _capability_score(table: VendorTable, user_requirements: Dict[str, Any]) -> np.ndarray:
+    """重視項目・所有権希望に対応する能力値の平均"""
+    columns = [
+        PRIORITY_CAPABILITIES[p]
+        for p in user_requirements.get("priorities", [])
+        if p in PRIORITY_CAPABILITIES
+    ]
+    if user_requirements.get("ipOwnership") == "当社に完全譲渡してほしい":
+        columns.append("ip_flexibility")
+    if not columns:
+        return np.ones(len(table), dtype=np.float32)
+    return sum(_capability(table, c) for c in columns) / len(columns)
+
+
+def score_vendors(
+    table: VendorTable,
+    user_requirements: Dict[str, Any],
+    weights: Optional[Dict[str, float]] = None
+) -> np.ndarray:
+    """全ベンダーとユーザー要件の簡易適合度（0-1）を列演算で計算"""
+    weights = weights or load_weights()
+    components = {
+        "tech_stack": _tech_stack_score(table, user_requirements.get("techStack", [])),
+        "industry": _industry_score(table, user_requirements.get("industry", "")),
+        "development_style": _development_style_score(table, user_requirements.get("developmentStyle", "")),
+        "company_size": _company_size_score(table, user_requirements.get("companySize", "")),
+        "capability": _capability_score(table, user_requirements),
+    }
+    total_weight = sum(weights.values()) or 1.0
+    return sum(weights[k] * v for k, v in components.items()) / total_weight
+
+
+def select_candidates(
+    table: VendorTable,
+    user_requirements: Dict[str, Any],
+    top_k: int = PREFILTER_TOP_K,
+    weights: Optional[Dict[str, float]] = None
+) -> Tuple[List[int], np.ndarray]:
+    """
+    簡易適合度の上位 K 社を選ぶ
+
+    Returns:
+        (選ばれたベンダーのインデックス（元の順序）, 全ベンダーの簡易適合度)
+    """
+    scores = score_vendors(table, user_requirements, weights)
+    if top_k <= 0 or top_k >= len(table):
+        return list(range(len(table))), scores
+
+    # 同点は元の順序を優先（安定ソート）
+    ranked = np.argsort(-scores, kind="stable")
+    return sorted(ranked[:top_k].tolist()), scores
@@ -1,4 +1,4 @@
-"""
+﻿"""
 ベンダー推薦Lambda関数
 - S3からvendors.csvを読み込み
 - Bedrock (Claude 3.5 Sonnet)でベンダー推薦
@@ -6,21 +6,76 @@
 """
 import json
 import os
-import csv
-import io
+import time
+import bisect
 import boto3
-from typing import Dict, List, Any
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+import numpy as np
+from vendor_prefilter import select_candidates
+from vendor_table import VendorTable
+from scoring_rules import load_ruleset, evaluate_rules, breakdown_for
+from evaluation_cache import EvaluationCache, build_cache_from_env
 
 # 環境変数
 S3_BUCKET = os.getenv("S3_BUCKET")
 CSV_KEY = os.getenv("CSV_KEY", "vendors.csv")
 AWS_REGION = os.getenv("AWS_REGION", "ap-northeast-1")
 
-# Bedrock クライアント
-BEDROCK = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+# 並列評価設定（API Gateway の 29 秒制限に収まるよう既定値を設定）
+EVAL_MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "8"))
+EVAL_CALL_TIMEOUT = float(os.getenv("EVAL_CALL_TIMEOUT", "20"))
+EVAL_TOTAL_TIMEOUT = float(os.getenv("EVAL_TOTAL_TIMEOUT", "25"))
+EVAL_POLL_INTERVAL = 0.05
+
+# バッチ評価設定（EVAL_BATCH_TOKEN_BUDGET=0 で1社ずつ評価）
+EVAL_BATCH_TOKEN_BUDGET = int(os.getenv("EVAL_BATCH_TOKEN_BUDGET", "0"))
+EVAL_BATCH_MAX_OUTPUT_TOKENS = int(os.getenv("EVAL_BATCH_MAX_OUTPUT_TOKENS", "8000"))
+EVAL_BATCH_OUTPUT_TOKENS_PER_VENDOR = 500
+
+# Bedrock クライアント（並列数に合わせて接続プールを確保）
+BEDROCK = boto3.client(
+    "bedrock-runtime",
+    region_name=AWS_REGION,
+    config=Config(
+        read_timeout=EVAL_CALL_TIMEOUT,
+        max_pool_connections=max(10, EVAL_MAX_CONCURRENCY)
+    )
+)
 S3_CLIENT = boto3.client("s3", region_name=AWS_REGION)
 LLM_MODEL = "anthropic.claude-3-5-sonnet-20241022-v2:0"
 
+# 2段階評価（カスケード）設定
+# EVAL_CASCADE_TOP_N > 0 の場合、全社を高速モデルで評価した後、
+# 上位 N 社（と N 位との差が EVAL_CASCADE_MARGIN 点以内の社）だけを高精度モデルで再評価
+EVAL_FAST_MODEL = os.getenv("EVAL_FAST_MODEL", "anthropic.claude-3-haiku-20240307-v1:0")
+EVAL_STRONG_MODEL = os.getenv("EVAL_STRONG_MODEL", LLM_MODEL)
+EVAL_CASCADE_TOP_N = int(os.getenv("EVAL_CASCADE_TOP_N", "0"))
+EVAL_CASCADE_MARGIN = int(os.getenv("EVAL_CASCADE_MARGIN", "5"))
+
+# モデルごとの出力トークン上限（バッチの max_tokens がこれを超えると Bedrock が呼び出しを拒否する）
+# クロスリージョン推論プロファイル（"us." 等の接頭辞付き）も末尾一致で判定し、未登録のモデルは 4096 とみなす
+MODEL_MAX_OUTPUT_TOKENS = {
+    "anthropic.claude-3-haiku-20240307-v1:0": 4096,
+    "anthropic.claude-3-sonnet-20240229-v1:0": 4096,
+    "anthropic.claude-3-opus-20240229-v1:0": 4096,
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": 4096,
+    "anthropic.claude-3-5-sonnet-20241022-v2:0": 8192,
+    "anthropic.claude-3-5-haiku-20241022-v1:0": 8192,
+}
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+# 評価キャッシュ（warm Lambda 間で共有、EVAL_CACHE_BACKEND=none で無効）
+EVALUATION_CACHE = build_cache_from_env()
+
+# ベンダー表キャッシュ（warm Lambda 間で共有）
+# VENDOR_CACHE_TTL 秒以内は S3 に問い合わせず、以降は ETag で条件付き GET
+VENDOR_CACHE_TTL = float(os.getenv("VENDOR_CACHE_TTL", "60"))
+_VENDOR_CACHE: Dict[str, Any] = {"etag": None, "table": None, "checked_at": 0.0}
+VENDOR_CACHE_STATS = {"hits": 0, "misses": 0, "refreshes": 0}
+
 
 def _response(status: int, body: Dict[str, Any]) -> Dict[str, Any]:
     """HTTPレスポンスを生成（CORSヘッダー付き）"""
@@ -36,127 +91,169 @@ def _response(status: int, body: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def load_vendors_from_s3() -> List[Dict[str, Any]]:
-    """S3からvendors.csvを読み込む"""
+def load_vendors_from_s3() -> VendorTable:
+    """
+    S3からvendors.csvを読み込む
+    warm Lambda ではパース済みのベンダー表を再利用し、
+    オブジェクトが変更された（ETag が変わった）場合のみ再ダウンロード・再パースする
+    """
+    now = time.monotonic()
+    cached = _VENDOR_CACHE["table"]
+    if cached is not None and now - _VENDOR_CACHE["checked_at"] < VENDOR_CACHE_TTL:
+        VENDOR_CACHE_STATS["hits"] += 1
+        return cached
+    
     try:
-        response = S3_CLIENT.get_object(Bucket=S3_BUCKET, Key=CSV_KEY)
-        csv_content = response["Body"].read().decode("utf-8-sig")
+        params = {"Bucket": S3_BUCKET, "Key": CSV_KEY}
+        if cached is not None and _VENDOR_CACHE["etag"]:
+            params["IfNoneMatch"] = _VENDOR_CACHE["etag"]
         
-        # CSVをパース
-        reader = csv.DictReader(io.StringIO(csv_content))
-        vendors = []
-        for row in reader:
-            # 数値フィールドを変換
-            try:
-                row["employee_count"] = int(row.get("employee_count", 0) or 0)
-            except (ValueError, TypeError):
-                row["employee_count"] = 0
-            
-            try:
-                row["aws_capability"] = int(row.get("aws_capability", 0) or 0)
-            except (ValueError, TypeError):
-                row["aws_capability"] = 0
-            
-            try:
-                row["internal_dev_support"] = int(row.get("internal_dev_support", 0) or 0)
-            except (ValueError, TypeError):
-                row["internal_dev_support"] = 0
-            
-            try:
-                row["ip_flexibility"] = int(row.get("ip_flexibility", 0) or 0)
-            except (ValueError, TypeError):
-                row["ip_flexibility"] = 0
-            
-            vendors.append(row)
+        try:
+            response = S3_CLIENT.get_object(**params)
+        except ClientError as e:
+            # 304 Not Modified: キャッシュをそのまま使う
+            code = e.response.get("Error", {}).get("Code")
+            if cached is not None and code in ("304", "NotModified"):
+                _VENDOR_CACHE["checked_at"] = now
+                VENDOR_CACHE_STATS["hits"] += 1
+                return cached
+            raise
         
-        return vendors
+        csv_content = response["Body"].read().decode("utf-8-sig")
+        table = VendorTable.from_csv(csv_content)
+        for error in table.errors:
+            print(f"Invalid vendor row {error['row']} ({error['column']}={error['value']!r}): {error['error']}")
+        
+        VENDOR_CACHE_STATS["refreshes" if cached is not None else "misses"] += 1
+        _VENDOR_CACHE.update(etag=response.get("ETag"), table=table, checked_at=now)
+        return table
     except Exception as e:
         print(f"Error loading CSV from S3: {str(e)}")
         raise
 
 
-def calculate_strategic_score(vendor: Dict[str, Any]) -> int:
+def calculate_strategic_scores(table: VendorTable) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
     """
-    戦略スコア（0-100点）を計算
-    A領域（M&A候補）条件該当数で計算
+    戦略スコア（0-100点）をベンダー表全体について計算
+    A領域（M&A候補）条件をルール設定（STRATEGIC_RULES_URI）に従って列演算で評価
+
+    Returns:
+        (各ベンダーの戦略スコア, ルール名 → 各ベンダーの加点)
     """
-    score = 0
-    max_score = 100
-    
-    # 条件1: employee_count: 5-15人 (30点)
-    employee_count = vendor.get("employee_count", 0)
-    if 5 <= employee_count <= 15:
-        score += 30
+    scores, breakdown = evaluate_rules(table, load_ruleset())
+    return np.rint(scores).astype(np.int32), breakdown
+
+
+def calculate_strategic_score(vendor: Dict[str, Any]) -> int:
+    """戦略スコア（0-100点）を1社分計算"""
+    scores, _ = calculate_strategic_scores(VendorTable.from_records([vendor]))
+    return int(scores[0])
+
+
+# 評価基準（単体評価・バッチ評価で共通）
+EVALUATION_CRITERIA = """1. 技術要件の適合度（AWS、AI/ML、モダンWeb技術など）
+2. 開発体制の希望との一致度（完全受託、協働開発、内製支援など）
+3. 企業規模の希望との一致度
+4. 業界・ドメインの専門性
+5. 所有権・IP柔軟性の希望との一致度
+6. パートナーシップ志向との一致度"""
+
+
+# プロンプトに載せるベンダー情報（ラベル, カラム, 表示形式）
+VENDOR_INFO_FIELDS = (
+    ("会社名", "company_name", "{}"),
+    ("従業員数", "employee_count", "{}人"),
+    ("設立年", "foundation_year", "{}"),
+    ("本社", "headquarters", "{}"),
+    ("事業モデル", "business_model", "{}"),
+    ("技術スタック", "tech_stack", "{}"),
+    ("ドメイン専門性", "domain_expertise", "{}"),
+    ("専門性タイプ", "specialization_type", "{}"),
+    ("AWS能力", "aws_capability", "{}/5"),
+    ("内製化支援", "internal_dev_support", "{}/5"),
+    ("IP柔軟性", "ip_flexibility", "{}/5"),
+    ("技術深度", "technical_depth", "{}/5"),
+    ("コンサル能力", "consulting_capability", "{}/5"),
+    ("サポートモデル", "support_model", "{}"),
+    ("備考", "notes", "{}"),
+)
+
+
+def _format_vendor_info(vendor: Dict[str, Any]) -> str:
+    """プロンプト用にベンダー情報を整形（欠損・空欄の項目は載せない）"""
+    lines = []
+    for label, key, fmt in VENDOR_INFO_FIELDS:
+        value = vendor.get(key)
+        if value is None or value == "":
+            continue
+        lines.append(f"{label}: {fmt.format(value)}")
+    return "\n" + "\n".join(lines) + "\n"
+
+
+def _format_requirements(user_requirements: Dict[str, Any]) -> str:
+    """プロンプト用にユーザー要件を整形"""
+    return f"""
+重視項目: {', '.join(user_requirements.get('priorities', []))}
+開発体制: {user_requirements.get('developmentStyle', '')}
+企業規模: {user_requirements.get('companySize', '')}
+技術要件: {', '.join(user_requirements.get('techStack', []))}
+対象業界: {user_requirements.get('industry', '')}
+所有権希望: {user_requirements.get('ipOwnership', '')}
+パートナーシップ: {user_requirements.get('partnership', '')}
+"""
+
+
+def _invoke_llm(prompt: str, max_tokens: int = 1000, model_id: str = EVAL_STRONG_MODEL) -> str:
+    """Claude を呼び出し、応答テキストから JSON 部分を取り出す"""
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "temperature": 0.3,
+        "messages": [
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": prompt}]
+            }
+        ]
+    }
     
-    # 条件2: internal_dev_support >= 4 (25点)
-    if vendor.get("internal_dev_support", 0) >= 4:
-        score += 25
+    response = BEDROCK.invoke_model(
+        modelId=model_id,
+        body=json.dumps(body)
+    )
     
-    # 条件3: aws_capability >= 3 (25点)
-    if vendor.get("aws_capability", 0) >= 3:
-        score += 25
+    result = json.loads(response["body"].read())
+    answer_text = result["content"][0]["text"].strip()
     
-    # 条件4: ip_flexibility >= 3 (20点)
-    if vendor.get("ip_flexibility", 0) >= 3:
-        score += 20
+    # JSONを抽出（```json で囲まれている場合がある）
+    if "```json" in answer_text:
+        answer_text = answer_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in answer_text:
+        answer_text = answer_text.split("```")[1].split("```")[0].strip()
     
-    return min(score, max_score)
+    return answer_text
 
 
 def evaluate_vendor_with_bedrock(
     vendor: Dict[str, Any],
-    user_requirements: Dict[str, Any]
+    user_requirements: Dict[str, Any],
+    model_id: str = EVAL_STRONG_MODEL
 ) -> Dict[str, Any]:
     """
-    Bedrock (Claude 3.5 Sonnet)でベンダーを評価
+    Bedrock (既定は Claude 3.5 Sonnet)でベンダーを評価
     PJ要件適合度（0-100点）と推薦理由を生成
     """
-    # ベンダー情報を整形
-    vendor_info = f"""
-会社名: {vendor.get('company_name', '')}
-従業員数: {vendor.get('employee_count', 0)}人
-設立年: {vendor.get('foundation_year', '')}
-本社: {vendor.get('headquarters', '')}
-事業モデル: {vendor.get('business_model', '')}
-技術スタック: {vendor.get('tech_stack', '')}
-ドメイン専門性: {vendor.get('domain_expertise', '')}
-専門性タイプ: {vendor.get('specialization_type', '')}
-AWS能力: {vendor.get('aws_capability', 0)}/5
-内製化支援: {vendor.get('internal_dev_support', 0)}/5
-IP柔軟性: {vendor.get('ip_flexibility', 0)}/5
-技術深度: {vendor.get('technical_depth', 0)}/5
-コンサル能力: {vendor.get('consulting_capability', 0)}/5
-サポートモデル: {vendor.get('support_model', '')}
-備考: {vendor.get('notes', '')}
-"""
-    
-    # ユーザー要件を整形
-    requirements = f"""
-重視項目: {', '.join(user_requirements.get('priorities', []))}
-開発体制: {user_requirements.get('developmentStyle', '')}
-企業規模: {user_requirements.get('companySize', '')}
-技術要件: {', '.join(user_requirements.get('techStack', []))}
-対象業界: {user_requirements.get('industry', '')}
-所有権希望: {user_requirements.get('ipOwnership', '')}
-パートナーシップ: {user_requirements.get('partnership', '')}
-"""
-    
     # プロンプト作成
     prompt = f"""あなたはAIベンダー選定の専門家です。以下のベンダー情報とユーザー要件を比較して、プロジェクト要件適合度を0-100点で評価してください。
 
 【ベンダー情報】
-{vendor_info}
+{_format_vendor_info(vendor)}
 
 【ユーザー要件】
-{requirements}
+{_format_requirements(user_requirements)}
 
 【評価基準】
-1. 技術要件の適合度（AWS、AI/ML、モダンWeb技術など）
-2. 開発体制の希望との一致度（完全受託、協働開発、内製支援など）
-3. 企業規模の希望との一致度
-4. 業界・ドメインの専門性
-5. 所有権・IP柔軟性の希望との一致度
-6. パートナーシップ志向との一致度
+{EVALUATION_CRITERIA}
 
 【出力形式】
 以下のJSON形式で出力してください：
@@ -168,34 +265,7 @@ IP柔軟性: {vendor.get('ip_flexibility', 0)}/5
 重要: JSONのみを出力し、それ以外のテキストは含めないでください。"""
     
     try:
-        # Bedrock呼び出し
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "temperature": 0.3,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [{"type": "text", "text": prompt}]
-                }
-            ]
-        }
-        
-        response = BEDROCK.invoke_model(
-            modelId=LLM_MODEL,
-            body=json.dumps(body)
-        )
-        
-        result = json.loads(response["body"].read())
-        answer_text = result["content"][0]["text"].strip()
-        
-        # JSONを抽出（```json で囲まれている場合がある）
-        if "```json" in answer_text:
-            answer_text = answer_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in answer_text:
-            answer_text = answer_text.split("```")[1].split("```")[0].strip()
-        
-        evaluation = json.loads(answer_text)
+        evaluation = json.loads(_invoke_llm(prompt, model_id=model_id))
         
         return {
             "pj_match_score": int(evaluation.get("pj_match_score", 0)),
@@ -203,88 +273,480 @@ IP柔軟性: {vendor.get('ip_flexibility', 0)}/5
         }
     except Exception as e:
         print(f"Error evaluating vendor with Bedrock: {str(e)}")
-        # フォールバック: 簡易スコアリング
+        # フォールバック: 簡易スコアリング（キャッシュしない）
         return {
             "pj_match_score": 50,
-            "reasoning": "評価処理中にエラーが発生しました。"
+            "reasoning": "評価処理中にエラーが発生しました。",
+            "error": True
         }
 
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+def _estimate_tokens(text: str) -> int:
+    """トークン数の概算（日本語は1文字≒1トークン、ASCIIは4文字≒1トークン）"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+def batch_output_limit(model_id: str) -> int:
+    """バッチ評価1回あたりの出力トークン上限（EVAL_BATCH_MAX_OUTPUT_TOKENS とモデルの上限の小さい方）"""
+    model_limit = DEFAULT_MAX_OUTPUT_TOKENS
+    for name, limit in MODEL_MAX_OUTPUT_TOKENS.items():
+        if model_id.endswith(name):
+            model_limit = limit
+            break
+    return min(EVAL_BATCH_MAX_OUTPUT_TOKENS, model_limit)
+
+
+def plan_batches(
+    vendors: List[Dict[str, Any]],
+    user_requirements: Dict[str, Any],
+    token_budget: int = EVAL_BATCH_TOKEN_BUDGET,
+    model_id: str = EVAL_STRONG_MODEL
+) -> List[List[int]]:
     """
-    Lambda ハンドラー
-    入力JSONを受け取り、ベンダー推薦結果を返す
+    入力トークン予算に収まるようにベンダーをバッチに分割
+    出力トークン上限（1社あたり EVAL_BATCH_OUTPUT_TOKENS_PER_VENDOR、合計は model_id の batch_output_limit）も考慮する
+
+    Returns:
+        ベンダーのインデックスのリストのリスト（入力順）
+    """
+    fixed_tokens = _estimate_tokens(_format_requirements(user_requirements) + EVALUATION_CRITERIA) + 300
+    max_per_batch = max(1, batch_output_limit(model_id) // EVAL_BATCH_OUTPUT_TOKENS_PER_VENDOR)
+    
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = fixed_tokens
+    for i, vendor in enumerate(vendors):
+        cost = _estimate_tokens(_format_vendor_info(vendor)) + 10
+        if current and (used + cost > token_budget or len(current) >= max_per_batch):
+            batches.append(current)
+            current, used = [], fixed_tokens
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def evaluate_vendor_batch_with_bedrock(
+    vendors: List[Dict[str, Any]],
+    user_requirements: Dict[str, Any],
+    model_id: str = EVAL_STRONG_MODEL
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    複数ベンダーを1回のプロンプトでまとめて評価
+    ユーザー要件と評価基準はプロンプト内で1度だけ送る
+
+    Returns:
+        vendors と同じ順序の評価結果リスト
+        （応答に含まれない・形式不正のベンダーは None。呼び出し側で個別に再評価する）
     """
+    vendor_blocks = "\n".join(
+        f"### ベンダー {n}\n{_format_vendor_info(vendor)}"
+        for n, vendor in enumerate(vendors, 1)
+    )
+    
+    prompt = f"""あなたはAIベンダー選定の専門家です。以下の各ベンダー情報とユーザー要件を比較して、ベンダーごとにプロジェクト要件適合度を0-100点で評価してください。
+
+【ユーザー要件】
+{_format_requirements(user_requirements)}
+
+【評価基準】
+{EVALUATION_CRITERIA}
+
+【ベンダー一覧】
+{vendor_blocks}
+
+【出力形式】
+ベンダー一覧の全社について、以下のJSON配列形式で出力してください：
+[
+  {{
+    "company_name": "ベンダー情報の会社名をそのまま記載",
+    "pj_match_score": 85,
+    "reasoning": "推薦理由を200-300文字の自然な日本語で記述してください。このベンダーがなぜユーザーの要件に適合するのか、具体的な強みや特徴を説明してください。"
+  }}
+]
+
+重要: JSON配列のみを出力し、それ以外のテキストは含めないでください。"""
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(vendors)
     try:
-        # OPTIONSリクエスト（CORS preflight）の処理
-        if event.get("httpMethod") == "OPTIONS":
-            return _response(200, {})
-        
-        # リクエストボディの取得
-        if event.get("body"):
-            if isinstance(event["body"], str):
-                body = json.loads(event["body"])
-            else:
-                body = event["body"]
-        else:
-            return _response(400, {"error": "Missing request body"})
-        
-        # ユーザー要件の取得
-        user_requirements = {
-            "priorities": body.get("priorities", []),
-            "developmentStyle": body.get("developmentStyle", ""),
-            "companySize": body.get("companySize", ""),
-            "techStack": body.get("techStack", []),
-            "industry": body.get("industry", ""),
-            "ipOwnership": body.get("ipOwnership", ""),
-            "partnership": body.get("partnership", ""),
+        evaluations = json.loads(_invoke_llm(
+            prompt,
+            max_tokens=min(EVAL_BATCH_OUTPUT_TOKENS_PER_VENDOR * len(vendors), batch_output_limit(model_id)),
+            model_id=model_id
+        ))
+    except Exception as e:
+        print(f"Error evaluating vendor batch with Bedrock: {str(e)}")
+        return results
+    
+    if not isinstance(evaluations, list):
+        return results
+    
+    # 会社名で対応付け（同名ベンダーがバッチ内にある場合は曖昧なので個別評価に回す）
+    positions: Dict[str, List[int]] = {}
+    for i, vendor in enumerate(vendors):
+        positions.setdefault(str(vendor.get("company_name", "")).strip(), []).append(i)
+    
+    for evaluation in evaluations:
+        if not isinstance(evaluation, dict):
+            continue
+        indices = positions.get(str(evaluation.get("company_name", "")).strip(), [])
+        if len(indices) != 1:
+            continue
+        try:
+            score = int(evaluation["pj_match_score"])
+        except (KeyError, ValueError, TypeError):
+            continue
+        reasoning = evaluation.get("reasoning")
+        if not isinstance(reasoning, str) or not reasoning:
+            continue
+        results[indices[0]] = {
+            "pj_match_score": score,
+            "reasoning": reasoning
         }
-        
-        # S3からベンダーリストを読み込み
-        vendors = load_vendors_from_s3()
-        
-        # 各ベンダーを評価
-        evaluations = []
-        for vendor in vendors:
-            # PJ要件適合度をBedrockで評価
-            bedrock_result = evaluate_vendor_with_bedrock(vendor, user_requirements)
+    
+    return results
+
+
+def iter_vendor_evaluations(
+    vendors: List[Dict[str, Any]],
+    user_requirements: Dict[str, Any],
+    max_concurrency: int = EVAL_MAX_CONCURRENCY,
+    call_timeout: float = EVAL_CALL_TIMEOUT,
+    total_timeout: float = EVAL_TOTAL_TIMEOUT,
+    batch_token_budget: int = EVAL_BATCH_TOKEN_BUDGET,
+    cache: Optional[EvaluationCache] = None,
+    model_id: str = EVAL_STRONG_MODEL
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    複数ベンダーの Bedrock 評価を並列実行し、完了した順に結果を返す
+    - 同時実行数は max_concurrency で制限
+    - 1 呼び出しが call_timeout 秒を超えたら打ち切り
+    - 全体が total_timeout 秒を超えたら残りを打ち切り
+    - batch_token_budget > 0 の場合は複数ベンダーを1プロンプトで評価し、
+      結果が欠けた・不正なベンダーのみ個別に再評価
+    - cache を渡した場合はキャッシュ済みのベンダーを呼び出さず、新しい評価結果を保存
+    - model_id で評価に使うモデルを指定（キャッシュもモデルごと）
+
+    Yields:
+        (ベンダーのインデックス, 評価結果（打ち切られた場合は None）)
+    """
+    # キャッシュ済みのベンダーは Bedrock を呼ばずに即座に返す
+    uncached = []
+    for i, vendor in enumerate(vendors):
+        cached = cache.get(vendor, user_requirements, model_id) if cache else None
+        if cached is not None:
+            yield i, cached
+        else:
+            uncached.append(i)
+    if not uncached:
+        return
+
+    if batch_token_budget > 0:
+        planned = plan_batches([vendors[i] for i in uncached], user_requirements, batch_token_budget, model_id)
+        batches = [[uncached[j] for j in batch] for batch in planned]
+    else:
+        batches = [[i] for i in uncached]
+
+    started: Dict[Tuple[int, ...], float] = {}
+
+    def _run(batch: Tuple[int, ...]) -> List[Optional[Dict[str, Any]]]:
+        started[batch] = time.monotonic()
+        if len(batch) == 1:
+            return [evaluate_vendor_with_bedrock(vendors[batch[0]], user_requirements, model_id)]
+        return evaluate_vendor_batch_with_bedrock([vendors[i] for i in batch], user_requirements, model_id)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    futures = {}
+    for batch in batches:
+        futures[executor.submit(_run, tuple(batch))] = tuple(batch)
+    pending = set(futures)
+    batch_deadline = time.monotonic() + total_timeout
+
+    try:
+        while pending:
+            now = time.monotonic()
+
+            # 呼び出し単位の期限切れ
+            for future in list(pending):
+                batch = futures[future]
+                if not future.done() and batch in started and now - started[batch] >= call_timeout:
+                    pending.discard(future)
+                    for index in batch:
+                        yield index, None
+
+            # 全体の期限切れ（未開始分はキャンセル）
+            if now >= batch_deadline:
+                for future in pending:
+                    future.cancel()
+                    for index in futures[future]:
+                        yield index, None
+                break
+
+            if not pending:
+                break
+
+            next_deadline = min(
+                [batch_deadline]
+                + [started[futures[f]] + call_timeout for f in pending if futures[f] in started]
+            )
+            if any(futures[f] not in started for f in pending):
+                # 未開始の呼び出しが開始されたら期限を計算し直す
+                next_deadline = min(next_deadline, now + EVAL_POLL_INTERVAL)
+            done, pending = wait(pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = futures[future]
+                for index, result in zip(batch, future.result()):
+                    if result is not None:
+                        if cache and not result.get("error"):
+                            cache.put(vendors[index], user_requirements, model_id, result)
+                        yield index, result
+                    elif len(batch) > 1:
+                        # バッチ応答に欠けたベンダーは個別に再評価
+                        retry = executor.submit(_run, (index,))
+                        futures[retry] = (index,)
+                        pending.add(retry)
+    finally:
+        # 打ち切った呼び出しの完了は待たない
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def evaluate_vendors_concurrently(
+    vendors: List[Dict[str, Any]],
+    user_requirements: Dict[str, Any],
+    **options: Any
+) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+    """
+    複数ベンダーの Bedrock 評価を並列実行し、全件の完了（または打ち切り）を待つ
+    options は iter_vendor_evaluations と同じ
+
+    Returns:
+        (vendors と同じ順序の評価結果リスト（打ち切り分は None）, 打ち切られたインデックスのリスト)
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(vendors)
+    timed_out: List[int] = []
+    for index, result in iter_vendor_evaluations(vendors, user_requirements, **options):
+        if result is None:
+            timed_out.append(index)
+        else:
+            results[index] = result
+    return results, sorted(timed_out)
+
+
+def _parse_user_requirements(body: Dict[str, Any]) -> Dict[str, Any]:
+    """リクエストボディからユーザー要件を取得"""
+    return {
+        "priorities": body.get("priorities", []),
+        "developmentStyle": body.get("developmentStyle", ""),
+        "companySize": body.get("companySize", ""),
+        "techStack": body.get("techStack", []),
+        "industry": body.get("industry", ""),
+        "ipOwnership": body.get("ipOwnership", ""),
+        "partnership": body.get("partnership", ""),
+    }
+
+
+def _recommendation(item: Dict[str, Any]) -> Dict[str, Any]:
+    """レスポンス用の推薦項目"""
+    return {
+        "company_name": item["company_name"],
+        "match_score": item["match_score"],
+        "reasoning": item["reasoning"],
+        "strategic_breakdown": item["strategic_breakdown"],
+        "tier": item["tier"]
+    }
+
+
+def _cascade_targets(ranked: List[Tuple[int, int]], top_n: int, margin: int) -> List[int]:
+    """高精度モデルで再評価するベンダー（上位 N 社と、N 位との差が margin 点以内の社）"""
+    if not ranked:
+        return []
+    cutoff = -ranked[min(top_n, len(ranked)) - 1][0]
+    return sorted(i for neg_score, i in ranked if -neg_score >= cutoff - margin)
+
+
+def iter_recommendation_events(user_requirements: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    ベンダー推薦を実行し、途中経過をイベントとして返す
+    - "vendor": 1社の評価が終わるたびに、そのベンダーのスコアと暫定上位3社
+      （カスケード時は高精度モデルで再評価したベンダーについてもう一度）
+    - "timeout": 評価が打ち切られたベンダー
+    - "summary": 最終的な上位3社と統計情報（通常のレスポンスと同じ内容）
+    """
+    timings: Dict[str, int] = {}
+    
+    # S3からベンダー表を読み込み
+    stage_start = time.perf_counter()
+    all_vendors = load_vendors_from_s3()
+    timings["load_ms"] = int((time.perf_counter() - stage_start) * 1000)
+    
+    # 簡易スコアで候補を絞り込み（元の順序を維持）
+    stage_start = time.perf_counter()
+    candidate_indices, _ = select_candidates(all_vendors, user_requirements)
+    vendors = all_vendors.take(candidate_indices)
+    strategic_scores, strategic_breakdown = calculate_strategic_scores(vendors)
+    timings["prefilter_ms"] = int((time.perf_counter() - stage_start) * 1000)
+    
+    # 行が変わったベンダーのキャッシュを無効化
+    cache_hits_before = 0
+    if EVALUATION_CACHE:
+        EVALUATION_CACHE.sync_vendors(all_vendors)
+        cache_hits_before = EVALUATION_CACHE.hits
+    
+    # PJ要件適合度をBedrockで並列評価し、終わったものから返す
+    # カスケード時は「高速モデルで全社 → 上位のみ高精度モデル」の2段階（制限時間は共有）
+    llm_start = time.perf_counter()
+    tier, model_id = ("fast", EVAL_FAST_MODEL) if EVAL_CASCADE_TOP_N > 0 else ("strong", EVAL_STRONG_MODEL)
+    target_indices = list(range(len(vendors)))
+    items: Dict[int, Dict[str, Any]] = {}
+    ranked: List[Tuple[int, int]] = []
+    timed_out: List[int] = []
+    rescored = 0
+    
+    while target_indices:
+        stage_start = time.perf_counter()
+        remaining = max(0.0, EVAL_TOTAL_TIMEOUT - (stage_start - llm_start))
+        for j, bedrock_result in iter_vendor_evaluations(
+            vendors.take(target_indices), user_requirements,
+            total_timeout=remaining, batch_token_budget=EVAL_BATCH_TOKEN_BUDGET,
+            cache=EVALUATION_CACHE, model_id=model_id
+        ):
+            i = target_indices[j]
+            vendor = vendors[i]
+            
+            if bedrock_result is None:
+                # 高速モデルの結果がある場合はそれを残し、なければ部分結果から除外
+                if i not in items:
+                    timed_out.append(i)
+                    yield {"event": "timeout", "data": {"company_name": vendor.get("company_name", "")}}
+                continue
+            if bedrock_result.get("error") and i in items:
+                # 高精度モデルの評価に失敗した場合は高速モデルの結果を残す（仮の 50 点で順位を変えない）
+                continue
+            
             pj_score = bedrock_result["pj_match_score"]
             reasoning = bedrock_result["reasoning"]
-            
-            # 戦略スコアを計算
-            strategic_score = calculate_strategic_score(vendor)
+            strategic_score = int(strategic_scores[i])
             
             # 総合スコア = 0.6 × PJ適合度 + 0.4 × 戦略スコア
             total_score = int(0.6 * pj_score + 0.4 * strategic_score)
             
-            evaluations.append({
+            if i in items:
+                ranked.remove((-items[i]["match_score"], i))
+            items[i] = {
                 "company_name": vendor.get("company_name", ""),
                 "match_score": total_score,
                 "pj_match_score": pj_score,
                 "strategic_score": strategic_score,
+                "strategic_breakdown": breakdown_for(strategic_breakdown, i),
                 "reasoning": reasoning,
-                "vendor_data": vendor  # デバッグ用（本番では削除可）
-            })
+                "tier": tier,
+                "model_id": model_id
+            }
+            
+            # スコア降順・同点は入力順（逐次実行時の安定ソートと同じ順位）
+            bisect.insort(ranked, (-total_score, i))
+            
+            yield {
+                "event": "vendor",
+                "data": {
+                    **items[i],
+                    "top3": [_recommendation(items[k]) for _, k in ranked[:3]]
+                }
+            }
+        timings[f"llm_{tier}_ms"] = int((time.perf_counter() - stage_start) * 1000)
         
-        # スコアでソート（降順）
-        evaluations.sort(key=lambda x: x["match_score"], reverse=True)
+        if tier != "fast":
+            break
+        target_indices = _cascade_targets(ranked, EVAL_CASCADE_TOP_N, EVAL_CASCADE_MARGIN)
+        rescored = len(target_indices)
+        tier, model_id = "strong", EVAL_STRONG_MODEL
+    
+    timings["llm_ms"] = int((time.perf_counter() - llm_start) * 1000)
+    timed_out.sort()
+    
+    yield {
+        "event": "summary",
+        "data": {
+            "recommendations": [_recommendation(items[k]) for _, k in ranked[:3]],
+            "partial": bool(timed_out),
+            "timed_out": [vendors[i].get("company_name", "") for i in timed_out],
+            "stats": {
+                "vendors_total": len(all_vendors),
+                "vendors_pruned": len(all_vendors) - len(vendors),
+                "vendors_evaluated": len(vendors) - len(timed_out),
+                "cache_hits": EVALUATION_CACHE.hits - cache_hits_before if EVALUATION_CACHE else 0,
+                "vendor_cache": dict(VENDOR_CACHE_STATS),
+                "tiers": {
+                    name: sum(1 for item in items.values() if item["tier"] == name)
+                    for name in ("fast", "strong")
+                },
+                "cascade_rescored": rescored,
+                "validation_errors": all_vendors.errors,
+                "timings": timings
+            }
+        }
+    }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """イベントを Server-Sent Events 形式に変換"""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+
+def _read_body(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """リクエストボディの取得"""
+    if not event.get("body"):
+        return None
+    if isinstance(event["body"], str):
+        return json.loads(event["body"])
+    return event["body"]
+
+
+def stream_handler(event: Dict[str, Any], context: Any) -> Iterator[str]:
+    """
+    ストリーミング用ハンドラー
+    SSE のチャンクを評価が終わった順に返す（stream_app.py が Lambda Web Adapter 経由で逐次送信する）
+    """
+    try:
+        body = _read_body(event)
+    except json.JSONDecodeError as e:
+        yield format_sse({"event": "error", "data": {"error": f"Invalid JSON body: {str(e)}"}})
+        return
+    if body is None:
+        yield format_sse({"event": "error", "data": {"error": "Missing request body"}})
+        return
+    try:
+        for item in iter_recommendation_events(_parse_user_requirements(body)):
+            yield format_sse(item)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        yield format_sse({"event": "error", "data": {"error": str(e)}})
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda ハンドラー
+    入力JSONを受け取り、ベンダー推薦結果を返す
+    （評価が終わった順に受け取る場合はストリーミング用の stream_app.py を使う）
+    """
+    try:
+        # OPTIONSリクエスト（CORS preflight）の処理
+        if event.get("httpMethod") == "OPTIONS":
+            return _response(200, {})
         
-        # 上位3社を取得
-        top3 = evaluations[:3]
+        # リクエストボディの取得
+        body = _read_body(event)
+        if body is None:
+            return _response(400, {"error": "Missing request body"})
         
-        # レスポンス形式に整形
-        recommendations = [
-            {
-                "company_name": item["company_name"],
-                "match_score": item["match_score"],
-                "reasoning": item["reasoning"]
-            }
-            for item in top3
-        ]
+        summary: Dict[str, Any] = {}
+        for item in iter_recommendation_events(_parse_user_requirements(body)):
+            if item["event"] == "summary":
+                summary = item["data"]
         
-        return _response(200, {
-            "recommendations": recommendations
-        })
+        return _response(200, summary)
         
     except Exception as e:
         print(f"Error: {str(e)}")
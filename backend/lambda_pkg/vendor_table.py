@@ -0,0 +1,190 @@
+"""
+ベンダー表（列指向）
+- vendors.csv をスキーマに従って一度だけパースし、列ごとの NumPy 配列で保持
+- 数値・日付カラムはパース済み、変換できない値は行単位のバリデーションエラーとして記録
+- 数値カラムの空欄・変換できない値は欠損マスクで区別（配列上は 0、行ビューでは None）
+- 文字列カラムは object 配列（最長の値に合わせた固定長の領域を全行に確保しない）
+- 各行は Vendor（__slots__ の軽量ビュー）として dict と同じように参照できる
+"""
+import csv
+import io
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Dict, List, Any, Iterator, Optional, Sequence
+
+import numpy as np
+
+# カラム名 → 型（str / int / date）
+VENDOR_SCHEMA: Dict[str, type] = {
+    "company_name": str,
+    "company_url": str,
+    "employee_count": int,
+    "foundation_year": int,
+    "headquarters": str,
+    "business_model": str,
+    "tech_stack": str,
+    "domain_expertise": str,
+    "specialization_type": str,
+    "aws_capability": int,
+    "internal_dev_support": int,
+    "ip_flexibility": int,
+    "technical_depth": int,
+    "consulting_capability": int,
+    "support_model": str,
+    "engagement_status": str,
+    "last_contact_date": date,
+    "notes": str,
+}
+
+DATE_FORMATS = ("%Y/%m/%d", "%Y-%m-%d")
+
+
+def _parse_int(raw: Any) -> Optional[int]:
+    if isinstance(raw, (int, np.integer)):
+        return int(raw)
+    text = str(raw).strip() if raw is not None else ""
+    return int(text) if text else None
+
+
+def _parse_date(raw: Any) -> Optional[date]:
+    if isinstance(raw, date):
+        return raw
+    text = str(raw).strip() if raw is not None else ""
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unsupported date format: {text}")
+
+
+def _to_array(values: List[Any], kind: type) -> np.ndarray:
+    if kind is int:
+        return np.array([0 if v is None else v for v in values], dtype=np.int32)
+    if kind is date:
+        return np.array([np.datetime64(v, "D") if v else np.datetime64("NaT", "D") for v in values], dtype="datetime64[D]")
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class Vendor(Mapping):
+    """ベンダー表の1行（列配列への参照のみを持つ読み取り専用ビュー）"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "VendorTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._table.columns[key][self._index]
+        missing = self._table.missing.get(key)
+        if missing is not None and missing[self._index]:
+            return None
+        # NumPy スカラーを Python の値に変換（NaT は None）
+        return value.item() if hasattr(value, "item") else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.columns)
+
+    def __len__(self) -> int:
+        return len(self._table.columns)
+
+    def __repr__(self) -> str:
+        return f"Vendor({dict(self)!r})"
+
+
+class VendorTable(Sequence):
+    """列指向のベンダー表"""
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        errors: Optional[List[Dict[str, Any]]] = None,
+        missing: Optional[Dict[str, np.ndarray]] = None
+    ):
+        self.columns = columns
+        self.errors = errors or []
+        # 数値カラム名 → 欠損（空欄・変換エラー）の行を True とするマスク
+        self.missing = missing or {}
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_records(cls, records: Sequence[Mapping], row_offset: int = 1) -> "VendorTable":
+        """
+        行データ（dict 等）からベンダー表を構築
+
+        Args:
+            records: 行データのリスト
+            row_offset: エラー報告用の先頭行番号（CSV ではヘッダー行の次の 2）
+        """
+        names = list(VENDOR_SCHEMA)
+        for record in records:
+            names.extend(k for k in record if k is not None and k not in names)
+
+        values: Dict[str, List[Any]] = {name: [] for name in names}
+        errors: List[Dict[str, Any]] = []
+        for row_number, record in enumerate(records, row_offset):
+            for name in names:
+                kind = VENDOR_SCHEMA.get(name, str)
+                raw = record.get(name)
+                try:
+                    if kind is int:
+                        value = _parse_int(raw)
+                    elif kind is date:
+                        value = _parse_date(raw)
+                    else:
+                        value = "" if raw is None else str(raw)
+                except (ValueError, TypeError) as e:
+                    errors.append({"row": row_number, "column": name, "value": raw, "error": str(e)})
+                    value = None
+                values[name].append(value)
+
+        columns = {name: _to_array(values[name], VENDOR_SCHEMA.get(name, str)) for name in names}
+        missing = {
+            name: np.array([v is None for v in values[name]], dtype=bool)
+            for name in names if VENDOR_SCHEMA.get(name) is int
+        }
+        return cls(columns, errors, missing)
+
+    @classmethod
+    def from_csv(cls, csv_content: str) -> "VendorTable":
+        """vendors.csv の内容からベンダー表を構築"""
+        return cls.from_records(list(csv.DictReader(io.StringIO(csv_content))), row_offset=2)
+
+    def column(self, name: str) -> np.ndarray:
+        """列配列を取得"""
+        return self.columns[name]
+
+    def present(self, name: str) -> np.ndarray:
+        """値が入っている行を True とするマスク（日付は NaT、数値は欠損マスクで判定）"""
+        column = self.columns[name]
+        if name in self.missing:
+            return ~self.missing[name]
+        if np.issubdtype(column.dtype, np.datetime64):
+            return ~np.isnat(column)
+        return np.ones(len(column), dtype=bool)
+
+    def take(self, indices: Sequence[int]) -> "VendorTable":
+        """指定行だけを持つベンダー表を返す"""
+        idx = np.asarray(indices, dtype=np.intp)
+        return VendorTable(
+            {name: col[idx] for name, col in self.columns.items()},
+            self.errors,
+            {name: mask[idx] for name, mask in self.missing.items()},
+        )
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Vendor(self, i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("vendor index out of range")
+        return Vendor(self, index)
@@ -0,0 +1,105 @@
+"""
+ANN インデックス（HNSW / IVF-PQ）のベンチマーク
+厳密検索（全件との内積）を正解として、HNSW は ef_search ごと、IVF-PQ は nprobe ごとの
+recall@k とクエリあたりの検索時間を比較
+
+使い方:
+    python scripts/bench_ann.py [--index hnsw|ivfpq] [--n チャンク数] [--dims 次元数]
+                                [--intrinsic-dims 潜在次元数] [--snapshot ディレクトリ]
+    （--snapshot 指定時は build_local_index.py で作成したスナップショットのベクトルを使う）
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_pkg"))
+
+from ann_index import HNSW_EF_CONSTRUCTION, HNSW_M, HNSWIndex  # noqa: E402
+from ivf_index import IVF_EF_SEARCH, IVF_NLIST, IVF_PQ_M, IVFPQIndex  # noqa: E402
+
+EF_SEARCH = (10, 20, 40, 80, 160, 320)
+NPROBE = (4, 8, 16, 32, 64, 128)
+# ランダムベクトルを作る行数の単位（float64 の一時配列でメモリを使い切らない）
+GENERATE_BATCH_ROWS = 10000
+
+
+def load_vectors(args):
+    if args.snapshot:
+        return np.load(os.path.join(args.snapshot, "vectors.npy"))
+    # 実際の埋め込みに近づけるため、低次元の潜在ベクトルを高次元に射影して作る
+    # （等方的なランダムベクトルは近傍がほぼ等距離で、recall の比較にならない。--intrinsic-dims 0 で等方的）
+    rng = np.random.default_rng(0)
+    projection = rng.normal(size=(args.intrinsic_dims, args.dims)) if args.intrinsic_dims else None
+    vectors = np.empty((args.n, args.dims), dtype=np.float32)
+    for start in range(0, args.n, GENERATE_BATCH_ROWS):
+        rows = min(GENERATE_BATCH_ROWS, args.n - start)
+        if projection is not None:
+            block = rng.normal(size=(rows, args.intrinsic_dims)) @ projection
+        else:
+            block = rng.normal(size=(rows, args.dims))
+        vectors[start:start + rows] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", choices=("hnsw", "ivfpq"), default="hnsw")
+    parser.add_argument("--n", type=int, default=5000, help="ランダムベクトルの件数")
+    parser.add_argument("--dims", type=int, default=1024, help="ランダムベクトルの次元数")
+    parser.add_argument("--intrinsic-dims", type=int, default=32, help="ランダムベクトルの潜在次元数")
+    parser.add_argument("--snapshot", help="スナップショットのディレクトリ（vectors.npy を使う）")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF-PQ のリスト数（0 は √n）")
+    parser.add_argument("--pq-m", type=int, default=IVF_PQ_M, help="IVF-PQ の部分空間数")
+    parser.add_argument("--ef-search", type=int, default=IVF_EF_SEARCH, help="IVF-PQ で厳密に並べ直す候補数")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    n, dims = vectors.shape
+    k = args.k
+    rng = np.random.default_rng(1)
+    # クエリはコーパスのベクトルにノイズを加えたもの
+    # ノイズは次元数の平方根で割り、ノルムを単位ベクトルと同程度（約 1）に抑える
+    queries = vectors[rng.integers(0, n, args.queries)]
+    queries = queries + rng.normal(scale=1 / np.sqrt(dims), size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    if args.index == "hnsw":
+        print(f"{n} vectors x {dims} dims, hnsw m={args.m}, ef_construction={args.ef_construction}")
+        index = HNSWIndex.build(vectors, m=args.m, ef_construction=args.ef_construction)
+    else:
+        index = IVFPQIndex.build(vectors, nlist=args.nlist, m=args.pq_m, ef_search=args.ef_search)
+        print(f"{n} vectors x {dims} dims, ivfpq nlist={index.nlist}, m={args.pq_m}, ef_search={args.ef_search}")
+    print(f"build: {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    truth = []
+    for q in queries:
+        scores = vectors @ q
+        truth.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"{'exact':<12} recall@{k}=1.000  {exact_ms:>7.2f} ms/query")
+
+    if args.index == "hnsw":
+        settings = [(f"ef={ef}", ef) for ef in EF_SEARCH]
+    else:
+        settings = [(f"nprobe={nprobe}", nprobe) for nprobe in NPROBE if nprobe <= index.nlist]
+    for label, value in settings:
+        if args.index == "ivfpq":
+            index.nprobe = value
+        start = time.perf_counter()
+        found = [index.search(q, k=k, ef=value if args.index == "hnsw" else None)[0] for q in queries]
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        recall = np.mean([len(t.intersection(f.tolist())) / k for t, f in zip(truth, found)])
+        print(f"{label:<12} recall@{k}={recall:.3f}  {ms:>7.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+チャンカーのベンチマーク
+固定長の split_text_jp と文・見出し単位の chunker を比較（チャンク数・推定トークン数・処理速度）
+
+使い方:
+    python scripts/bench_chunker.py [テキストファイル] [繰り返し回数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_pkg"))
+
+from chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, chunk_text, estimate_tokens  # noqa: E402
+from preprocess import split_text_jp  # noqa: E402
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "Akari.txt")
+
+
+def bench(name, fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = fn(text)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tokens = [estimate_tokens(c) for c in chunks]
+    print(
+        f"{name:<28} chunks={len(chunks):>4}  tokens={sum(tokens):>7}  "
+        f"avg={sum(tokens) / max(1, len(chunks)):>6.1f}  max={max(tokens, default=0):>5}  "
+        f"{len(text) / elapsed / 1e6:>6.2f} Mchars/s"
+    )
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    print(f"{path}: {len(text)} chars, {estimate_tokens(text)} tokens (estimated)")
+    bench("split_text_jp(900, 150)", split_text_jp, text, repeat)
+    bench(f"chunk_text({CHUNK_MAX_TOKENS}, {CHUNK_OVERLAP_TOKENS})", chunk_text, text, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -69,7 +69,8 @@ mapping = {
             },
             "participants": {"type": "keyword"},
             "doc_type": {"type": "keyword"},
-            "tags": {"type": "keyword"}
+            "tags": {"type": "keyword"},
+            "section": {"type": "keyword"}  # チャンクが属する見出しの階層
         }
     }
 }
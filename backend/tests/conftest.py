@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Lambda では lambda_pkg 直下がルートになるため、テストでも同じ import 解決にする
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda_pkg"))
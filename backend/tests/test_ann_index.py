@@ -0,0 +1,45 @@
+import numpy as np
+
+from lambda_pkg.ann_index import HNSWIndex
+
+
+def _vectors(n=400, dims=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _recall(index, vectors, queries, k=10):
+    hits = 0
+    for q in queries:
+        truth = set(np.argsort(-(vectors @ q))[:k].tolist())
+        hits += len(truth.intersection(index.search(q, k=k)[0].tolist()))
+    return hits / (k * len(queries))
+
+
+def test_hnsw_recall_against_exact_search():
+    vectors = _vectors()
+    index = HNSWIndex.build(vectors, ef_construction=64, ef_search=64)
+    assert len(index) == 400
+    assert _recall(index, vectors, vectors[:30]) >= 0.95
+    rows, scores = index.search(vectors[5], k=3)
+    assert rows[0] == 5 and list(scores) == sorted(scores, reverse=True)
+    assert all(len(links[0]) <= 32 for links in index.links)
+
+
+def test_incremental_add_and_single_file_round_trip(tmp_path):
+    vectors = _vectors()
+    index = HNSWIndex.build(vectors[:200], ef_construction=64, ef_search=64)
+    index.add(vectors[200:])
+    assert len(index) == 400
+    assert index.search(vectors[350], k=1)[0].tolist() == [350]
+
+    path = str(tmp_path / "hnsw.npz")
+    index.save(path)
+    loaded = HNSWIndex.load(path)
+    assert (loaded.m, loaded.ef_construction, loaded.ef_search) == (16, 64, 64)
+    for q in vectors[:10]:
+        assert loaded.search(q, k=5)[0].tolist() == index.search(q, k=5)[0].tolist()
+
+    index.save(path, include_vectors=False)
+    shared = HNSWIndex.load(path, vectors=vectors)
+    assert shared.vectors is vectors
@@ -1,12 +1,45 @@
 ﻿import json
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+import local_index
+from lambda_pkg import app
 from lambda_pkg.app import handler
 
 
-@patch("lambda_pkg.opensearch_client.search_hybrid", return_value=[{"id":"1","text":"dummy","meta":{}}])
-@patch("lambda_pkg.bedrock_client.generate_answer", return_value=("ok", [{"id":"1","preview":"dummy"}]))
-def test_handler_ok(mock_ans, mock_search):
-    res = handler({"httpMethod":"GET","queryStringParameters":{"q":"hello"}}, None)
+def _fake_client(hits):
+    client = MagicMock()
+    client.hybrid_search_with_stats.return_value = (hits, {"legs": {"bm25": "ok", "knn": "ok"}})
+    return client
+
+
+HITS = [{"_id": "1", "_score": 0.5, "_source": {"text": "dummy", "vendor_name": "A社", "vector": [0.1]}}]
+
+
+@patch.object(app, "_get_client", return_value=_fake_client(HITS))
+@patch.object(app, "generate_answer", return_value=("ok", [{"id": "1", "preview": "dummy"}]))
+def test_handler_ok(mock_ans, mock_client):
+    res = handler({"httpMethod": "GET", "queryStringParameters": {"q": "hello", "generate": "true"}}, None)
     body = json.loads(res["body"])
     assert res["statusCode"] == 200
     assert body["query"] == "hello"
+    assert body["answer"] == "ok"
+    assert body["results"] == [{"id": "1", "score": 0.5, "text": "dummy", "meta": {"vendor_name": "A社"}}]
+    mock_client.return_value.hybrid_search_with_stats.assert_called_once_with("hello", size=5)
+
+
+def test_get_client_uses_opensearch_by_default(monkeypatch):
+    monkeypatch.setattr(app, "_CLIENT", None)
+    monkeypatch.setattr(app, "SEARCH_BACKEND", "opensearch")
+    monkeypatch.setattr(app, "OpenSearchClient", lambda: "opensearch-client")
+    assert app._get_client() == "opensearch-client"
+    # warm Lambda では同じクライアントを再利用
+    monkeypatch.setattr(app, "OpenSearchClient", lambda: "another")
+    assert app._get_client() == "opensearch-client"
+
+
+def test_get_client_loads_local_snapshot(monkeypatch):
+    monkeypatch.setattr(app, "_CLIENT", None)
+    monkeypatch.setattr(app, "SEARCH_BACKEND", "local")
+    monkeypatch.setattr(app, "OpenSearchClient", lambda: 1 / 0)
+    monkeypatch.setattr(local_index.LocalSearchClient, "from_uri", classmethod(lambda cls: "local-client"))
+    assert app._get_client() == "local-client"
@@ -7,3 +7,55 @@ def test_embed_if(mock_invoke):
     mock_invoke.return_value = type("R",(),{"body":type("B",(),{"read":lambda s: b'{\"embedding\":[[0.1,0.2]]}'})()})
     vec = bc.embed_texts(["hi"])
     assert len(vec[0]) == 2
+
+
+def _fast_bucket(monkeypatch):
+    monkeypatch.setattr(bc, "EMBED_BUCKET", bc.TokenBucket(1000))
+    monkeypatch.setattr(bc, "EMBED_BACKOFF_BASE", 0.001)
+
+
+def test_embed_texts_concurrent_ordered_and_deduplicated(monkeypatch):
+    import threading
+    import time
+    _fast_bucket(monkeypatch)
+    calls, active, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def fake_embed(text):
+        with lock:
+            calls.append(text)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return [float(len(text))]
+
+    monkeypatch.setattr(bc, "embed_text", fake_embed)
+    stats = {}
+    texts = ["a", "bbb", "cc", "a", "dddd", "bbb"]
+    vecs = bc.embed_texts(texts, max_concurrency=3, stats=stats)
+    assert vecs == [[1.0], [3.0], [2.0], [1.0], [4.0], [3.0]]
+    assert sorted(calls) == ["a", "bbb", "cc", "dddd"]
+    assert 1 < peak[0] <= 3
+    assert stats["chunks"] == 6 and stats["unique"] == 4
+    assert stats["chunks_per_sec"] > 0
+
+
+def test_embed_texts_backs_off_on_throttling(monkeypatch):
+    from botocore.exceptions import ClientError
+    _fast_bucket(monkeypatch)
+    attempts = []
+
+    def fake_embed(text):
+        attempts.append(text)
+        if len(attempts) < 3:
+            raise ClientError({"Error": {"Code": "ThrottlingException"}}, "InvokeModel")
+        return [0.5]
+
+    monkeypatch.setattr(bc, "embed_text", fake_embed)
+    stats = {}
+    assert bc.embed_texts(["x"], stats=stats) == [[0.5]]
+    assert len(attempts) == 3
+    assert stats["throttled"] == 2
+    assert bc.EMBED_BUCKET.rate < bc.EMBED_BUCKET.max_rate
@@ -0,0 +1,129 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from lambda_pkg import bulk_indexer as bi
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    """bulk リクエストを記録し、reject に含まれる _id を初回だけ reject_status（既定 429）で拒否する"""
+
+    def __init__(self, reject=(), fail=(), reject_status=429):
+        self.requests = []
+        self.reject = set(reject)
+        self.reject_status = reject_status
+        self.fail = set(fail)
+        self._lock = threading.Lock()
+
+    def post(self, url, data, headers, auth, timeout):
+        if headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        lines = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+        actions = [line for line in lines if set(line) & {"index", "delete"}]
+        with self._lock:
+            self.requests.append(actions)
+        items = []
+        for action in actions:
+            op, meta = next(iter(action.items()))
+            if meta["_id"] in self.fail:
+                status = 400
+            elif meta["_id"] in self.reject:
+                status = self.reject_status
+                with self._lock:
+                    self.reject.discard(meta["_id"])
+            else:
+                status = 201
+            items.append({op: {"_id": meta["_id"], "status": status}})
+        return FakeResponse(200, {"errors": any(i[op]["status"] >= 300 for i in items), "items": items})
+
+
+def _actions(n):
+    for i in range(n):
+        yield {"index": {"_index": "idx", "_id": f"d{i}"}}, {"text": "あ" * 100}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bi, "BULK_BACKOFF_BASE", 0.0)
+
+
+def test_splits_by_doc_count_and_bytes():
+    session = FakeSession()
+    summary = bi.BulkIndexer("http://os/_bulk", session=session, max_docs=4, concurrency=2).index(_actions(10))
+    assert [len(r) for r in sorted(session.requests, key=len, reverse=True)] == [4, 4, 2]
+    assert summary["indexed"] == 10 and summary["batches"] == 3
+
+    session = FakeSession()
+    size = len(bi.encode_action(*next(_actions(1))))
+    bi.BulkIndexer("http://os/_bulk", session=session, max_bytes=size * 3, compress=True).index(_actions(7))
+    assert sorted(len(r) for r in session.requests) == [1, 3, 3]
+
+
+def test_retries_only_rejected_items():
+    session = FakeSession(reject={"d1", "d3"}, fail={"d4"})
+    summary = bi.BulkIndexer("http://os/_bulk", session=session).index(_actions(5))
+    assert [a["index"]["_id"] for a in session.requests[1]] == ["d1", "d3"]
+    assert summary["indexed"] == 4
+    assert summary["retried"] == 2
+    assert summary["failed"] == 1
+    assert summary["errors"][0]["_id"] == "d4"
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_retries_items_rejected_with_5xx(status):
+    session = FakeSession(reject={"d2"}, reject_status=status)
+    summary = bi.BulkIndexer("http://os/_bulk", session=session).index(_actions(3))
+    assert [a["index"]["_id"] for a in session.requests[1]] == ["d2"]
+    assert (summary["indexed"], summary["retried"], summary["failed"]) == (3, 1, 0)
+
+
+def test_gives_up_after_max_retries():
+    class Busy(FakeSession):
+        def post(self, url, data, headers, auth, timeout):
+            self.requests.append(data)
+            return FakeResponse(429)
+
+    session = Busy()
+    summary = bi.BulkIndexer("http://os/_bulk", session=session, max_retries=2).index(_actions(3))
+    assert len(session.requests) == 3
+    assert summary["failed"] == 3 and summary["indexed"] == 0
+
+
+def test_concurrent_index_calls_share_request_budget():
+    import time
+
+    class Slow(FakeSession):
+        def __init__(self):
+            super().__init__()
+            self.active = self.peak = 0
+
+        def post(self, url, data, headers, auth, timeout):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.02)
+            with self._lock:
+                self.active -= 1
+            return super().post(url, data, headers, auth, timeout)
+
+    session = Slow()
+    indexer = bi.BulkIndexer("http://os/_bulk", session=session, max_docs=1, concurrency=2)
+    threads = [threading.Thread(target=indexer.index, args=(_actions(4),)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(session.requests) == 12
+    assert session.peak <= 2
@@ -0,0 +1,51 @@
+import random
+
+from lambda_pkg import chunker as ck
+
+
+def test_estimate_tokens():
+    assert ck.estimate_tokens("議事録です。") == 6
+    assert ck.estimate_tokens("AWS Lambda") == 3
+    assert ck.estimate_tokens(" \n　") == 0
+
+
+def test_chunks_end_on_sentence_boundaries_within_budget():
+    text = "".join(f"{i}番目の文です。" for i in range(200))
+    chunks = ck.chunk_text(text, max_tokens=50, overlap_tokens=10)
+    assert all(ck.estimate_tokens(c) <= 50 for c in chunks)
+    assert all(c.endswith("。") for c in chunks)
+    # オーバーラップは直前のチャンク末尾の文を丸ごと引き継ぐ
+    for prev, cur in zip(chunks, chunks[1:]):
+        first = cur.split("。")[0] + "。"
+        assert prev.endswith(first)
+
+
+def test_headings_start_new_chunks_without_overlap():
+    text = "# 概要\n背景の説明。課題の説明。\n## 次回\n宿題の確認。\n"
+    assert ck.chunk_text(text, max_tokens=100, overlap_tokens=20) == [
+        "# 概要\n背景の説明。課題の説明。\n",
+        "## 次回\n宿題の確認。\n",
+    ]
+
+
+def test_long_sentence_is_split_and_streaming_matches():
+    rng = random.Random(0)
+    text = "あ" * 130 + "。" + "".join(rng.choice(["いう。", "えお！", "か\n", "# 見出し\n"]) for _ in range(300))
+    chunks = ck.chunk_text(text, max_tokens=60, overlap_tokens=8)
+    assert chunks[:3] == ["あ" * 60, "あ" * 60, "あ" * 10 + "。"]
+
+    def pieces():
+        i = 0
+        while i < len(text):
+            step = rng.randint(1, 50)
+            yield text[i:i + step]
+            i += step
+
+    assert list(ck.iter_token_chunks(pieces(), max_tokens=60, overlap_tokens=8)) == chunks
+
+
+def test_chunks_carry_heading_path():
+    text = "前置き。\n# 概要\n背景。\n## 課題\n課題A。\n# 次回\n宿題。\n"
+    assert [section for _, section in ck.iter_section_chunks([text], max_tokens=100)] == [
+        "", "概要", "概要 > 課題", "次回",
+    ]
@@ -0,0 +1,113 @@
+import io
+import json
+
+import numpy as np
+
+from lambda_pkg import embedding_cache as emc
+
+
+def test_key_uses_normalized_query_model_and_dimensions():
+    assert emc.normalize_query("  ＡＷＳ　 の  事例 ") == "AWS の 事例"
+    key = emc.vector_key("AWS", "titan", 1024)
+    assert key == emc.vector_key("AWS", "titan", 1024)
+    assert key != emc.vector_key("AWS", "titan", 512)
+    assert key != emc.vector_key("AWS", "cohere", 1024)
+
+
+def test_memory_lru_and_hit_rate():
+    cache = emc.EmbeddingCache(max_entries=2)
+    cache.put("a", [0.5, 0.25])
+    cache.put("b", [1.0, 0.0])
+    assert cache.get("a") == [0.5, 0.25]
+    cache.put("c", [0.0, 1.0])
+    assert cache.get("b") is None
+    assert cache.stats() == {"memory_hits": 1, "persistent_hits": 0, "misses": 1, "hit_rate": 0.5, "size": 2}
+
+
+def test_sqlite_tier_survives_new_process_cache(tmp_path):
+    path = str(tmp_path / "vectors.db")
+    emc.EmbeddingCache(store=emc.SQLiteVectorStore(path)).put("q", [0.1, 0.2, 0.3])
+
+    cache = emc.EmbeddingCache(store=emc.SQLiteVectorStore(path))
+    vector = cache.get("q")
+    np.testing.assert_allclose(vector, [0.1, 0.2, 0.3], rtol=1e-6)
+    assert cache.get("q") == vector
+    assert cache.stats()["persistent_hits"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert len(emc.SQLiteVectorStore(path).get("q")) == 3 * 4  # float32
+
+
+def test_embed_query_calls_bedrock_once_per_normalized_query(monkeypatch):
+    from lambda_pkg import opensearch_client as oc
+
+    class FakeBedrock:
+        def __init__(self):
+            self.inputs = []
+
+        def invoke_model(self, body, **kwargs):
+            self.inputs.append(json.loads(body)["inputText"])
+            return {"body": io.BytesIO(json.dumps({"embedding": [0.5, 0.5]}).encode())}
+
+    monkeypatch.setenv("OPENSEARCH_ENDPOINT", "https://example.com")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "y")
+    monkeypatch.setattr(oc, "QUERY_EMBEDDING_CACHE", emc.EmbeddingCache(max_entries=8))
+    client = oc.OpenSearchClient()
+    client._bedrock = FakeBedrock()
+
+    assert client.embed_query("AWS  事例") == [0.5, 0.5]
+    assert client.embed_query(" AWS 事例") == [0.5, 0.5]
+    assert client._bedrock.inputs == ["AWS 事例"]
+    assert oc.QUERY_EMBEDDING_CACHE.stats()["hit_rate"] == 0.5
+
+
+def _counting_embed(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+    return embed
+
+
+def test_embed_with_store_only_embeds_unseen_chunks(tmp_path):
+    store = emc.SQLiteVectorStore(str(tmp_path / "chunks.db"))
+    calls = []
+    embed = _counting_embed(calls)
+
+    first = emc.embed_with_store(["aa", "bbb", "aa"], embed, "titan", 1024, store)
+    assert first == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert calls == [["aa", "bbb"]]
+
+    stats = {}
+    second = emc.embed_with_store(["aa", "cccc", "bbb"], embed, "titan", 1024, store, stats)
+    assert second == [[2.0, 1.0], [4.0, 1.0], [3.0, 1.0]]
+    assert calls[-1] == ["cccc"]
+    assert stats == {"chunks": 3, "reused": 2, "embedded": 1, "reuse_ratio": 2 / 3}
+
+    emc.embed_with_store(["aa"], embed, "titan", 512, store)
+    assert calls[-1] == ["aa"]
+
+
+def test_s3_vector_store_round_trip():
+    class NoSuchKey(Exception):
+        response = {"Error": {"Code": "NoSuchKey"}}
+
+    class StubS3:
+        def __init__(self):
+            self.objects = {}
+
+        def get_object(self, Bucket, Key):
+            if Key not in self.objects:
+                raise NoSuchKey()
+            return {"Body": io.BytesIO(self.objects[Key])}
+
+        def put_object(self, Bucket, Key, Body):
+            self.objects[Key] = Body
+
+    s3 = StubS3()
+    store = emc.build_chunk_store_from_env("s3://bucket/embeddings")
+    store.client = s3
+    store.put_many([("k1", emc.encode_vector([1.0, 2.0]))])
+    assert list(s3.objects) == ["embeddings/k1.f32"]
+    found = store.get_many(["k1", "k2"])
+    assert list(found) == ["k1"]
+    assert emc.decode_vector(found["k1"]) == [1.0, 2.0]
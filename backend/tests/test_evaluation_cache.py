@@ -0,0 +1,105 @@
+import pytest
+from lambda_pkg import evaluation_cache as ec
+
+
+class StubTable:
+    """DynamoDB Table リソースの最小スタブ"""
+
+    def __init__(self):
+        self.items = {}
+        self.calls = []
+
+    def get_item(self, Key):
+        self.calls.append("get")
+        item = self.items.get(Key["pk"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item):
+        self.calls.append("put")
+        self.items[Item["pk"]] = dict(Item)
+
+    def delete_item(self, Key):
+        self.calls.append("delete")
+        self.items.pop(Key["pk"], None)
+
+
+@pytest.fixture(params=["memory", "sqlite", "dynamodb"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return ec.EvaluationCache(ec.MemoryBackend())
+    if request.param == "sqlite":
+        return ec.EvaluationCache(ec.SQLiteBackend(str(tmp_path / "cache.db")))
+    return ec.EvaluationCache(ec.DynamoDBBackend(StubTable()))
+
+
+def test_roundtrip_ignores_requirement_order(cache):
+    vendor = {"company_name": "A", "employee_count": 10}
+    cache.put(vendor, {"techStack": ["AWS", "AI"]}, "m", {"pj_match_score": 80, "reasoning": "r"})
+    assert cache.get(vendor, {"techStack": ["AI", "AWS"]}, "m")["pj_match_score"] == 80
+    assert cache.get(vendor, {"techStack": ["AI", "AWS"]}, "other-model") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_expiry(cache):
+    cache.ttl_seconds = -1
+    cache.put({"company_name": "A"}, {}, "m", {"pj_match_score": 1, "reasoning": "r"})
+    assert cache.get({"company_name": "A"}, {}, "m") is None
+
+
+def test_changed_row_invalidates_only_that_vendor(cache):
+    a, b = {"company_name": "A", "notes": "x"}, {"company_name": "B"}
+    cache.sync_vendors([a, b])
+    cache.put(a, {}, "m", {"pj_match_score": 1, "reasoning": "a"})
+    cache.put(b, {}, "m", {"pj_match_score": 2, "reasoning": "b"})
+    changed = {"company_name": "A", "notes": "y"}
+    invalidated = cache.sync_vendors([changed, b])
+    assert cache.get(changed, {}, "m") is None
+    assert cache.get(b, {}, "m")["reasoning"] == "b"
+    if isinstance(cache.backend, ec.DynamoDBBackend):
+        # 古い行のエントリは参照されず TTL で消える
+        assert invalidated == 0
+    else:
+        assert invalidated == 1
+        assert cache.backend.get(ec.make_cache_key(a, {}, "m")) is None
+
+
+def test_dynamodb_put_is_one_request_and_sync_is_free():
+    table = StubTable()
+    cache = ec.EvaluationCache(ec.DynamoDBBackend(table))
+    cache.sync_vendors([{"company_name": "A"}, {"company_name": "B"}])
+    cache.put({"company_name": "A"}, {}, "m", {"pj_match_score": 1, "reasoning": "A"})
+    assert table.calls == ["put"]
+    assert list(table.items) == [ec.make_cache_key({"company_name": "A"}, {}, "m")]
+
+
+class FailingBackend:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise RuntimeError("backend down")
+        return fail
+
+
+def test_backend_errors_count_as_misses():
+    cache = ec.EvaluationCache(FailingBackend())
+    assert cache.sync_vendors([{"company_name": "A"}]) == 0
+    cache.put({"company_name": "A"}, {}, "m", {"pj_match_score": 1, "reasoning": "A"})
+    assert cache.get({"company_name": "A"}, {}, "m") is None
+    assert (cache.hits, cache.misses, cache.errors) == (0, 1, 3)
+
+
+def test_memory_lru_eviction():
+    cache = ec.EvaluationCache(ec.MemoryBackend(max_entries=2))
+    for name in ["A", "B"]:
+        cache.put({"company_name": name}, {}, "m", {"pj_match_score": 1, "reasoning": name})
+    cache.get({"company_name": "A"}, {}, "m")
+    cache.put({"company_name": "C"}, {}, "m", {"pj_match_score": 1, "reasoning": "C"})
+    assert cache.get({"company_name": "B"}, {}, "m") is None
+    assert cache.get({"company_name": "A"}, {}, "m") is not None
+
+
+def test_sqlite_lru_eviction(tmp_path):
+    cache = ec.EvaluationCache(ec.SQLiteBackend(str(tmp_path / "c.db"), max_entries=1))
+    cache.put({"company_name": "A"}, {}, "m", {"pj_match_score": 1, "reasoning": "A"})
+    cache.put({"company_name": "B"}, {}, "m", {"pj_match_score": 1, "reasoning": "B"})
+    assert cache.get({"company_name": "A"}, {}, "m") is None
+    assert cache.get({"company_name": "B"}, {}, "m") is not None
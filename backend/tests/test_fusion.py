@@ -0,0 +1,53 @@
+import pytest
+
+from lambda_pkg.fusion import fuse, fuse_with_contributions, rrf_top_is_stable
+
+A = [{"_id": "A", "_score": 9.0}, {"_id": "B", "_score": 5.0}, {"_id": "C", "_score": 1.0}]
+B = [{"_id": "C", "_score": 0.9}, {"_id": "A", "_score": 0.8}]
+
+
+def test_rrf_matches_reference_and_does_not_mutate_inputs():
+    fused = fuse([A, B], size=2)
+    assert [h["_id"] for h in fused] == ["A", "C"]
+    assert fused[0]["_score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert A[0]["_score"] == 9.0 and fused[0] is not A[0]
+
+
+def test_weights_and_score_normalization():
+    assert [h["_id"] for h in fuse([A, B], weights=[0.1, 1.0])][:1] == ["C"]
+
+    fused = fuse([A, B], method="minmax")
+    assert {h["_id"]: h["_score"] for h in fused} == pytest.approx({"A": 1.0, "B": 0.5, "C": 1.0})
+
+    zs = {h["_id"]: h["_score"] for h in fuse([A], method="zscore")}
+    assert sum(zs.values()) == pytest.approx(0.0) and zs["A"] > zs["B"] > zs["C"]
+
+    assert fuse([A, B], method="combsum")[0]["_score"] == pytest.approx(9.8)
+    with pytest.raises(ValueError):
+        fuse([A], method="borda")
+
+
+def test_contributions_explain_each_source_rank():
+    fused, explain = fuse_with_contributions([A, B, []], names=["bm25", "knn", "extra"], size=2)
+    assert set(explain) == {h["_id"] for h in fused}
+    assert explain["C"] == {
+        "bm25": {"rank": 3, "score": pytest.approx(1 / 63)},
+        "knn": {"rank": 1, "score": pytest.approx(1 / 61)},
+    }
+
+
+def test_rrf_stability_bound():
+    ranked = [{"_id": f"d{i}"} for i in range(5)]
+    # 両レッグの上位が一致していれば、続きを取得しても上位は変わらない
+    assert rrf_top_is_stable([ranked, ranked], [False, False], size=5)
+    # 一方のレッグにしか現れない上位は、未取得のドキュメントに逆転されうる
+    other = [{"_id": f"x{i}"} for i in range(5)]
+    assert not rrf_top_is_stable([ranked, other], [False, False], size=5)
+    assert rrf_top_is_stable([ranked, other], [True, True], size=5)
+
+
+def test_rrf_stability_requires_stable_order():
+    # 顔ぶれ（a, b）は確定しているが、b は BM25 の続きから寄与を得て a を追い越しうる
+    bm25, knn = [{"_id": "a"}], [{"_id": "b"}]
+    assert not rrf_top_is_stable([bm25, knn], [False, True], size=2)
+    assert rrf_top_is_stable([bm25, knn], [True, True], size=2)
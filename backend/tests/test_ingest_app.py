@@ -0,0 +1,181 @@
+import importlib
+import io
+import json
+import os
+import random
+import sys
+from urllib.parse import quote_plus
+
+import pytest
+
+from lambda_pkg.ingest_manifest import chunk_id
+
+# ingest/app.py は ..lambda_pkg を相対 import するため、backend パッケージとして読み込む
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+class _NotFound(Exception):
+    def __init__(self):
+        super().__init__("NoSuchKey")
+        self.response = {"Error": {"Code": "NoSuchKey"}}
+
+
+class _Body(io.BytesIO):
+    def iter_chunks(self, size):
+        return iter(lambda: self.read(size), b"")
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.reads = []
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise _NotFound()
+        return {"ETag": f'"{hash(self.objects[Key])}"'}
+
+    def get_object(self, Bucket, Key, IfMatch=None):
+        self.reads.append(Key)
+        if Key not in self.objects:
+            raise _NotFound()
+        return {"Body": _Body(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = Body
+
+
+class FakeBulk:
+    def __init__(self):
+        self.actions = []
+
+    def index(self, actions):
+        actions = list(actions)
+        self.actions.extend(actions)
+        return {"indexed": len(actions), "failed": 0, "retried": 0, "errors": []}
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    monkeypatch.setenv("OPENSEARCH_ENDPOINT", "https://example.com")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-northeast-1")
+    app = importlib.import_module("backend.ingest.app")
+    embedded = []
+
+    def embed_texts(texts):
+        embedded.extend(texts)
+        return [[0.1, 0.2] for _ in texts]
+
+    s3, bulk = FakeS3({}), FakeBulk()
+    monkeypatch.setattr(app, "s3", s3)
+    monkeypatch.setattr(app, "embed_texts", embed_texts)
+    monkeypatch.setattr(app, "BULK_INDEXER", bulk)
+    monkeypatch.setattr(app, "CHUNK_STORE", None)
+    monkeypatch.setattr(app, "INGEST_CHUNKER", "sentence")
+    return app, s3, bulk, embedded
+
+
+def _s3_record(key):
+    return {"s3": {"bucket": {"name": "bkt"}, "object": {"key": quote_plus(key)}}}
+
+
+def _sqs_record(message_id, key):
+    return {"messageId": message_id, "body": json.dumps({"Records": [_s3_record(key)]})}
+
+
+DOC = "# 概要\n本文A。\n# 課題\n本文B。\n".encode("utf-8")
+
+
+def test_handler_ingests_every_record_and_decodes_keys(ingest):
+    app, s3, bulk, _ = ingest
+    s3.objects.update({"notes/会議 メモ.md": DOC, "notes/b.md": DOC})
+    res = app.handler({"Records": [_s3_record("notes/会議 メモ.md"), _s3_record("notes/b.md")]}, None)
+    records = json.loads(res["body"])["records"]
+    assert [r["status"] for r in records] == ["ok", "ok"]
+    assert sorted(r["documents"][0]["key"] for r in records) == ["notes/b.md", "notes/会議 メモ.md"]
+    assert len(bulk.actions) == 4 and all("index" in action for action, _ in bulk.actions)
+    assert {doc["section"] for _, doc in bulk.actions} == {"概要", "課題"}
+
+
+def test_sqs_reports_only_failed_messages(ingest):
+    app, s3, _, _ = ingest
+    s3.objects["notes/a.md"] = DOC
+    res = app.handler({"Records": [_sqs_record("m1", "notes/a.md"), _sqs_record("m2", "notes/missing.md")]}, None)
+    assert res["batchItemFailures"] == [{"itemIdentifier": "m2"}]
+
+    with pytest.raises(RuntimeError):
+        app.handler({"Records": [_s3_record("notes/missing.md")]}, None)
+
+
+def test_manifest_skips_unchanged_chunks_and_deletes_stale_ones(ingest):
+    app, s3, bulk, embedded = ingest
+    s3.objects["notes/a.md"] = DOC
+    first = app.ingest_object("bkt", "notes/a.md")
+    assert (first["added"], len(embedded)) == (2, 2)
+
+    bulk.actions.clear()
+    embedded.clear()
+    second = app.ingest_object("bkt", "notes/a.md")
+    assert (second["unchanged"], second["embedded"]) == (2, 0)
+    assert bulk.actions == [] and embedded == []
+
+    s3.objects["notes/a.md"] = "# 概要\n本文A。\n".encode("utf-8")
+    third = app.ingest_object("bkt", "notes/a.md")
+    assert (third["unchanged"], third["removed"]) == (1, 1)
+    assert [action for action, _ in bulk.actions] == [
+        {"delete": {"_index": app.INDEX, "_id": chunk_id("notes/a.md", "# 課題\n本文B。\n")}}
+    ]
+    # マニフェスト自体の作成イベントは取り込まない
+    manifest_key = next(k for k in s3.objects if k.startswith("_manifests/"))
+    assert app.ingest_object("bkt", manifest_key) == {"key": manifest_key, "skipped": True}
+
+
+def test_inserting_a_line_at_the_top_changes_only_nearby_chunks(ingest, monkeypatch):
+    app, s3, bulk, embedded = ingest
+    monkeypatch.setattr(app, "EMBED_BATCH_CHUNKS", 8)
+    rng = random.Random(0)
+    body = "".join(
+        "".join(rng.choice("あいうえおかきくけこさしすせそ") for _ in range(rng.randint(10, 80))) + "。"
+        for _ in range(300)
+    )
+    s3.objects["notes/long.md"] = body.encode("utf-8")
+    first = app.ingest_object("bkt", "notes/long.md")
+    assert first["chunks"] > 20
+
+    bulk.actions.clear()
+    embedded.clear()
+    s3.objects["notes/long.md"] = ("冒頭に一文を追加しました。" + body).encode("utf-8")
+    second = app.ingest_object("bkt", "notes/long.md")
+    # 位置ではなく本文で _id を決めるため、後ろのチャンクはすべて unchanged のまま
+    assert second["unchanged"] >= first["chunks"] - 2
+    assert second["added"] <= 2 and second["removed"] <= 2
+    assert len(embedded) == second["added"] and len(bulk.actions) == second["added"] + second["removed"]
+
+
+def test_object_is_read_once_and_late_tags_reach_every_chunk(ingest, monkeypatch):
+    app, s3, bulk, embedded = ingest
+    monkeypatch.setattr(app, "EMBED_BATCH_CHUNKS", 1)
+    sections = "".join(f"# 節{i}\n本文{i}。\n" for i in range(4))
+    s3.objects["notes/tags.md"] = (sections + "まとめ #AWS\n").encode("utf-8")
+    first = app.ingest_object("bkt", "notes/tags.md")
+    assert s3.reads.count("notes/tags.md") == 1
+
+    # 先に index したチャンクは #AWS を読む前のメタデータなので、最後に update で揃える
+    indexed = {action["index"]["_id"]: doc for action, doc in bulk.actions if "index" in action}
+    updated = {action["update"]["_id"]: doc["doc"] for action, doc in bulk.actions if "update" in action}
+    assert first["meta_updated"] == len(updated) > 0
+    for cid, doc in indexed.items():
+        assert (updated[cid] if cid in updated else doc)["tags"] == ["AWS"]
+
+    # 変更がなければ update も送らない
+    bulk.actions.clear()
+    assert app.ingest_object("bkt", "notes/tags.md")["meta_updated"] == 0 and bulk.actions == []
+
+    # タグを書き換えた場合、埋め込み直すのはタグを含む最後のチャンクだけで、他は update で揃える
+    bulk.actions.clear()
+    embedded.clear()
+    s3.objects["notes/tags.md"] = (sections + "まとめ #GCP\n").encode("utf-8")
+    third = app.ingest_object("bkt", "notes/tags.md")
+    assert len(embedded) == 1 and third["unchanged"] == third["chunks"] - 1
+    assert third["meta_updated"] == third["chunks"] - 1
+    assert all(doc["doc"]["tags"] == ["GCP"] for action, doc in bulk.actions if "update" in action)
@@ -0,0 +1,58 @@
+import io
+
+from lambda_pkg import ingest_manifest as im
+
+
+def test_chunk_ids_depend_on_source_and_text_not_position():
+    assert im.chunk_id("raw/a.md", "本文") == im.chunk_id("raw/a.md", "本文")
+    assert im.chunk_id("raw/a.md", "本文") != im.chunk_id("raw/b.md", "本文")
+    assert im.chunk_id("raw/a.md", "本文") != im.chunk_id("raw/a.md", "別の本文")
+    # 同じ本文が繰り返し現れる場合は出現順で区別
+    ids = im.ChunkIdAssigner("raw/a.md")
+    assert [ids(t) for t in ["x", "y", "x"]] == [
+        im.chunk_id("raw/a.md", "x"), im.chunk_id("raw/a.md", "y"), im.chunk_id("raw/a.md", "x", 1)
+    ]
+
+
+def test_diff_sends_only_changed_chunks():
+    previous = {"d-00000": "h0", "d-00001": "h1", "d-00002": "h2"}
+    current = {"d-00000": "h0", "d-00001": "h1-edited"}
+    diff = im.diff_chunks(previous, current)
+    assert diff == {"added": [], "changed": ["d-00001"], "removed": ["d-00002"], "unchanged": ["d-00000"]}
+
+    docs = {"d-00000": {"text": "a"}, "d-00001": {"text": "b", "vector": [0.1]}}
+    assert im.bulk_actions("idx", docs, diff) == [
+        ({"index": {"_index": "idx", "_id": "d-00001"}}, {"text": "b", "vector": [0.1]}),
+        ({"delete": {"_index": "idx", "_id": "d-00002"}}, None),
+    ]
+
+
+def test_chunk_hash_covers_metadata_and_salt():
+    doc = {"text": "議事録", "tags": ["AWS"]}
+    assert im.chunk_hash(doc) == im.chunk_hash(dict(doc))
+    assert im.chunk_hash(doc) != im.chunk_hash({**doc, "tags": ["GCP"]})
+    assert im.chunk_hash(doc, "model-a") != im.chunk_hash(doc, "model-b")
+
+
+def test_s3_manifest_round_trip():
+    class NoSuchKey(Exception):
+        response = {"Error": {"Code": "NoSuchKey"}}
+
+    class StubS3:
+        def __init__(self):
+            self.objects = {}
+
+        def get_object(self, Bucket, Key):
+            if Key not in self.objects:
+                raise NoSuchKey()
+            return {"Body": io.BytesIO(self.objects[Key])}
+
+        def put_object(self, Bucket, Key, Body, ContentType):
+            self.objects[Key] = Body
+
+    store = im.S3ManifestStore(StubS3(), "bucket")
+    assert store.load("raw/a.md") == {}
+    store.save("raw/a.md", {"x-00000": "h"})
+    assert store.load("raw/a.md") == {"x-00000": "h"}
+    assert all(store.is_manifest(key) for key in store.client.objects)
+    assert not store.is_manifest("raw/a.md")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from lambda_pkg.ivf_index import IVFPQIndex
+
+
+def _vectors(n=2000, dims=32, seed=0):
+    # 潜在次元の低いベクトル（実際の埋め込みに近い分布）
+    rng = np.random.default_rng(seed)
+    vectors = (rng.normal(size=(n, 8)) @ rng.normal(size=(8, dims))).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _recall(index, vectors, queries, k=10):
+    hits = 0
+    for q in queries:
+        truth = set(np.argsort(-(vectors @ q))[:k].tolist())
+        hits += len(truth.intersection(index.search(q, k=k)[0].tolist()))
+    return hits / (k * len(queries))
+
+
+def test_ivfpq_recall_and_compressed_codes():
+    vectors = _vectors()
+    index = IVFPQIndex.build(vectors, nprobe=8, m=8, ef_search=50)
+    assert len(index) == 2000 and index.nlist == 45
+    assert index.codes.shape == (2000, 8) and index.codes.dtype == np.uint8
+    assert _recall(index, vectors, vectors[:50]) >= 0.9
+    rows, scores = index.search(vectors[5], k=3)
+    assert rows[0] == 5 and list(scores) == sorted(scores, reverse=True)
+    # 全リストを走査して全件を並べ直せば厳密検索と一致
+    index.nprobe, index.ef_search = index.nlist, len(vectors)
+    assert _recall(index, vectors, vectors[:20]) == 1.0
+
+
+def test_incremental_add_and_single_file_round_trip(tmp_path):
+    vectors = _vectors()
+    index = IVFPQIndex.build(vectors[:1500], nprobe=8, m=8, ef_search=50)
+    centroids = index.centroids.copy()
+    index.add(vectors[1500:])
+    assert len(index) == 2000 and np.array_equal(index.centroids, centroids)
+    assert index.search(vectors[1800], k=1)[0].tolist() == [1800]
+
+    path = str(tmp_path / "ivfpq.npz")
+    index.save(path)
+    loaded = IVFPQIndex.load(path)
+    assert (loaded.nlist, loaded.nprobe, loaded.m, loaded.ef_search) == (index.nlist, 8, 8, 50)
+    for q in vectors[:10]:
+        assert loaded.search(q, k=5)[0].tolist() == index.search(q, k=5)[0].tolist()
+
+    index.save(path, include_vectors=False)
+    shared = IVFPQIndex.load(path, vectors=vectors)
+    assert shared.vectors is vectors
+    with pytest.raises(ValueError):
+        IVFPQIndex.load(path, vectors=vectors[:10])
@@ -0,0 +1,64 @@
+import math
+
+import numpy as np
+import pytest
+
+from lambda_pkg import local_index as li
+from lambda_pkg.keyword_index import BM25Index, tokenize
+
+SOURCES = [
+    {"text": "AWS移行の見積もりを確認した。", "vendor_name": "A社", "meeting_date": "2024-01-10"},
+    {"text": "移行計画と移行スケジュール", "vendor_name": "B社", "meeting_date": "2024-03-01"},
+    {"text": "セキュリティ監査の結果", "vendor_name": "A社", "meeting_date": "2024-05-20"},
+    {"text": "ＡＷＳ　コスト削減", "vendor_name": "B社", "meeting_date": "2024-06-01"},
+]
+IDS = ["d0", "d1", "d2", "d3"]
+
+
+def test_tokenize_uses_bigrams_for_japanese_and_words_for_latin():
+    assert tokenize("AWS移行の見積") == ["aws", "移行", "行の", "の見", "見積"]
+    assert tokenize("ＡＷＳ　コスト") == ["aws", "コス", "スト"]
+    assert tokenize("円") == ["円"]
+
+
+def test_postings_are_delta_encoded_and_scores_follow_bm25():
+    index = BM25Index.build(IDS, SOURCES)
+    docs, tf = index.postings("移行")
+    assert docs.tolist() == [0, 1] and tf.tolist() == [1, 2]
+    assert index.gaps.dtype == np.uint32 and index.freqs.dtype == np.uint16
+    assert index.postings("存在しない") is None
+
+    hits = index.search("移行", size=10)
+    assert [h["_id"] for h in hits] == ["d1", "d0"]
+    n, df = 4, 2
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    dl, avg = index.doc_lengths[1], index.doc_lengths.mean()
+    expected = idf * 2 * 2.2 / (2 + 1.2 * (0.25 + 0.75 * dl / avg))
+    assert hits[0]["_score"] == pytest.approx(expected, rel=1e-5)
+
+
+def test_filters_and_snapshot_round_trip(tmp_path):
+    index = BM25Index.build(IDS, SOURCES)
+    assert [h["_id"] for h in index.search("aws", filters={"term": {"vendor_name": "B社"}})] == ["d3"]
+    assert index.search("aws", filters={"range": {"meeting_date": {"lt": "2024-01-01"}}}) == []
+
+    path = str(tmp_path / "keywords.npz")
+    index.save(path)
+    loaded = BM25Index.load(path, SOURCES)
+    assert loaded.search("移行計画") == index.search("移行計画")
+
+
+def test_local_client_runs_fully_offline_hybrid_search(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENSEARCH_ENDPOINT", raising=False)
+    vectors = np.eye(4, dtype=np.float32)
+    docs = [{"_id": i, "_source": dict(s, vector=v.tolist())} for i, s, v in zip(IDS, SOURCES, vectors)]
+    vector_index = li.VectorIndex.build(docs)
+    vector_index.save(str(tmp_path))
+    BM25Index.build(vector_index.ids, vector_index.sources).save(str(tmp_path / li.KEYWORDS_FILE))
+
+    client = li.LocalSearchClient.from_uri(str(tmp_path))
+    assert client.health_check()["keywords"] is True
+    monkeypatch.setattr(client, "embed_query", lambda q: vectors[1].tolist())
+    results, stats = client.hybrid_search_with_stats("移行", size=2)
+    assert results[0]["_id"] == "d1"
+    assert stats["legs"]["bm25"] == stats["legs"]["knn"] == "ok"
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from lambda_pkg import local_index as li
+
+
+def _docs():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, [
+        {
+            "_id": f"d{i}",
+            "_source": {
+                "text": f"chunk {i}",
+                "vendor_name": "A社" if i % 2 else "B社",
+                "tags": ["AWS"] if i % 5 == 0 else [],
+                "meeting_date": f"2024-0{1 + i % 9}-01",
+                "vector": vectors[i].tolist(),
+            },
+        }
+        for i in range(50)
+    ]
+
+
+def test_exact_top_k_matches_brute_force_and_snapshot_round_trip(tmp_path):
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    query = vectors[7]
+    hits = index.search(query.tolist(), size=5)
+    expected = np.argsort(-(vectors @ query))[:5]
+    assert [h["_id"] for h in hits] == [f"d{i}" for i in expected]
+    assert hits[0]["_id"] == "d7" and hits[0]["_score"] == pytest.approx(1.0, abs=1e-5)
+    assert "vector" not in hits[0]["_source"]
+
+    index.save(str(tmp_path))
+    loaded = li.VectorIndex.load(str(tmp_path))
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.search(query.tolist(), size=5) == hits
+
+
+def test_filters_follow_opensearch_clauses():
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    hits = index.search(vectors[0].tolist(), size=50, filters={"term": {"vendor_name": "A社"}})
+    assert len(hits) == 25 and all(h["_source"]["vendor_name"] == "A社" for h in hits)
+
+    clause = {"bool": {
+        "filter": [{"terms": {"tags": ["AWS"]}}, {"range": {"meeting_date": {"gte": "2024-03-01"}}}],
+        "must_not": [{"term": {"vendor_name.keyword": "B社"}}],
+    }}
+    ids = {h["_id"] for h in index.search(vectors[0].tolist(), size=50, filters=clause)}
+    assert ids == {f"d{i}" for i in range(50) if i % 5 == 0 and i % 2 and 1 + i % 9 >= 3}
+
+
+def test_local_client_runs_hybrid_search_without_opensearch(monkeypatch):
+    monkeypatch.delenv("OPENSEARCH_ENDPOINT", raising=False)
+    vectors, docs = _docs()
+    client = li.LocalSearchClient(li.VectorIndex.build(docs))
+    monkeypatch.setattr(client, "embed_query", lambda q: vectors[3].tolist())
+    results, stats = client.hybrid_search_with_stats("質問", size=3)
+    assert results[0]["_id"] == "d3"
+    assert stats["legs"]["knn"] == "ok"
+
+
+
+def test_offline_client_reads_query_vectors_from_the_sqlite_tier(tmp_path, monkeypatch):
+    from lambda_pkg.embedding_cache import EmbeddingCache, SQLiteVectorStore, vector_key
+    from lambda_pkg.keyword_index import BM25Index
+
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    # 別プロセス（オンライン実行時）が SQLite に残したクエリ埋め込み
+    path = str(tmp_path / "queries.sqlite")
+    EmbeddingCache(store=SQLiteVectorStore(path)).put(vector_key("質問", li.EMBED_MODEL, li.EMBED_DIMENSIONS), vectors[3])
+
+    client = li.LocalSearchClient(
+        index, BM25Index.build(index.ids, index.sources), offline=True, query_cache=EmbeddingCache(store=SQLiteVectorStore(path))
+    )
+    monkeypatch.setattr(li.OpenSearchClient, "embed_query", lambda *a: (_ for _ in ()).throw(AssertionError("bedrock called")))
+    results, stats = client.hybrid_search_with_stats("  質問 ", size=3)
+    assert results[0]["_id"] == "d3" and stats["legs"]["knn"] == "ok"
+    assert client.query_cache.persistent_hits == 1
+
+    # キャッシュにないクエリは kNN を省き、BM25 の結果だけを返す
+    results, stats = client.hybrid_search_with_stats("chunk 7", size=3)
+    assert stats["legs"]["embed"] == "error" and stats["legs"]["knn"] == "skipped"
+    assert results[0]["_id"] == "d7"
+    assert client.health_check()["offline"] is True
+
+
+def test_ann_backed_index_persists_graph_and_falls_back_for_narrow_filters(tmp_path, monkeypatch):
+    monkeypatch.setattr(li, "ANN_MIN_DOCS", 0)
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    index.build_ann(ef_construction=32, ef_search=32)
+    index.save(str(tmp_path))
+    loaded = li.VectorIndex.load(str(tmp_path))
+    assert loaded.ann is not None and loaded.ann.vectors is loaded.vectors
+
+    assert loaded.search(vectors[7].tolist(), size=1)[0]["_id"] == "d7"
+    hits = loaded.search(vectors[0].tolist(), size=3, filters={"term": {"vendor_name": "A社"}})
+    assert len(hits) == 3 and all(h["_source"]["vendor_name"] == "A社" for h in hits)
+    # 一致が 1 件だけのフィルタは厳密検索に切り替わる
+    assert [h["_id"] for h in loaded.search(vectors[0].tolist(), size=5, filters={"term": {"text": "chunk 9"}})] == ["d9"]
+
+    loaded.add([{"_id": "new", "_source": {"text": "new", "vector": vectors[7].tolist()}}])
+    assert len(loaded.ann) == len(loaded) == 51
+    assert {h["_id"] for h in loaded.search(vectors[7].tolist(), size=2)} == {"d7", "new"}
+
+
+
+def test_ivfpq_index_persists_and_is_loaded_instead_of_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(li, "ANN_MIN_DOCS", 0)
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    index.build_ann("ivfpq", nlist=4, m=4)
+    index.save(str(tmp_path))
+    assert (tmp_path / li.IVF_FILE).exists() and not (tmp_path / li.ANN_FILE).exists()
+    loaded = li.VectorIndex.load(str(tmp_path))
+    assert isinstance(loaded.ann, li.IVFPQIndex) and loaded.ann.vectors is loaded.vectors
+
+    assert loaded.search(vectors[7].tolist(), size=1)[0]["_id"] == "d7"
+    hits = loaded.search(vectors[0].tolist(), size=3, filters={"term": {"vendor_name": "A社"}})
+    assert len(hits) == 3 and all(h["_source"]["vendor_name"] == "A社" for h in hits)
+    loaded.add([{"_id": "new", "_source": {"text": "new", "vector": vectors[7].tolist()}}])
+    assert len(loaded.ann) == len(loaded) == 51
+    with pytest.raises(ValueError):
+        index.build_ann("lsh")
+
+
+def test_small_index_ignores_graph(monkeypatch):
+    vectors, docs = _docs()
+    index = li.VectorIndex.build(docs)
+    index.build_ann(ef_construction=32, ef_search=32)
+    monkeypatch.setattr(index.ann, "search", lambda *a, **kw: (_ for _ in ()).throw(AssertionError("graph used")))
+    assert len(index) < li.ANN_MIN_DOCS
+    assert index.search(vectors[7].tolist(), size=1)[0]["_id"] == "d7"
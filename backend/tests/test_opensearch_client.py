@@ -1,4 +1,5 @@
-﻿from lambda_pkg.opensearch_client import _rrf
+﻿import pytest
+from lambda_pkg.opensearch_client import _rrf
 
 
 def test_rrf_simple():
@@ -6,3 +7,113 @@ def test_rrf_simple():
     b = [{"_id":"B"},{"_id":"C"}]
     fused = _rrf(a,b)
     assert [h["_id"] for h in fused] == ["B","A","C"]
+
+
+def test_clients_share_session_and_signer(monkeypatch):
+    from lambda_pkg import opensearch_client as oc
+    monkeypatch.setenv("OPENSEARCH_ENDPOINT", "https://example.com")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "y")
+    a, b = oc.OpenSearchClient(), oc.OpenSearchClient()
+    assert a.session is b.session
+    assert a.auth is b.auth
+
+
+def _client(monkeypatch):
+    from lambda_pkg import opensearch_client as oc
+    monkeypatch.setenv("OPENSEARCH_ENDPOINT", "https://example.com")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "x")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "y")
+    return oc, oc.OpenSearchClient()
+
+
+def test_hybrid_runs_bm25_alongside_embedding(monkeypatch):
+    import time
+    oc, client = _client(monkeypatch)
+    monkeypatch.setattr(client, "embed_query", lambda q: time.sleep(0.2) or [0.1])
+    monkeypatch.setattr(client, "bm25_search", lambda q, size, filters: time.sleep(0.2) or [{"_id": "A"}])
+    monkeypatch.setattr(client, "knn_search", lambda v, size, filters: [{"_id": "B"}])
+    start = time.perf_counter()
+    results, stats = client.hybrid_search_with_stats("q", size=2)
+    assert time.perf_counter() - start < 0.35
+    assert {h["_id"] for h in results} == {"A", "B"}
+    assert stats["legs"] == {"embed": "ok", "bm25": "ok", "knn": "ok"}
+    assert {"embed_ms", "bm25_ms", "knn_ms", "total_ms"} <= set(stats["timings"])
+
+
+def test_hybrid_degrades_to_bm25_only(monkeypatch):
+    oc, client = _client(monkeypatch)
+    monkeypatch.setattr(client, "embed_query", lambda q: 1 / 0)
+    monkeypatch.setattr(client, "bm25_search", lambda q, size, filters: [{"_id": "A"}])
+    results, stats = client.hybrid_search_with_stats("q")
+    assert [h["_id"] for h in results] == ["A"]
+    assert stats["legs"] == {"embed": "error", "knn": "skipped", "bm25": "ok"}
+
+
+def test_hybrid_leg_timeout(monkeypatch):
+    import time
+    oc, client = _client(monkeypatch)
+    monkeypatch.setattr(oc, "HYBRID_LEG_TIMEOUT", 0.1)
+    monkeypatch.setattr(client, "embed_query", lambda q: [0.1])
+    monkeypatch.setattr(client, "bm25_search", lambda q, size, filters: time.sleep(0.3) or [{"_id": "A"}])
+    monkeypatch.setattr(client, "knn_search", lambda v, size, filters: [{"_id": "B"}])
+    results, stats = client.hybrid_search_with_stats("q")
+    assert [h["_id"] for h in results] == ["B"]
+    assert stats["legs"]["bm25"] == "timeout"
+
+
+def _ranked(prefix, total):
+    return lambda *args, size, filters: [{"_id": f"{prefix}{i}"} for i in range(min(size, total))]
+
+
+def test_adaptive_depth_stops_when_top_is_stable(monkeypatch):
+    oc, client = _client(monkeypatch)
+    monkeypatch.setattr(client, "embed_query", lambda q: [0.1])
+    monkeypatch.setattr(client, "bm25_search", _ranked("d", 100))
+    monkeypatch.setattr(client, "knn_search", _ranked("d", 100))
+    results, stats = client.hybrid_search_with_stats("q", size=5, adaptive=True)
+    assert [h["_id"] for h in results] == ["d0", "d1", "d2", "d3", "d4"]
+    assert stats["depth"] == {"bm25": 5, "knn": 5} and stats["rounds"] == 1
+
+
+def test_adaptive_depth_widens_until_max_or_exhausted(monkeypatch):
+    oc, client = _client(monkeypatch)
+    monkeypatch.setattr(oc, "HYBRID_MAX_DEPTH", 40)
+    monkeypatch.setattr(client, "embed_query", lambda q: [0.1])
+    monkeypatch.setattr(client, "bm25_search", _ranked("a", 100))
+    monkeypatch.setattr(client, "knn_search", _ranked("b", 7))
+    results, stats = client.hybrid_search_with_stats("q", size=5, adaptive=True)
+    assert len(results) == 5
+    # kNN は 7 件で尽きるため 10 件で止まり、BM25 だけが上限まで広がる
+    assert stats["depth"] == {"bm25": 40, "knn": 10} and stats["rounds"] == 4
+
+
+def test_search_retries_stop_at_the_leg_deadline(monkeypatch):
+    import requests
+    oc, client = _client(monkeypatch)
+    calls = []
+
+    def post(url, **kwargs):
+        calls.append(kwargs["timeout"])
+        raise requests.Timeout()
+
+    monkeypatch.setattr(client.session, "post", post)
+    stop = oc.OpenSearchClient.bm25_search.retry.stop
+    monkeypatch.setattr(oc.OpenSearchClient.bm25_search.retry, "wait", lambda state: 0)
+    with pytest.raises(Exception):
+        client.bm25_search("q")
+    assert calls == [oc.OPENSEARCH_REQUEST_TIMEOUT] * 3
+    # 1回目の試行がレッグのタイムアウトまでかかった場合は、それ以上リトライしない
+    state = type("State", (), {"attempt_number": 1, "seconds_since_start": oc.HYBRID_LEG_TIMEOUT})()
+    assert stop(state)
+
+
+def test_adaptive_widen_failure_is_reported(monkeypatch):
+    oc, client = _client(monkeypatch)
+    knn = _ranked("b", 100)
+    monkeypatch.setattr(client, "embed_query", lambda q: [0.1])
+    monkeypatch.setattr(client, "bm25_search", _ranked("a", 100))
+    monkeypatch.setattr(client, "knn_search", lambda v, size, filters: knn(size=size, filters=filters) if size <= 5 else 1 / 0)
+    results, stats = client.hybrid_search_with_stats("q", size=5, adaptive=True)
+    assert len(results) == 5
+    assert stats["legs"]["knn"] == "widen_error" and stats["depth"]["knn"] == 5
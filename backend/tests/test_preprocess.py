@@ -0,0 +1,97 @@
+import random
+
+from lambda_pkg import preprocess as pp
+
+
+def _reference_split(text, chunk=900, overlap=150):
+    out, i, n = [], 0, len(text)
+    while i < n:
+        j = min(n, i + chunk)
+        out.append(text[i:j])
+        i = j - overlap if j < n else j
+    return out
+
+
+def _pieces(text, rng):
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 400)
+        yield text[i:i + step]
+        i += step
+
+
+def test_streaming_chunks_match_split_text_jp():
+    rng = random.Random(0)
+    for n in (0, 1, 900, 901, 1650, 1651, 5000):
+        text = "".join(rng.choice("あいうえお。\n") for _ in range(n))
+        expected = _reference_split(text)
+        assert pp.split_text_jp(text) == expected
+        assert list(pp.iter_chunks_jp(_pieces(text, rng))) == expected
+
+
+def test_single_large_piece_matches_reference():
+    # 1片に多数のチャンクが含まれる場合（開始位置を進めるだけで切り出す経路）
+    rng = random.Random(1)
+    text = "".join(rng.choice("かきくけこ、\n") for _ in range(200_000))
+    assert list(pp.iter_chunks_jp([text])) == _reference_split(text)
+    assert list(pp.iter_chunks_jp([text], chunk=50, overlap=10)) == _reference_split(text, 50, 10)
+
+
+def test_chunks_are_yielded_before_input_ends():
+    def pieces():
+        yield "あ" * 1000
+        raise AssertionError("read past the first chunk")
+
+    assert len(next(pp.iter_chunks_jp(pieces()))) == 900
+
+
+def test_meta_from_split_lines():
+    md = "---\ndate: 2024-05-01\n---\n#AWS 定例\n本文 #移行\n"
+    pieces = [md[:7], md[7:20], md[20:]]
+    assert list(pp.iter_lines(pieces)) == md.splitlines(True)
+    meta = pp.extract_meta_lines(pp.iter_lines(pieces))
+    assert meta["meeting_date"] == "2024-05-01"
+    assert meta["tags"] == ["AWS", "移行"]
+    assert pp.extract_meta(md) == pp.extract_meta_lines(pp.iter_lines(pieces))
+
+
+def test_front_matter_and_headings_fill_mapped_fields():
+    md = (
+        "---\n"
+        "title: 定例MTG\n"
+        "vendor: 株式会社サンプル\n"
+        "participants:\n"
+        "  - 山田\n"
+        "  - 佐藤\n"
+        "type: meeting\n"
+        "date: 2024/5/1\n"
+        "tags: [AWS, 移行]\n"
+        "---\n"
+        "# 概要\n"
+        "本文 #移行 #RAG\n"
+    )
+    assert pp.extract_meta(md) == {
+        "title": "定例MTG",
+        "vendor_name": "株式会社サンプル",
+        "participants": ["山田", "佐藤"],
+        "doc_type": "meeting",
+        "meeting_date": "2024-05-01",
+        "tags": ["AWS", "移行", "RAG"],
+    }
+    assert list(pp.iter_body_lines(md.splitlines(True))) == ["# 概要\n", "本文 #移行 #RAG\n"]
+
+
+def test_first_heading_is_title_without_front_matter():
+    meta = pp.extract_meta("\n# キックオフ\n## 議題\n参加者の紹介\n")
+    assert meta["title"] == "キックオフ"
+    assert meta["vendor_name"] is None and meta["participants"] == []
+
+
+def test_leading_horizontal_rule_without_closing_fence_is_body():
+    text = "---\n本文1行目 #AWS\n本文2行目\n"
+    assert list(pp.iter_body_lines(text.splitlines(True))) == ["---\n", "本文1行目 #AWS\n", "本文2行目\n"]
+    assert pp.extract_meta(text)["tags"] == ["AWS"]
+    # key: value 形式でも閉じの --- がなければ本文
+    assert list(pp.iter_body_lines(["---\n", "議題: 予算\n"])) == ["---\n", "議題: 予算\n"]
+    lines = ["---\n"] + ["k: v\n"] * (pp.FRONT_MATTER_MAX_LINES + 1) + ["---\n", "本文\n"]
+    assert list(pp.iter_body_lines(lines))[-1] == "本文\n" and len(list(pp.iter_body_lines(lines))) == len(lines)
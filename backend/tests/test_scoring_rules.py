@@ -0,0 +1,62 @@
+import json
+import pytest
+from lambda_pkg import scoring_rules as sr
+from vendor_table import VendorTable
+
+
+TABLE = VendorTable.from_records([
+    {"company_name": "A", "employee_count": 10, "tech_stack": "AWS,Python", "last_contact_date": "2024/11/1"},
+    {"company_name": "B", "employee_count": 800, "tech_stack": "Python", "last_contact_date": "2023/8/10"},
+])
+
+
+def test_rules_from_file_with_breakdown(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"max_score": 50, "rules": [
+        {"name": "aws", "field": "tech_stack", "operator": "contains", "threshold": "AWS", "points": 40},
+        {"name": "recent", "field": "last_contact_date", "operator": ">=", "threshold": "2024-01-01", "points": 20},
+        {"name": "large", "field": "employee_count", "operator": ">", "threshold": 100, "points": 10},
+    ]}))
+    scores, breakdown = sr.evaluate_rules(TABLE, sr.load_ruleset(str(path)))
+    assert scores.tolist() == [50, 10]
+    assert sr.breakdown_for(breakdown, 0) == {"aws": 40, "recent": 20, "large": 0}
+
+
+def test_invalid_rules_fall_back_to_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"field": "x", "operator": "~", "threshold": 1, "points": 1}]}))
+    ruleset = sr.load_ruleset(str(path))
+    assert [r["name"] for r in ruleset["rules"]] == [r["name"] for r in sr.DEFAULT_RULES["rules"]]
+
+
+@pytest.mark.parametrize("rule", [
+    {"field": "nope", "operator": "==", "threshold": 1, "points": 1},
+    {"field": "foundation_year", "operator": ">=", "threshold": "2010", "points": 1},
+    {"field": "employee_count", "operator": "between", "threshold": 5, "points": 1},
+    {"field": "last_contact_date", "operator": ">=", "threshold": "yesterday", "points": 1},
+])
+def test_invalid_field_or_threshold_is_rejected_at_load(rule):
+    with pytest.raises(ValueError):
+        sr.validate_ruleset({"rules": [rule]})
+
+
+def test_bad_upload_keeps_previous_rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(sr, "STRATEGIC_RULES_TTL", 0)
+    path = tmp_path / "rules.json"
+    good = {"rules": [{"name": "large", "field": "employee_count", "operator": ">", "threshold": 100, "points": 10}]}
+    path.write_text(json.dumps(good))
+    assert [r["name"] for r in sr.load_ruleset(str(path))["rules"]] == ["large"]
+
+    path.write_text(json.dumps({"rules": [{"field": "foundation_year", "operator": ">=", "threshold": "2010", "points": 5}]}))
+    ruleset = sr.load_ruleset(str(path))
+    assert [r["name"] for r in ruleset["rules"]] == ["large"]
+    assert sr.evaluate_rules(TABLE, ruleset)[0].tolist() == [0, 10]
+
+
+def test_missing_values_match_no_rule():
+    table = VendorTable.from_records([{"company_name": "A", "foundation_year": ""}, {"company_name": "B", "foundation_year": 1990}])
+    ruleset = sr.validate_ruleset({"rules": [
+        {"name": "old", "field": "foundation_year", "operator": "<", "threshold": 2000, "points": 10},
+    ]})
+    scores, _ = sr.evaluate_rules(table, ruleset)
+    assert scores.tolist() == [0, 10]
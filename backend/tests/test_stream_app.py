@@ -0,0 +1,58 @@
+import http.client
+import io
+import json
+import threading
+from unittest.mock import patch
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import stream_app
+import vendor_recommender
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _events(progress):
+    for name in ("A", "B"):
+        progress.append(name)
+        yield {"event": "vendor", "data": {"company_name": name}}
+    yield {"event": "summary", "data": {}}
+
+
+def test_events_are_written_as_they_are_produced():
+    progress = []
+    environ = {"REQUEST_METHOD": "POST", "CONTENT_LENGTH": "2", "wsgi.input": io.BytesIO(b"{}")}
+    with patch.object(vendor_recommender, "iter_recommendation_events", lambda req: _events(progress)):
+        body = stream_app.app(environ, lambda status, headers: None)
+        first = next(iter(body))
+        # 1件目を書き出した時点では2件目の評価に進んでいない
+        assert first.decode("utf-8").startswith("event: vendor\n") and progress == ["A"]
+
+
+def test_http_round_trip_streams_sse():
+    server = make_server("127.0.0.1", 0, stream_app.app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+    try:
+        with patch.object(vendor_recommender, "iter_recommendation_events", lambda req: _events([])):
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+            conn.request("POST", "/", body=json.dumps({}), headers={"Content-Type": "application/json"})
+            res = conn.getresponse()
+            assert res.status == 200
+            assert res.getheader("Content-Type").startswith("text/event-stream")
+            text = res.read().decode("utf-8")
+    finally:
+        thread.join(5)
+        server.server_close()
+    assert text.count("event: vendor\n") == 2 and text.endswith("event: summary\ndata: {}\n\n")
+
+
+def test_health_check_and_bad_body():
+    statuses = []
+    ok = stream_app.app({"REQUEST_METHOD": "GET"}, lambda status, headers: statuses.append(status))
+    assert statuses == ["200 OK"] and json.loads(b"".join(ok)) == {"status": "ok"}
+    environ = {"REQUEST_METHOD": "POST", "CONTENT_LENGTH": "4", "wsgi.input": io.BytesIO(b"{bad")}
+    body = b"".join(stream_app.app(environ, lambda status, headers: None)).decode("utf-8")
+    assert body.startswith("event: error\n")
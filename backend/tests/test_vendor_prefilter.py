@@ -0,0 +1,29 @@
+from lambda_pkg import vendor_prefilter as vp
+from vendor_table import VendorTable
+
+
+VENDORS = VendorTable.from_records([
+    {"company_name": "Big", "employee_count": 800, "tech_stack": "AWS,Python,Web", "domain_expertise": "製造/物流/汎用", "business_model": "受託/コンサル", "aws_capability": 5},
+    {"company_name": "Small", "employee_count": 10, "tech_stack": "Python,AI,React", "domain_expertise": "製造/物流", "business_model": "受託/内製支援", "internal_dev_support": 4},
+    {"company_name": "Edu", "employee_count": 8, "tech_stack": "LLM,教育プログラム", "domain_expertise": "金融", "business_model": "コンサル"},
+])
+
+
+def test_select_candidates_keeps_top_k_in_input_order():
+    req = {"techStack": ["AI/機械学習", "モダンWeb技術（React/Vue等）"], "industry": "製造業・工場",
+           "companySize": "小規模でも専門性が高ければ良い（5-20名程度）"}
+    selected, scores = vp.select_candidates(VENDORS, req, top_k=2)
+    assert selected == [0, 1]
+    assert scores[1] > scores[0] > scores[2]
+
+
+def test_select_candidates_disabled():
+    selected, _ = vp.select_candidates(VENDORS, {}, top_k=0)
+    assert selected == [0, 1, 2]
+
+
+def test_weights_override(monkeypatch):
+    monkeypatch.setenv("PREFILTER_WEIGHTS", '{"industry": 0, "unknown": 3}')
+    weights = vp.load_weights()
+    assert weights["industry"] == 0
+    assert "unknown" not in weights
@@ -0,0 +1,215 @@
+import io
+import json
+import time
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from lambda_pkg import vendor_recommender as vr
+from evaluation_cache import MemoryBackend
+from vendor_table import VendorTable
+
+
+def _slow_eval(vendor, user_requirements, model_id=None):
+    time.sleep(vendor["delay"])
+    return {"pj_match_score": vendor["score"], "reasoning": vendor["company_name"]}
+
+
+@patch.object(vr, "evaluate_vendor_with_bedrock", side_effect=_slow_eval)
+def test_concurrent_keeps_input_order(mock_eval):
+    vendors = [
+        {"company_name": "A", "delay": 0.05, "score": 10},
+        {"company_name": "B", "delay": 0.0, "score": 20},
+        {"company_name": "C", "delay": 0.02, "score": 30},
+    ]
+    results, timed_out = vr.evaluate_vendors_concurrently(vendors, {}, max_concurrency=3)
+    assert timed_out == []
+    assert [r["reasoning"] for r in results] == ["A", "B", "C"]
+
+
+@patch.object(vr, "evaluate_vendor_with_bedrock", side_effect=_slow_eval)
+def test_concurrent_partial_on_call_timeout(mock_eval):
+    vendors = [
+        {"company_name": "A", "delay": 0.0, "score": 10},
+        {"company_name": "B", "delay": 0.5, "score": 20},
+    ]
+    results, timed_out = vr.evaluate_vendors_concurrently(vendors, {}, max_concurrency=2, call_timeout=0.1)
+    assert timed_out == [1]
+    assert results[0]["pj_match_score"] == 10
+    assert results[1] is None
+
+
+def test_plan_batches_respects_token_budget():
+    vendors = [{"company_name": f"V{i}", "notes": "あ" * 200} for i in range(6)]
+    batches = vr.plan_batches(vendors, {}, token_budget=1500)
+    assert [i for b in batches for i in b] == list(range(6))
+    assert 1 < len(batches) < 6
+
+
+@patch.object(vr, "evaluate_vendor_with_bedrock", return_value={"pj_match_score": 40, "reasoning": "single"})
+@patch.object(vr, "_invoke_llm", return_value='[{"company_name": "A", "pj_match_score": 90, "reasoning": "batch"}, {"company_name": "B", "pj_match_score": "x"}]')
+def test_batch_retries_missing_vendors_individually(mock_llm, mock_single):
+    vendors = [{"company_name": "A"}, {"company_name": "B"}, {"company_name": "C"}]
+    results, timed_out = vr.evaluate_vendors_concurrently(vendors, {}, batch_token_budget=100000)
+    assert timed_out == []
+    assert mock_llm.call_count == 1
+    assert [r["reasoning"] for r in results] == ["batch", "single", "single"]
+    assert mock_single.call_count == 2
+
+
+@patch.object(vr, "select_candidates", return_value=([1], [0.2, 0.9]))
+@patch.object(vr, "evaluate_vendor_with_bedrock", return_value={"pj_match_score": 80, "reasoning": "ok"})
+@patch.object(vr, "load_vendors_from_s3", return_value=VendorTable.from_records([{"company_name": "A"}, {"company_name": "B"}]))
+def test_handler_reports_pruned_vendors(mock_load, mock_eval, mock_select):
+    res = vr.handler({"httpMethod": "POST", "body": json.dumps({"techStack": ["AWS（必須）"]})}, None)
+    body = json.loads(res["body"])
+    assert res["statusCode"] == 200
+    assert [r["company_name"] for r in body["recommendations"]] == ["B"]
+    assert body["stats"]["vendors_pruned"] == 1
+    assert set(body["stats"]["timings"]) == {"load_ms", "prefilter_ms", "llm_strong_ms", "llm_ms"}
+
+
+@patch.object(vr, "evaluate_vendor_with_bedrock", return_value={"pj_match_score": 70, "reasoning": "fresh"})
+def test_concurrent_uses_evaluation_cache(mock_eval):
+    cache = vr.EvaluationCache(MemoryBackend())
+    vendors = [{"company_name": "A"}, {"company_name": "B"}]
+    cache.put(vendors[0], {}, vr.LLM_MODEL, {"pj_match_score": 10, "reasoning": "cached"})
+    results, _ = vr.evaluate_vendors_concurrently(vendors, {}, cache=cache)
+    assert [r["reasoning"] for r in results] == ["cached", "fresh"]
+    assert mock_eval.call_count == 1
+    assert cache.get(vendors[1], {}, vr.LLM_MODEL)["reasoning"] == "fresh"
+
+
+def _s3_object(text, etag):
+    return {"Body": io.BytesIO(text.encode("utf-8")), "ETag": etag}
+
+
+def test_vendor_table_cache_revalidates_with_etag():
+    not_modified = ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+    responses = [
+        _s3_object("company_name,employee_count\nA,10\n", '"v1"'),
+        not_modified,
+        _s3_object("company_name,employee_count\nB,20\n", '"v2"'),
+    ]
+    with patch.dict(vr._VENDOR_CACHE, {"etag": None, "table": None, "checked_at": 0.0}), \
+            patch.dict(vr.VENDOR_CACHE_STATS, {"hits": 0, "misses": 0, "refreshes": 0}), \
+            patch.object(vr, "VENDOR_CACHE_TTL", 0), \
+            patch.object(vr.S3_CLIENT, "get_object", side_effect=responses) as mock_get:
+        assert vr.load_vendors_from_s3()[0]["employee_count"] == 10
+        assert vr.load_vendors_from_s3()[0]["company_name"] == "A"
+        assert mock_get.call_args.kwargs["IfNoneMatch"] == '"v1"'
+        assert vr.load_vendors_from_s3()[0]["company_name"] == "B"
+        assert vr.VENDOR_CACHE_STATS == {"hits": 1, "misses": 1, "refreshes": 1}
+
+
+def test_vendor_table_cache_skips_s3_within_ttl():
+    table = VendorTable.from_records([{"company_name": "A"}])
+    with patch.dict(vr._VENDOR_CACHE, {"etag": '"v1"', "table": table, "checked_at": time.monotonic()}), \
+            patch.object(vr.S3_CLIENT, "get_object") as mock_get:
+        assert vr.load_vendors_from_s3() is table
+        mock_get.assert_not_called()
+
+
+def test_strategic_scores_match_rules():
+    table = VendorTable.from_records([
+        {"employee_count": 10, "internal_dev_support": 4, "aws_capability": 3, "ip_flexibility": 3},
+        {"employee_count": 800, "aws_capability": 5},
+    ])
+    scores, breakdown = vr.calculate_strategic_scores(table)
+    assert scores.tolist() == [100, 25]
+    assert breakdown["aws_capability_3"].tolist() == [25, 25]
+    assert vr.calculate_strategic_score({"employee_count": 8}) == 30
+
+
+def _eval_by_name(vendor, user_requirements, model_id=None):
+    scores = {"A": 60, "B": 90, "C": 60}
+    time.sleep(0.05 if vendor["company_name"] == "B" else 0)
+    return {"pj_match_score": scores[vendor["company_name"]], "reasoning": vendor["company_name"]}
+
+
+@patch.object(vr, "evaluate_vendor_with_bedrock", side_effect=_eval_by_name)
+@patch.object(vr, "load_vendors_from_s3", return_value=VendorTable.from_records([{"company_name": n} for n in "ABC"]))
+def test_stream_events_emit_per_vendor_then_summary(mock_load, mock_eval):
+    events = list(vr.iter_recommendation_events({}))
+    assert [e["event"] for e in events] == ["vendor", "vendor", "vendor", "summary"]
+    assert events[0]["data"]["company_name"] in ("A", "C")
+    assert [r["company_name"] for r in events[-2]["data"]["top3"]] == ["B", "A", "C"]
+    assert [r["company_name"] for r in events[-1]["data"]["recommendations"]] == ["B", "A", "C"]
+
+
+def _eval_by_tier(vendor, user_requirements, model_id=None):
+    fast = {"A": 90, "B": 50, "C": 70, "D": 10}
+    strong = {"A": 60, "C": 95, "B": 0}
+    scores = fast if model_id == vr.EVAL_FAST_MODEL else strong
+    return {"pj_match_score": scores[vendor["company_name"]], "reasoning": model_id}
+
+
+@patch.object(vr, "EVAL_CASCADE_MARGIN", 5)
+@patch.object(vr, "EVAL_CASCADE_TOP_N", 2)
+@patch.object(vr, "evaluate_vendor_with_bedrock", side_effect=_eval_by_tier)
+@patch.object(vr, "load_vendors_from_s3", return_value=VendorTable.from_records([{"company_name": n} for n in "ABCD"]))
+def test_cascade_rescores_top_n_with_strong_model(mock_load, mock_eval, *_):
+    events = list(vr.iter_recommendation_events({}))
+    summary = events[-1]["data"]
+    strong_calls = [c for c in mock_eval.call_args_list if c.args[2] == vr.EVAL_STRONG_MODEL]
+    assert sorted(c.args[0]["company_name"] for c in strong_calls) == ["A", "C"]
+    assert [(r["company_name"], r["tier"]) for r in summary["recommendations"]] == [("C", "strong"), ("A", "strong"), ("B", "fast")]
+    assert summary["stats"]["tiers"] == {"fast": 2, "strong": 2}
+    assert summary["stats"]["cascade_rescored"] == 2
+
+
+def _llm_fails_on_strong(prompt, model_id=None):
+    if model_id == vr.EVAL_STRONG_MODEL:
+        raise RuntimeError("ThrottlingException")
+    score = {"A": 90, "B": 50, "C": 70}[prompt.split("会社名: ")[1][0]]
+    return json.dumps({"pj_match_score": score, "reasoning": "fast"})
+
+
+@patch.object(vr, "EVAL_CASCADE_MARGIN", 0)
+@patch.object(vr, "EVAL_CASCADE_TOP_N", 2)
+@patch.object(vr, "EVALUATION_CACHE", None)
+@patch.object(vr, "_invoke_llm", side_effect=_llm_fails_on_strong)
+@patch.object(vr, "load_vendors_from_s3", return_value=VendorTable.from_records([{"company_name": n} for n in "ABC"]))
+def test_cascade_keeps_fast_result_when_strong_tier_errors(mock_load, mock_llm, *_):
+    summary = list(vr.iter_recommendation_events({}))[-1]["data"]
+    assert [(r["company_name"], r["tier"], r["reasoning"]) for r in summary["recommendations"]] == [
+        ("A", "fast", "fast"), ("C", "fast", "fast"), ("B", "fast", "fast")
+    ]
+    assert summary["stats"]["tiers"] == {"fast": 3, "strong": 0}
+
+
+def test_stream_handler_reports_malformed_and_missing_body_as_error_events():
+    events = list(vr.stream_handler({"body": "{not json"}, None))
+    assert len(events) == 1 and events[0].startswith("event: error\n")
+    assert "Invalid JSON body" in events[0]
+    assert list(vr.stream_handler({}, None)) == [vr.format_sse({"event": "error", "data": {"error": "Missing request body"}})]
+
+
+def test_vendor_info_omits_missing_fields():
+    vendor = VendorTable.from_records([{"company_name": "A", "foundation_year": "", "aws_capability": 0}])[0]
+    info = vr._format_vendor_info(vendor)
+    assert "会社名: A" in info and "AWS能力: 0/5" in info
+    assert "設立年" not in info and "従業員数" not in info and "備考" not in info
+
+
+def _llm_with_output_cap(prompt, max_tokens=1000, model_id=None):
+    # Bedrock と同様、モデルの出力上限を超える max_tokens は拒否する
+    if max_tokens > vr.batch_output_limit(model_id):
+        raise RuntimeError("ValidationException: max_tokens exceeds the model limit")
+    names = [line.split("会社名: ")[1] for line in prompt.splitlines() if line.startswith("会社名: ")]
+    evaluations = [{"company_name": n, "pj_match_score": int(n[1:]), "reasoning": "ok"} for n in names]
+    return json.dumps(evaluations if "【ベンダー一覧】" in prompt else evaluations[0])
+
+
+@patch.object(vr, "EVAL_CASCADE_MARGIN", 0)
+@patch.object(vr, "EVAL_CASCADE_TOP_N", 2)
+@patch.object(vr, "EVAL_BATCH_TOKEN_BUDGET", 100000)
+@patch.object(vr, "EVALUATION_CACHE", None)
+@patch.object(vr, "_invoke_llm", side_effect=_llm_with_output_cap)
+@patch.object(vr, "load_vendors_from_s3", return_value=VendorTable.from_records([{"company_name": f"V{i:02d}"} for i in range(12)]))
+def test_cascade_batches_fit_the_fast_model_output_limit(mock_load, mock_llm, *_):
+    assert vr.batch_output_limit(vr.EVAL_FAST_MODEL) == 4096
+    summary = list(vr.iter_recommendation_events({}))[-1]["data"]
+    fast_calls = [c for c in mock_llm.call_args_list if c.kwargs["model_id"] == vr.EVAL_FAST_MODEL]
+    # 12社を 8社 + 4社 の2回で評価し、個別の再評価は発生しない
+    assert [c.kwargs["max_tokens"] for c in fast_calls] == [4000, 2000]
+    assert summary["stats"]["tiers"] == {"fast": 10, "strong": 2}
+    assert {r["company_name"] for r in summary["recommendations"][:2]} == {"V10", "V11"}
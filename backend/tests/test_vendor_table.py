@@ -0,0 +1,40 @@
+from datetime import date
+from lambda_pkg.vendor_table import VendorTable
+
+
+CSV = """company_name,employee_count,technical_depth,last_contact_date,notes
+A,10,4,2024/11/1,x
+B,abc,,2023-08-10,
+C,,5,昨日,
+"""
+
+
+def test_from_csv_parses_typed_columns():
+    table = VendorTable.from_csv(CSV)
+    assert len(table) == 3
+    assert table.column("employee_count").tolist() == [10, 0, 0]
+    assert table.column("technical_depth").tolist() == [4, 0, 5]
+    assert table[0]["last_contact_date"] == date(2024, 11, 1)
+    assert table[2]["last_contact_date"] is None
+    assert table[0].get("notes") == "x"
+    assert table[0].get("missing", "-") == "-"
+
+
+def test_from_csv_reports_row_errors():
+    errors = VendorTable.from_csv(CSV).errors
+    assert [(e["row"], e["column"]) for e in errors] == [(3, "employee_count"), (4, "last_contact_date")]
+
+
+def test_take_keeps_selected_rows():
+    table = VendorTable.from_csv(CSV).take([2, 0])
+    assert [v["company_name"] for v in table] == ["C", "A"]
+
+
+def test_missing_numbers_are_masked_and_text_is_object():
+    table = VendorTable.from_csv(CSV)
+    # 空欄・変換できない値は配列上 0 のまま、行ビューでは None
+    assert table[1]["employee_count"] is None and table[2]["employee_count"] is None
+    assert table[1]["technical_depth"] is None and table[2]["technical_depth"] == 5
+    assert table.present("technical_depth").tolist() == [True, False, True]
+    assert table.take([1, 0])[0]["technical_depth"] is None
+    assert table.column("notes").dtype == object